@@ -0,0 +1,250 @@
+# backend/alerts.py
+"""Envoi des alertes hors de la boucle de scan.
+
+La passe de scan ne fait que `AlertDispatcher.submit()` : dépôt O(1), sans
+attente, dans une file bornée où les alertes d'une même œuvre se fusionnent
+(une tuile remplace sa précédente). Une tâche asyncio vide la file toutes les
+`window` secondes : un seul embed par œuvre et par fenêtre, envoyé au webhook
+Discord (client HTTP unique, connexions gardées ouvertes) ou à la console.
+
+Les 429 sont respectés (retry_after / X-RateLimit-Reset-After bloquent tout
+le webhook, au moins RATE_LIMIT_MIN) dans la limite de RATE_LIMIT_BUDGET
+d'attente par embed ; les erreurs réseau et 5xx sont retentées avec un backoff
+exponentiel, puis l'embed est abandonné. Un 404 sur la modification d'un
+message supprimé renvoie l'embed comme un nouveau message.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+MAX_LINES = 10  # descriptions fusionnées détaillées dans un embed
+MAX_DESCRIPTION = 4096  # limite Discord
+RETRIES = 5
+RATE_LIMIT_MIN = 0.5  # attente minimale après un 429 (retry_after nul ou absent)
+RATE_LIMIT_BUDGET = 60.0  # attente cumulée sur 429 au-delà de laquelle l'embed est abandonné
+
+@dataclass
+class Alert:
+    kind: str  # 'suspicion' | 'degradation'
+    update: bool  # modifie l'embed existant plutôt que d'en envoyer un nouveau
+    title: str
+    description: str
+    color: str
+    aid: int = 0  # œuvre : clé de fusion et de l'embed à modifier
+    key: Tuple = ()  # source dans l'œuvre (tuile) ; () pour l'œuvre entière
+
+@dataclass
+class Embed:
+    kind: str
+    title: str
+    description: str
+    color: str
+
+    def payload(self) -> Dict[str, Any]:
+        return {"embeds": [{"title": self.title, "description": self.description, "color": int(self.color.lstrip("#"), 16)}]}
+
+def merge(alerts: List[Alert]) -> Embed:
+    """Un embed pour les alertes d'une œuvre : titre et couleur de la plus grave."""
+    top = max(alerts, key=lambda a: a.kind == "degradation")
+    lines = [a.description for a in alerts[:MAX_LINES]]
+    if len(alerts) > MAX_LINES:
+        lines.append(f"+{len(alerts) - MAX_LINES} autre(s)")
+    return Embed(top.kind, top.title, "\n".join(lines)[:MAX_DESCRIPTION], top.color)
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"429, retry_after={retry_after}")
+        self.retry_after = retry_after
+
+# ============================================================================
+# Sorties
+# ============================================================================
+class ConsoleSink:
+    """Simulation "Discord" : logs console."""
+
+    def __init__(self):
+        self.next_id = 0
+
+    async def send(self, embed: Embed) -> str:
+        print("Dégradation en cours !" if embed.kind == "degradation" else "Suspicion dégradation")
+        print(f'console.log("envoie embed: {embed.title} | {embed.description} | color={embed.color}")')
+        self.next_id += 1
+        return str(self.next_id)
+
+    async def edit(self, message_id: str, embed: Embed):
+        print("Dégradation en cours !" if embed.kind == "degradation" else "Suspicion dégradation")
+        print(f'console.log("modif embed: {embed.title} | {embed.description} | color={embed.color}")')
+
+    async def close(self):
+        pass
+
+class WebhookSink:
+    """Webhook Discord : POST ?wait=true (id du message), puis PATCH /messages/{id}."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            timeout=timeout, limits=httpx.Limits(max_connections=2, max_keepalive_connections=2)
+        )
+        self.blocked_until = 0.0  # seau de rate-limit du webhook
+
+    async def _call(self, method: str, url: str, embed: Embed) -> Dict[str, Any]:
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        r = await self.client.request(method, url, json=embed.payload())
+        if r.status_code == 429:
+            try:
+                retry = float(r.json().get("retry_after") or 0)
+            except (ValueError, AttributeError):
+                retry = float(r.headers.get("retry-after") or 0)
+            retry = max(RATE_LIMIT_MIN, retry)
+            self.blocked_until = time.monotonic() + retry
+            raise RateLimited(retry)
+        r.raise_for_status()
+        if r.headers.get("x-ratelimit-remaining") == "0":
+            # seau vide : on attend son renouvellement plutôt que le 429
+            self.blocked_until = time.monotonic() + float(r.headers.get("x-ratelimit-reset-after", 0) or 0)
+        return r.json() if r.content else {}
+
+    async def send(self, embed: Embed) -> str:
+        return str((await self._call("POST", self.url + "?wait=true", embed)).get("id", ""))
+
+    async def edit(self, message_id: str, embed: Embed):
+        await self._call("PATCH", f"{self.url}/messages/{message_id}", embed)
+
+    async def close(self):
+        await self.client.aclose()
+
+# ============================================================================
+# Dispatcher
+# ============================================================================
+class AlertDispatcher:
+    def __init__(self, max_pending: int = 1024, window: float = 1.0, ttl: float = 3600.0):
+        self.max_pending = max_pending
+        self.window = window
+        self.ttl = ttl
+        self.pending: Dict[int, Dict[Tuple, Alert]] = {}
+        self.size = 0
+        self.messages: Dict[int, Tuple[str, Embed, float]] = {}  # œuvre -> (message, dernier embed, instant)
+        self.sink: Any = ConsoleSink()
+        self.url = ""
+        self.task: Optional[asyncio.Task] = None
+        self.counts = {"submitted": 0, "coalesced": 0, "dropped": 0, "sent": 0, "edited": 0,
+                       "unchanged": 0, "failed": 0, "retries": 0, "rate_limited": 0, "reposted": 0}
+
+    def configure(self, url: str):
+        """Webhook de la config (relu à chaque passe) ; vide : console."""
+        url = (url or "").strip()
+        if not url.startswith(("http://", "https://")):
+            url = ""
+        if url == self.url:
+            return
+        old, self.url = self.sink, url
+        self.sink = WebhookSink(url) if url else ConsoleSink()
+        self.messages.clear()  # ids propres à l'ancien webhook
+        asyncio.ensure_future(old.close())
+
+    def submit(self, alert: Alert) -> bool:
+        """Dépôt sans attente ; False si la file est pleine (alerte abandonnée)."""
+        self.counts["submitted"] += 1
+        per_art = self.pending.setdefault(alert.aid, {})
+        prev = per_art.get(alert.key)
+        if prev is not None:
+            # une alerte encore en file remplace la précédente (l'embed n'est pas encore parti)
+            alert.update = alert.update and prev.update
+            self.counts["coalesced"] += 1
+        elif self.size >= self.max_pending:
+            self.counts["dropped"] += 1
+            if not per_art:
+                del self.pending[alert.aid]
+            return False
+        else:
+            self.size += 1
+        per_art[alert.key] = alert
+        return True
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            if self.pending:
+                await self.flush()
+
+    async def flush(self):
+        """Envoie un embed par œuvre en file, séquentiellement (un seul seau de rate-limit)."""
+        pending, self.pending, self.size = self.pending, {}, 0
+        for aid, alerts in pending.items():
+            group = list(alerts.values())
+            await self._deliver(aid, merge(group), all(a.update for a in group))
+
+    async def _deliver(self, aid: int, embed: Embed, update: bool):
+        known = self.messages.get(aid)
+        if update and known is not None and known[1] == embed:
+            self.counts["unchanged"] += 1
+            self.messages[aid] = (known[0], embed, time.monotonic())
+            return
+        failures, waited = 0, 0.0
+        while failures < RETRIES:
+            try:
+                if update and known is not None:
+                    await self.sink.edit(known[0], embed)
+                    self.counts["edited"] += 1
+                    mid = known[0]
+                else:
+                    mid = await self.sink.send(embed)
+                    self.counts["sent"] += 1
+                self.messages[aid] = (mid, embed, time.monotonic())
+                return
+            except RateLimited as e:
+                self.counts["rate_limited"] += 1  # l'attente est faite par le sink, sans compter d'échec
+                waited += max(RATE_LIMIT_MIN, e.retry_after)
+                if waited > RATE_LIMIT_BUDGET:
+                    break  # webhook saturé : l'œuvre suivante ne doit pas attendre indéfiniment
+                continue
+            except (httpx.HTTPError, OSError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", 500)
+                if status == 404 and update and known is not None:
+                    # message supprimé côté Discord : on oublie son id et on en poste un nouveau
+                    self.messages.pop(aid, None)
+                    known = None
+                    self.counts["reposted"] += 1
+                    continue
+                if 400 <= status < 500:
+                    break  # requête refusée : inutile de réessayer
+                await asyncio.sleep(min(30.0, 0.5 * 2**failures))
+                failures += 1
+                self.counts["retries"] += 1
+        self.counts["failed"] += 1
+        print(f"[Alertes] embed abandonné (œuvre {aid})")
+
+    def forget(self, live: Any, now: Optional[float] = None):
+        """Oublie les embeds des œuvres supprimées ou inactives depuis `ttl`."""
+        now = time.monotonic() if now is None else now
+        for aid in [k for k, v in self.messages.items() if k not in live or now - v[2] > self.ttl]:
+            del self.messages[aid]
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.pending:
+            await self.flush()
+        await self.sink.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "pending": self.size, "messages": len(self.messages), "webhook": bool(self.url)}
+
+def evict_events(events: Dict[Any, Tuple[str, float]], ttl: float, now: Optional[float] = None) -> int:
+    """Retire les états d'alerte (état, instant time.time()) plus vieux que `ttl`."""
+    now = time.time() if now is None else now
+    stale = [k for k, v in events.items() if now - v[1] > ttl]
+    for k in stale:
+        del events[k]
+    return len(stale)
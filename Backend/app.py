@@ -1,20 +1,55 @@
 # backend/app.py
 import asyncio
 import base64
+import binascii
+import functools
+import inspect
 import io
 import os
 import sqlite3
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from PIL import Image, ImageDraw
 from pydantic import BaseModel, validator
 from playwright.async_api import async_playwright
 
+from assetstore import (
+    SCHEMA as ASSET_SCHEMA,
+    AssetStore,
+    collect,
+    drop_assets,
+    export_npz,
+    import_npz,
+    live_shas,
+    load_assets,
+    migrate_legacy_blobs,
+    set_asset,
+)
+from alerts import Alert, AlertDispatcher, evict_events
+from damage import DamageMap, DamageReport
+from diffengine import DiffBatch, TileRef, coarse_phase, coarse_ref, make_tile_ref, tile_defects, tile_ref_from_assets
+from events import EventBus
+from metrics import REGISTRY, counter, gauge, histogram
+from pagediff import count_in_page, detourage_code, group_tiles, pack_refs
+from pagepool import PagePool
+from palette import PALETTE, IndexedBatch, IndexedRef, index_ref, indexed_defects, needs_rgba
+from recorder import FrameRecorder
+from screencast import ScreencastSource
+from sources import CanvasSource, ChunkSource, ReplaySource
+from spatial import GridIndex
+from storage import Database, ReaderPool
+from workers import DiffPool
+
 # ============================================================================
 # Configuration globale
 # ============================================================================
@@ -23,6 +58,45 @@ WPLACE_URL = "https://wplace.live/"
 # Couleur spéciale dans le template : si un pixel du template vaut DEFACE_RGB,
 # alors on exige qu'il corresponde au "sol" (ground) et pas au template.
 DEFACE_RGB = (0xDE, 0xFA, 0xCE)
+# Templates, sols, baselines et masques : fichiers .npy mappés (voir assetstore.py).
+ASSET_DIR = os.getenv("BLUE_SCAN_ASSETS", os.path.splitext(DB_PATH)[0] + "-assets")
+# Plafond mémoire du cache d'assets (masques dérivés + références de tuiles ;
+# les tableaux mappés relèvent du cache de pages de l'OS).
+ASSET_CACHE_MB = int(os.getenv("BLUE_SCAN_ASSET_CACHE_MB", "512"))
+# Rejeu hors-ligne : fichier .npz de frames lu à la place de wplace (voir sources.py).
+REPLAY_PATH = os.getenv("BLUE_SCAN_REPLAY", "")
+# Tuiles de la carte lues en HTTP, sans navigateur (voir sources.ChunkSource) :
+# URL du serveur de tuiles ({x}/{y} ou préfixe), tuile d'origine des
+# coordonnées des œuvres "tx,ty", cache des tuiles décodées.
+CHUNKS_URL = os.getenv("BLUE_SCAN_CHUNKS", "")
+CHUNKS_ORIGIN = tuple(int(v) for v in os.getenv("BLUE_SCAN_CHUNKS_ORIGIN", "0,0").split(","))
+CHUNKS_CACHE_MB = int(os.getenv("BLUE_SCAN_CHUNKS_CACHE_MB", "256"))
+# Pool de pages Chromium (voir pagepool.py) : pages de scan (+ une de réserve
+# pour les snapshots), viewport "LxH", recyclage sur tas JS ou âge.
+PAGES = int(os.getenv("BLUE_SCAN_PAGES", "2"))
+VIEWPORT = tuple(int(v) for v in os.getenv("BLUE_SCAN_VIEWPORT", "1600x900").lower().split("x"))
+PAGE_HEAP_MB = int(os.getenv("BLUE_SCAN_PAGE_HEAP_MB", "1024"))
+PAGE_MAX_AGE = float(os.getenv("BLUE_SCAN_PAGE_MAX_AGE", "1800"))
+# Historique des frames (config record_frames) : dossier et rétention.
+FRAMES_DIR = os.getenv("BLUE_SCAN_FRAMES", os.path.splitext(DB_PATH)[0] + "-frames")
+FRAMES_MAX_MB = int(os.getenv("BLUE_SCAN_FRAMES_MAX_MB", "2048"))
+FRAMES_MAX_HOURS = float(os.getenv("BLUE_SCAN_FRAMES_MAX_HOURS", "72"))
+# Alertes : durée de vie des états par tuile / des embeds sans nouvelle alerte, file d'envoi.
+EVENT_TTL = float(os.getenv("BLUE_SCAN_EVENT_TTL", "3600"))
+ALERT_QUEUE = int(os.getenv("BLUE_SCAN_ALERT_QUEUE", "1024"))
+ALERT_WINDOW = float(os.getenv("BLUE_SCAN_ALERT_WINDOW", "1.0"))
+
+# ============================================================================
+# Métriques du chemin chaud (exposées sur /metrics, voir metrics.py)
+# ============================================================================
+CAPTURE_SECONDS = histogram("bluescan_capture_seconds", "Lecture d'un rectangle du canvas", ("method",))  # getimagedata | screenshot
+CAPTURE_FALLBACKS = counter("bluescan_capture_fallback_total", "Replis sur screenshot", ("reason",))  # unavailable | error
+DECODE_SECONDS = histogram("bluescan_decode_seconds", "Décodage des pixels lus", ("format",))  # base64 | png
+STAGE_SECONDS = histogram("bluescan_stage_seconds", "Durée des étapes d'une passe", ("stage",))
+TICK_SECONDS = histogram("bluescan_tick_seconds", "Durée d'une passe complète (config -> alertes)")
+TILES_TOTAL = counter("bluescan_tiles_total", "Tuiles traitées", ("result",))  # diffed | reused
+TILES_RATE = gauge("bluescan_tiles_per_second", "Tuiles traitées par seconde (dernière passe)")
+ALERTS_TOTAL = counter("bluescan_alerts_total", "Alertes émises", ("kind", "action"))
 
 # ============================================================================
 # Modèles Pydantic (I/O API)
@@ -36,8 +110,13 @@ class ConfigIn(BaseModel):
     tolerance: int = 8
     suspicion_threshold: int = 5
     degradation_threshold: int = 30
+    # > 1 : passe grossière, un pixel sur stride x stride (baseline et template+sol).
+    # Coût en latence : seul un défaut couvrant un carré stride x stride est vu à la
+    # première passe ; un trait d'un pixel ne l'est qu'à la phase qui le croise
+    # (~1 passe sur stride, ~26 % au premier passage à stride=4 d'après bench.py coarse),
+    # tout défaut persistant au plus tard en stride² passes (16 à stride=4).
     stride: int = 1
-    staged_scan: bool = True
+    staged_scan: bool = True  # recompte en pleine résolution les tuiles dont l'estimation grossière est suspecte
     tile_w: int = 100
     tile_h: int = 100
     tiles_per_tick: int = 1
@@ -45,6 +124,17 @@ class ConfigIn(BaseModel):
     one_tile_per_artwork: bool = True
     ignore_outside: bool = True
     detourage_mode: str = "alpha_only"  # "alpha_only" | "polygon_only" | "alpha_or_polygon"
+    capture_mode: str = "roi"  # "roi" (union des tuiles planifiées) | "full" (canvas entier) | "stream" (screencast)
+    scan_workers: int = 0  # 0 = diff dans la boucle ; N = pool de N processus
+    scheduler: str = "priority"  # "priority" (score de risque + échéance) | "rr" (round-robin historique)
+    max_revisit_s: float = 60.0  # délai max visé entre deux scans d'une même tuile
+    auto_rate: bool = False  # ajuste tiles_global_per_tick (et la cadence) au coût mesuré des passes
+    target_load: float = 0.5  # part de la période occupée par une passe, visée en auto
+    target_lag_ms: int = 50  # retard max toléré de la boucle asyncio en auto
+    record_frames: bool = False  # historique compressé des œuvres (voir recorder.py)
+    record_interval_s: float = 1.0  # période d'échantillonnage de l'historique
+    alert_scope: str = "tile"  # "tile" (seuils par tuile) | "artwork" (zones de dégâts agrégées par œuvre, sur option)
+    diff_engine: str = "rgba"  # "rgba" | "palette" (index uint8, voir palette.py ; diff dans la boucle seulement) | "page" (diff dans Chromium, voir pagediff.py)
 
 class ArtworkIn(BaseModel):
     name: str
@@ -64,6 +154,10 @@ class TemplateIn(BaseModel):
 class ModeIn(BaseModel):
     mode: str  # 'build' | 'protect'
 
+class ThresholdsIn(BaseModel):
+    suspicion_threshold: Optional[int] = None  # None : seuil de la config
+    degradation_threshold: Optional[int] = None
+
 class ArtworkCornersIn(BaseModel):
     name: str
     corners: List[List[int]]
@@ -87,6 +181,7 @@ class PlaceTLIn(BaseModel):
 # SQLite helpers
 # ============================================================================
 def db():
+    """Connexion directe (init/migrations) ; le reste passe par `DB`."""
     con = sqlite3.connect(DB_PATH)
     con.row_factory = sqlite3.Row
     con.execute("PRAGMA journal_mode=WAL;")
@@ -113,45 +208,41 @@ def init_db():
           ignore_outside INTEGER,
           tiles_global_per_tick INTEGER,
           one_tile_per_artwork INTEGER,
-          detourage_mode TEXT
+          detourage_mode TEXT,
+          capture_mode TEXT,
+          scan_workers INTEGER,
+          scheduler TEXT,
+          max_revisit_s REAL,
+          auto_rate INTEGER,
+          target_load REAL,
+          target_lag_ms INTEGER,
+          record_frames INTEGER,
+          record_interval_s REAL,
+          alert_scope TEXT,
+          diff_engine TEXT
         );
         INSERT OR IGNORE INTO config
           (id,guild_id,channel_id,discord_webhook,poll_ms,scan_hz,tolerance,
            suspicion_threshold,degradation_threshold,stride,staged_scan,
            tile_w,tile_h,tiles_per_tick,ignore_outside,
-           tiles_global_per_tick,one_tile_per_artwork,detourage_mode)
-          VALUES(1,'','','',2000,1.0,8,5,30,1,1,100,100,1,1,64,1,'alpha_only');
+           tiles_global_per_tick,one_tile_per_artwork,detourage_mode,capture_mode,scan_workers,
+           scheduler,max_revisit_s,auto_rate,target_load,target_lag_ms,record_frames,record_interval_s,
+           alert_scope,diff_engine)
+          VALUES(1,'','','',2000,1.0,8,5,30,1,1,100,100,1,1,64,1,'alpha_only','roi',0,'priority',60.0,0,0.5,50,0,1.0,
+                 'tile','rgba');
 
         CREATE TABLE IF NOT EXISTS artworks(
           id INTEGER PRIMARY KEY AUTOINCREMENT,
           name TEXT NOT NULL,
           x INTEGER, y INTEGER, w INTEGER, h INTEGER,
           added_at TEXT NOT NULL,
-          mode TEXT DEFAULT 'build'
-        );
-
-        CREATE TABLE IF NOT EXISTS baselines(
-          artwork_id INTEGER PRIMARY KEY,
-          w INTEGER NOT NULL, h INTEGER NOT NULL,
-          rgba BLOB NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS grounds(
-          artwork_id INTEGER PRIMARY KEY,
-          w INTEGER NOT NULL, h INTEGER NOT NULL,
-          rgba BLOB NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS templates(
-          artwork_id INTEGER PRIMARY KEY,
-          w INTEGER NOT NULL, h INTEGER NOT NULL,
-          rgba BLOB NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS masks(
-          artwork_id INTEGER PRIMARY KEY,
-          w INTEGER NOT NULL, h INTEGER NOT NULL,
-          mask BLOB NOT NULL
+          mode TEXT DEFAULT 'build',
+          suspicion_threshold INTEGER,
+          degradation_threshold INTEGER
         );
         """
     )
+    con.executescript(ASSET_SCHEMA)
     cols = [r[1] for r in con.execute("PRAGMA table_info(config)")]
     if "scan_hz" not in cols:
         con.execute("ALTER TABLE config ADD COLUMN scan_hz REAL DEFAULT 1.0")
@@ -170,11 +261,49 @@ def init_db():
         con.execute("ALTER TABLE config ADD COLUMN one_tile_per_artwork INTEGER DEFAULT 1")
     if "detourage_mode" not in cols:
         con.execute("ALTER TABLE config ADD COLUMN detourage_mode TEXT DEFAULT 'alpha_only'")
+    if "capture_mode" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN capture_mode TEXT DEFAULT 'roi'")
+    if "scan_workers" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN scan_workers INTEGER DEFAULT 0")
+    if "scheduler" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN scheduler TEXT DEFAULT 'priority'")
+    if "max_revisit_s" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN max_revisit_s REAL DEFAULT 60.0")
+    if "auto_rate" not in cols:
+        con.executescript(
+            """
+            ALTER TABLE config ADD COLUMN auto_rate INTEGER DEFAULT 0;
+            ALTER TABLE config ADD COLUMN target_load REAL DEFAULT 0.5;
+            ALTER TABLE config ADD COLUMN target_lag_ms INTEGER DEFAULT 50;
+            """
+        )
+    if "record_frames" not in cols:
+        con.executescript(
+            """
+            ALTER TABLE config ADD COLUMN record_frames INTEGER DEFAULT 0;
+            ALTER TABLE config ADD COLUMN record_interval_s REAL DEFAULT 1.0;
+            """
+        )
+    if "alert_scope" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN alert_scope TEXT DEFAULT 'tile'")
+    if "diff_engine" not in cols:
+        con.execute("ALTER TABLE config ADD COLUMN diff_engine TEXT DEFAULT 'rgba'")
     _try_alter(con, "ALTER TABLE artworks ADD COLUMN mode TEXT DEFAULT 'build'")
+    # seuils propres à une œuvre (NULL : ceux de la config)
+    _try_alter(con, "ALTER TABLE artworks ADD COLUMN suspicion_threshold INTEGER")
+    _try_alter(con, "ALTER TABLE artworks ADD COLUMN degradation_threshold INTEGER")
     con.commit()
+    # anciennes bases : BLOB templates/grounds/baselines/masks -> store .npy
+    moved = migrate_legacy_blobs(con, ASSET_STORE)
+    if moved:
+        print(f"[DB] {moved} asset(s) migré(s) vers {ASSET_DIR}")
+        con.execute("VACUUM")
+    ASSET_STORE.sweep(live_shas(con))
     con.close()
 
+ASSET_STORE = AssetStore(ASSET_DIR)
 init_db()
+DB = Database(DB_PATH)
 
 # ============================================================================
 # Playwright state & helpers
@@ -182,23 +311,24 @@ init_db()
 @dataclass
 class PwState:
     pw: Optional[Any] = None
-    browser: Optional[Any] = None
-    page: Optional[Any] = None
+    pool: Optional[PagePool] = None
 
 PW = PwState()
 
-async def ensure_page():
-    """Lance Playwright + Chromium headless et va sur wplace si besoin."""
-    if PW.page:
-        return PW.page
-    PW.pw = await async_playwright().start()
-    PW.browser = await PW.pw.chromium.launch(
-        headless=True, args=["--disable-dev-shm-usage", "--no-sandbox"]
-    )
-    ctx = await PW.browser.new_context(viewport={"width": 1600, "height": 900})
-    PW.page = await ctx.new_page()
-    await PW.page.goto(WPLACE_URL, wait_until="domcontentloaded", timeout=60_000)
-    return PW.page
+async def _launch_browser():
+    if PW.pw is None:
+        PW.pw = await async_playwright().start()
+    return await PW.pw.chromium.launch(headless=True, args=["--disable-dev-shm-usage", "--no-sandbox"])
+
+async def ensure_pool() -> PagePool:
+    """Lance Playwright + Chromium headless et ouvre les pages wplace si besoin."""
+    if PW.pool is None:
+        PW.pool = PagePool(
+            _launch_browser, WPLACE_URL, pages=PAGES, viewport=VIEWPORT,
+            max_heap_mb=PAGE_HEAP_MB, max_age=PAGE_MAX_AGE,
+        )
+    await PW.pool.start()
+    return PW.pool
 
 GET_CANVAS_INFO = """
 (() => {
@@ -211,66 +341,440 @@ GET_CANVAS_INFO = """
 })()
 """
 
-async def get_region_rgba(page, x: int, y: int, w: int, h: int) -> Optional[np.ndarray]:
-    """Lit un rectangle RGBA du canvas principal. Fallback screenshot si getImageData indispo."""
-    info = await page.evaluate(GET_CANVAS_INFO)
-    if not info.get("ok"):
-        return None
-    # A) getImageData direct (rapide)
+# Transfert binaire par tranches : getImageData est lu une seule fois dans la
+# page, puis rapatrié en tranches de TRANSFER_CHUNK octets (base64 natif via
+# FileReader) directement dans un buffer NumPy préalloué. Plus de chaîne géante
+# ni de String.fromCharCode.apply (limite d'arguments sur les grands canvas).
+TRANSFER_CHUNK = 1 << 22  # 4 Mo par aller-retour CDP
+
+READ_CANVAS_RGBA = """
+([x, y, w, h]) => {
+  const cs = Array.from(document.querySelectorAll('canvas'));
+  if (!cs.length) return 0;
+  let best = cs[0], area = best.width*best.height;
+  for (const c of cs) { const a=c.width*c.height; if (a>area){best=c;area=a;} }
+  const ctx = best.getContext('2d', {willReadFrequently:true});
+  window.__bsPix = ctx.getImageData(x, y, w, h).data;
+  return window.__bsPix.length;
+}
+"""
+
+READ_PIX_CHUNK = """
+async ([off, len, last]) => {
+  const blob = new Blob([window.__bsPix.subarray(off, off + len)]);
+  if (last) window.__bsPix = null;
+  const url = await new Promise((res, rej) => {
+    const fr = new FileReader();
+    fr.onload = () => res(fr.result); fr.onerror = () => rej(fr.error);
+    fr.readAsDataURL(blob);
+  });
+  return url.slice(url.indexOf(',') + 1);
+}
+"""
+
+class FrameBuffers:
+    """Double buffer RGBA préalloué : la frame N-1 reste valide pendant la passe N."""
+
+    def __init__(self):
+        self._bufs: List[np.ndarray] = []
+        self._i = 0
+
+    def next(self, shape: Tuple[int, int, int]) -> np.ndarray:
+        if not self._bufs or self._bufs[0].shape != shape:
+            self._bufs = [np.empty(shape, dtype=np.uint8) for _ in range(2)]
+        self._i ^= 1
+        return self._bufs[self._i]
+
+FRAME_BUFS = FrameBuffers()
+
+async def read_canvas_into(page, x: int, y: int, out: np.ndarray) -> bool:
+    """Copie le rectangle (x, y, out.shape) du canvas principal dans `out`."""
+    h, w = out.shape[:2]
+    n = await page.evaluate(READ_CANVAS_RGBA, [x, y, w, h])
+    if n != out.nbytes:
+        return False
+    flat = out.reshape(-1)
+    decode = 0.0
+    for off in range(0, n, TRANSFER_CHUNK):
+        last = off + TRANSFER_CHUNK >= n
+        b64 = await page.evaluate(READ_PIX_CHUNK, [off, TRANSFER_CHUNK, last])
+        t0 = time.perf_counter()
+        chunk = binascii.a2b_base64(b64)
+        flat[off : off + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+        decode += time.perf_counter() - t0
+    DECODE_SECONDS.observe(decode, "base64")
+    return True
+
+async def _read_direct(page, x: int, y: int, out: np.ndarray) -> bool:
+    """getImageData avec mesure du temps ; compte les replis sur screenshot."""
+    t0 = time.perf_counter()
     try:
-        b64 = await page.evaluate(
-            f"""
-          (() => {{
-            const cs = Array.from(document.querySelectorAll('canvas'));
-            let best = cs[0], area = best.width*best.height;
-            for (const c of cs) {{ const a=c.width*c.height; if (a>area) {{best=c;area=a;}} }}
-            const ctx = best.getContext('2d', {{willReadFrequently:true}});
-            const img = ctx.getImageData({x},{y},{w},{h});
-            return btoa(String.fromCharCode.apply(null, img.data));
-          }})()
-        """
-        )
-        raw = base64.b64decode(b64)
-        return np.frombuffer(raw, dtype=np.uint8).reshape((h, w, 4))
+        ok = await read_canvas_into(page, x, y, out)
     except Exception:
-        pass
+        CAPTURE_FALLBACKS.inc("error")
+        return False
+    if not ok:
+        CAPTURE_FALLBACKS.inc("unavailable")
+        return False
+    CAPTURE_SECONDS.observe(time.perf_counter() - t0, "getimagedata")
+    return True
+
+async def _read_screenshot(page, clip: Dict[str, float], w: int, h: int) -> np.ndarray:
+    with CAPTURE_SECONDS.time("screenshot"):
+        buf = await page.screenshot(clip=clip)
+        with DECODE_SECONDS.time("png"):
+            im = Image.open(io.BytesIO(buf)).convert("RGBA").resize((w, h), Image.NEAREST)
+            return np.array(im, dtype=np.uint8)
+
+async def _read_region(page, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+    # A) getImageData direct (rapide)
+    out = np.empty((h, w, 4), dtype=np.uint8)
+    if await _read_direct(page, x, y, out):
+        return out
     # B) Screenshot + resize exact
     cw, ch, bw, bh, bx, by = info["cw"], info["ch"], info["bw"], info["bh"], info["bx"], info["by"]
     sx, sy = bw / cw, bh / ch
     clip = {"x": bx + x * sx, "y": by + y * sy, "width": max(1, w * sx), "height": max(1, h * sy)}
-    buf = await page.screenshot(clip=clip)
-    im = Image.open(io.BytesIO(buf)).convert("RGBA").resize((w, h), Image.NEAREST)
-    return np.array(im, dtype=np.uint8)
-
-async def get_full_canvas(page) -> Optional[np.ndarray]:
-    """Dump le canvas entier en RGBA (H, W, 4)."""
-    info = await page.evaluate(GET_CANVAS_INFO)
-    if not info.get("ok"):
+    return await _read_screenshot(page, clip, w, h)
+
+class PlaywrightSource(CanvasSource):
+    """Canvas principal de la page (getImageData, fallback screenshot)."""
+
+    def __init__(self, page):
+        self.page = page
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        info = await self.page.evaluate(GET_CANVAS_INFO)
+        return info if info.get("ok") else None
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        return await _read_region(self.page, info, x, y, w, h)
+
+    async def full(self, info: Dict[str, Any]) -> np.ndarray:
+        """Canvas entier, dans un buffer réutilisé d'une passe à l'autre."""
+        cw, ch = info["cw"], info["ch"]
+        # A) getImageData full
+        out = FRAME_BUFS.next((ch, cw, 4))
+        if await _read_direct(self.page, 0, 0, out):
+            return out
+        # B) Screenshot + resize
+        bw, bh, bx, by = info["bw"], info["bh"], info["bx"], info["by"]
+        return await _read_screenshot(self.page, {"x": bx, "y": by, "width": bw, "height": bh}, cw, ch)
+
+    async def map_pages(self, boxes, fn) -> List[Any]:
+        return [await fn(self.page, b) for b in boxes]
+
+class PoolSource(CanvasSource):
+    """Canvas lu sur les pages du pool : boîtes réparties par région, pages en parallèle."""
+
+    def __init__(self, pool: PagePool):
+        self.pool = pool
+        self.cast: Optional[ScreencastSource] = None
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        await self.pool.check()
+        info = await self.pool.first(lambda page: page.evaluate(GET_CANVAS_INFO))
+        return info if info.get("ok") else None
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        return (await self.regions(info, [(x, y, x + w, y + h)]))[0]
+
+    async def regions(self, info: Dict[str, Any], boxes: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        # même URL et même viewport : la géométrie du canvas (repli screenshot) est commune
+        return await self.pool.map(boxes, lambda page, b: _read_region(page, info, b[0], b[1], b[2] - b[0], b[3] - b[1]))
+
+    async def full(self, info: Dict[str, Any]) -> np.ndarray:
+        return await self.pool.first(lambda page: PlaywrightSource(page).full(info))
+
+    async def map_pages(self, boxes, fn) -> List[Any]:
+        return await self.pool.map(boxes, fn)
+
+    async def stream(self, on: bool) -> Optional[CanvasSource]:
+        """Screencast de la première page de scan (recyclée : le flux suit la nouvelle page)."""
+        if on and self.cast is None:
+            self.cast = ScreencastSource(lambda: self.pool.scan_slots[0].page, self)
+        elif not on and self.cast is not None:
+            await self.cast.close()
+            self.cast = None
+        return self.cast
+
+    async def close(self):
+        if self.cast is not None:
+            await self.cast.close()
+        await self.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.pool.stats(), "screencast": self.cast.stats() if self.cast is not None else None}
+
+SOURCE: Optional[CanvasSource] = None
+
+async def ensure_source() -> CanvasSource:
+    """Source de la boucle de scan : rejeu si BLUE_SCAN_REPLAY, tuiles HTTP si
+    BLUE_SCAN_CHUNKS, sinon les pages wplace."""
+    global SOURCE
+    if SOURCE is None:
+        if REPLAY_PATH:
+            SOURCE = ReplaySource.load(REPLAY_PATH)
+        elif CHUNKS_URL:
+            SOURCE = ChunkSource(CHUNKS_URL, origin=CHUNKS_ORIGIN, cache_bytes=CHUNKS_CACHE_MB << 20)
+        else:
+            SOURCE = PoolSource(await ensure_pool())
+    return SOURCE
+
+@asynccontextmanager
+async def lease_source():
+    """Source des lectures ponctuelles (snapshots) : page de réserve du pool, hors boucle de scan."""
+    src = await ensure_source()
+    if isinstance(src, PoolSource):
+        async with src.pool.lease() as page:
+            yield PlaywrightSource(page)
+    else:
+        yield src
+
+async def get_region_rgba(src: CanvasSource, x: int, y: int, w: int, h: int) -> Optional[np.ndarray]:
+    """Lit un rectangle RGBA du canvas principal."""
+    info = await src.info()
+    if info is None:
         return None
-    cw, ch = info["cw"], info["ch"]
-    # A) getImageData full
-    try:
-        b64 = await page.evaluate(
-            f"""
-          (() => {{
-            const cs = Array.from(document.querySelectorAll('canvas'));
-            let best = cs[0], area = best.width*best.height;
-            for (const c of cs) {{ const a=c.width*c.height; if (a>area) {{best=c;area=a;}} }}
-            const ctx = best.getContext('2d', {{willReadFrequently:true}});
-            const img = ctx.getImageData(0,0,{cw},{ch});
-            return btoa(String.fromCharCode.apply(null, img.data));
-          }})()
-        """
-        )
-        raw = base64.b64decode(b64)
-        return np.frombuffer(raw, dtype=np.uint8).reshape((ch, cw, 4))
-    except Exception:
-        pass
-    # B) Screenshot + resize
-    bw, bh, bx, by = info["bw"], info["bh"], info["bx"], info["by"]
-    buf = await page.screenshot(clip={"x": bx, "y": by, "width": bw, "height": bh})
-    im = Image.open(io.BytesIO(buf)).convert("RGBA").resize((cw, ch), Image.NEAREST)
-    return np.array(im, dtype=np.uint8)
+    return await src.region(info, x, y, w, h)
+
+async def get_full_canvas(src: CanvasSource) -> Optional[np.ndarray]:
+    """Dump le canvas entier en RGBA (H, W, 4) ; None si la source ne lit que par régions."""
+    if not src.full_frame:
+        return None
+    info = await src.info()
+    if info is None:
+        return None
+    return await src.full(info)
+
+# ============================================================================
+# Cache d'assets (templates / sols / masques / baselines décodés)
+# ============================================================================
+@dataclass
+class ArtAssets:
+    version: int
+    tpl: Optional[np.ndarray] = None  # memmap lecture seule
+    grd: Optional[np.ndarray] = None  # memmap lecture seule
+    poly: Optional[np.ndarray] = None  # masque polygone (bool)
+    base: Optional[np.ndarray] = None  # memmap lecture seule
+    alpha: Optional[np.ndarray] = None  # tpl[..., 3] > 0
+    deface: Optional[np.ndarray] = None  # tpl RGB == DEFACE_RGB
+    tile_cache: Dict[tuple, Union[TileRef, IndexedRef]] = field(default_factory=dict)
+    nbytes: int = 0  # mémoire propre (hors tableaux mappés)
+    counted: int = 0  # part de nbytes déjà comptée dans AssetCache.total
+
+    def inside_mask(self, detourage_mode: str) -> Optional[np.ndarray]:
+        """Zone "dedans" pleine taille selon le mode de détourage (None si aucun masque)."""
+        if detourage_mode == "alpha_only" and self.alpha is not None:
+            return self.alpha
+        if detourage_mode == "polygon_only":
+            return self.poly if self.poly is not None else self.alpha
+        if self.alpha is not None and self.poly is not None:
+            return self.alpha | self.poly
+        return self.alpha if self.alpha is not None else self.poly
+
+    def shared_arrays(self) -> Dict[str, np.ndarray]:
+        """Tableaux publiés aux workers de diff (voir workers.DiffPool)."""
+        out = {"tpl": self.tpl, "grd": self.grd, "alpha": self.alpha, "deface": self.deface}
+        if self.poly is not None:
+            out["poly"] = self.poly
+        return out
+
+    def tile_ref(self, tile: "TileRect", detourage_mode: str, build: bool, ignore_outside: bool) -> TileRef:
+        """Références de la tuile pour le moteur de diff, précalculées une fois par version d'assets."""
+        key = (tile.x, tile.y, tile.w, tile.h, detourage_mode, build, ignore_outside)
+        ref = self.tile_cache.get(key)
+        if ref is None:
+            ref = tile_ref_from_assets(
+                self.tpl, self.grd, self.alpha, self.deface, self.poly,
+                (tile.x, tile.y, tile.w, tile.h), detourage_mode, build, ignore_outside,
+            )
+            self.tile_cache[key] = ref
+            self.nbytes += ref.nbytes
+        return ref
+
+    def coarse_ref(self, tile: "TileRect", detourage_mode: str, build: bool, ignore_outside: bool, stride: int, ox: int, oy: int) -> TileRef:
+        """Sous-échantillon de `tile_ref` pour la passe grossière (une référence par phase)."""
+        key = ("coarse", tile.x, tile.y, tile.w, tile.h, detourage_mode, build, ignore_outside, stride, ox, oy)
+        ref = self.tile_cache.get(key)
+        if ref is None:
+            full = self.tile_ref(tile, detourage_mode, build, ignore_outside)
+            ref = self.tile_cache[key] = coarse_ref(full, tile.w, stride, ox, oy)
+            self.nbytes += ref.nbytes
+        return ref
+
+    def indexed_ref(self, tile: "TileRect", detourage_mode: str, build: bool, ignore_outside: bool) -> IndexedRef:
+        """Pendant de `tile_ref` en index de palette ; seule la forme indexée est gardée."""
+        key = ("idx", tile.x, tile.y, tile.w, tile.h, detourage_mode, build, ignore_outside)
+        ref = self.tile_cache.get(key)
+        if ref is None:
+            rgba = tile_ref_from_assets(
+                self.tpl, self.grd, self.alpha, self.deface, self.poly,
+                (tile.x, tile.y, tile.w, tile.h), detourage_mode, build, ignore_outside,
+            )
+            ref = self.tile_cache[key] = index_ref(PALETTE, rgba)
+            self.nbytes += ref.nbytes
+        return ref
+
+class AssetCache:
+    """Cache LRU des assets décodés, clé (œuvre, version de contenu).
+
+    Les endpoints d'écriture appellent `invalidate()` : la version de l'œuvre
+    change et l'entrée est rechargée au prochain accès. Les
+    chargements (`aget()`) passent par les threads du pool de lecture du
+    monitor : jamais de décodage dans la boucle asyncio.
+    """
+
+    def __init__(self, max_bytes: int, reader: ReaderPool):
+        self.max_bytes = max_bytes
+        self.reader = reader
+        self.lock = threading.Lock()
+        self.versions: Dict[int, int] = {}
+        self.entries: "OrderedDict[int, ArtAssets]" = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, aid: int) -> int:
+        return self.versions.get(aid, 0)
+
+    def invalidate(self, aid: int):
+        with self.lock:
+            self.versions[aid] = self.version(aid) + 1
+            old = self.entries.pop(aid, None)
+            if old is not None:
+                self.total -= old.counted
+
+    def _hit(self, aid: int) -> Optional[ArtAssets]:
+        with self.lock:
+            e = self.entries.get(aid)
+            if e is None or e.version != self.version(aid):
+                return None
+            self.entries.move_to_end(aid)
+            # les références de tuiles s'ajoutent après coup : on resynchronise la taille
+            self.total += e.nbytes - e.counted
+            e.counted = e.nbytes
+            self.hits += 1
+            self._evict()
+            return e
+
+    def _store(self, aid: int, e: ArtAssets) -> ArtAssets:
+        with self.lock:
+            self.misses += 1
+            old = self.entries.pop(aid, None)
+            if old is not None:
+                self.total -= old.counted
+            e.counted = e.nbytes
+            self.entries[aid] = e
+            self.total += e.nbytes
+            self._evict()
+            return e
+
+    async def aget(self, aid: int) -> ArtAssets:
+        e = self._hit(aid)
+        if e is None:
+            version = self.version(aid)
+            e = self._store(aid, await self.reader.aread(lambda con: self._load(con, aid, version)))
+        return e
+
+    def _evict(self):
+        # on garde toujours l'entrée la plus récente, même si elle dépasse le plafond
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.total -= old.counted
+
+    @staticmethod
+    def _load(con, aid: int, version: int) -> ArtAssets:
+        arrs = load_assets(con, ASSET_STORE, aid)
+        e = ArtAssets(version, tpl=arrs.get("template"), grd=arrs.get("ground"), base=arrs.get("baseline"))
+        if "mask" in arrs:
+            e.poly = arrs["mask"] > 0
+        if e.tpl is not None:
+            e.alpha = e.tpl[..., 3] > 0
+            e.deface = (
+                (e.tpl[..., 0] == DEFACE_RGB[0])
+                & (e.tpl[..., 1] == DEFACE_RGB[1])
+                & (e.tpl[..., 2] == DEFACE_RGB[2])
+            )
+        e.nbytes = sum(a.nbytes for a in (e.poly, e.alpha, e.deface) if a is not None)
+        return e
+
+ASSETS = AssetCache(ASSET_CACHE_MB * 1024 * 1024, DB.monitor)
+
+def _collect(orphans: List[str]):
+    """Ramasse (sans attendre) les fichiers d'assets qui ne sont plus référencés."""
+    if orphans:
+        DB.writer.submit(lambda con: collect(con, ASSET_STORE, orphans))
+
+# ============================================================================
+# Capture par régions (ROI)
+# ============================================================================
+Box = Tuple[int, int, int, int]  # (x0, y0, x1, y1) absolu, x1/y1 exclus
+
+class RegionFrame:
+    """Frame partielle : patches RGBA capturés, adressés en coordonnées canvas."""
+
+    def __init__(self, patches: Optional[List[Tuple[int, int, np.ndarray]]] = None):
+        self.patches: List[Tuple[int, int, np.ndarray]] = patches or []
+
+    @classmethod
+    def whole(cls, frame: np.ndarray) -> "RegionFrame":
+        return cls([(0, 0, frame)])
+
+    def locate(self, x0: int, y0: int, x1: int, y1: int) -> Optional[Tuple[int, int, int]]:
+        """(index du patch, x, y dans le patch) couvrant le rectangle, ou None."""
+        for i, (px, py, arr) in enumerate(self.patches):
+            if px <= x0 and py <= y0 and x1 <= px + arr.shape[1] and y1 <= py + arr.shape[0]:
+                return i, x0 - px, y0 - py
+        return None
+
+    def view(self, x0: int, y0: int, x1: int, y1: int) -> Optional[np.ndarray]:
+        """Vue (sans copie) sur le rectangle, ou None s'il n'est couvert par aucun patch."""
+        hit = self.locate(x0, y0, x1, y1)
+        if hit is None:
+            return None
+        i, x, y = hit
+        return self.patches[i][2][y : y + y1 - y0, x : x + x1 - x0]
+
+def plan_capture(rects: List[Box], slack: float = 0.25, max_boxes: Optional[int] = 16, snap: int = 512) -> List[Box]:
+    """Fusionne les rectangles des tuiles en quelques boîtes englobantes.
+
+    Deux boîtes sont fusionnées tant que leur englobante ne coûte pas plus de
+    `slack` en pixels lus en trop ; au-delà de `max_boxes` (sauf None), on
+    fusionne la paire la moins coûteuse. Au-delà de 256 rectangles, pré-regroupement par cellule
+    `snap` pour garder le planificateur en O(n²) sur de petits n.
+    """
+    boxes = sorted(set(rects))
+    if len(boxes) > 256:
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for b in boxes:
+            k = (b[0] // snap, b[1] // snap)
+            c = cells.get(k)
+            cells[k] = list(b) if c is None else [min(c[0], b[0]), min(c[1], b[1]), max(c[2], b[2]), max(c[3], b[3])]
+        boxes = [tuple(c) for c in cells.values()]
+    b = np.array(boxes, dtype=np.int64).reshape(-1, 4)
+    while len(b) > 1:
+        x0 = np.minimum.outer(b[:, 0], b[:, 0])
+        y0 = np.minimum.outer(b[:, 1], b[:, 1])
+        x1 = np.maximum.outer(b[:, 2], b[:, 2])
+        y1 = np.maximum.outer(b[:, 3], b[:, 3])
+        area = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        waste = (x1 - x0) * (y1 - y0) - (1.0 + slack) * (area[:, None] + area[None, :])
+        np.fill_diagonal(waste, np.inf)
+        i, j = np.unravel_index(int(np.argmin(waste)), waste.shape)
+        if waste[i, j] > 0 and (max_boxes is None or len(b) <= max_boxes):
+            break
+        b[i] = (x0[i, j], y0[i, j], x1[i, j], y1[i, j])
+        b = np.delete(b, j, axis=0)
+    return [tuple(int(v) for v in r) for r in b]
+
+async def get_regions(src: CanvasSource, boxes: List[Box]) -> Optional[RegionFrame]:
+    """Capture uniquement les boîtes demandées (une lecture par boîte)."""
+    info = await src.info()
+    if info is None:
+        return None
+    arrs = await src.regions(info, boxes)
+    return RegionFrame([(b[0], b[1], arr) for b, arr in zip(boxes, arrs)])
 
 # ============================================================================
 # Diff helpers
@@ -295,15 +799,15 @@ def count_diff_pixels(a: np.ndarray, b: np.ndarray, tol: int, stride: int = 1) -
     return int(diff_sample * scale)
 
 # ============================================================================
-# Simulations "Discord" → logs console
+# Alertes : états par tuile (évincés après EVENT_TTL) et envoi (voir alerts.py)
 # ============================================================================
 LAST_EVENT: Dict[Tuple[int, Tuple[int, int, int, int]], Tuple[str, float]] = {}
+DISPATCHER = AlertDispatcher(ALERT_QUEUE, ALERT_WINDOW, EVENT_TTL)
+LAST_ALERT: Dict[int, Alert] = {}  # dernière alerte par œuvre (texte des transitions /events)
 
-def sim_embed_send(title: str, description: str, color_hex: str):
-    print(f'console.log("envoie embed: {title} | {description} | color={color_hex}")')
-
-def sim_embed_update(title: str, description: str, color_hex: str):
-    print(f'console.log("modif embed: {title} | {description} | color={color_hex}")')
+def alert_sink(alert: Alert):
+    LAST_ALERT[alert.aid] = alert
+    DISPATCHER.submit(alert)
 
 # ============================================================================
 # Tuilage
@@ -340,311 +844,1265 @@ def next_tile(art_id: int) -> Optional[TileRect]:
     st.idx = (st.idx + 1) % len(st.tiles)
     return t
 
+# ============================================================================
+# Détection de changements (cellules 32x32) et index des tuiles
+# ============================================================================
+DELTA_CELL = 32
+
+class DeltaDetector:
+    """Cellules DELTA_CELL x DELTA_CELL du canvas modifiées depuis leur dernière capture.
+
+    Les frames ROI ne couvrent pas les mêmes zones d'une passe à l'autre :
+    chaque cellule entièrement capturée est résumée par une somme pondérée
+    de ses pixels (uint32, poids impairs aléatoires : tout pixel modifié
+    change la somme), comparée à celle de sa capture précédente. Une cellule
+    vue pour la première fois n'est pas sale.
+    """
+
+    def __init__(self, cell: int = DELTA_CELL):
+        self.cell = cell
+        rng = np.random.default_rng(0x5CA7)
+        self.weights = (rng.integers(0, 1 << 31, (1, cell, 1, cell), dtype=np.uint32) * 2 + 1).astype(np.uint32)
+        self.sums = np.zeros((0, 0), dtype=np.uint64)
+        self.seen = np.zeros((0, 0), dtype=bool)
+        self.dirty_cells = 0
+        self.dirty_tiles = 0
+
+    def _grow(self, ny: int, nx: int):
+        if ny <= self.sums.shape[0] and nx <= self.sums.shape[1]:
+            return
+        ny, nx = max(ny, self.sums.shape[0]), max(nx, self.sums.shape[1])
+        sums = np.zeros((ny, nx), dtype=np.uint64)
+        seen = np.zeros((ny, nx), dtype=bool)
+        sums[: self.sums.shape[0], : self.sums.shape[1]] = self.sums
+        seen[: self.seen.shape[0], : self.seen.shape[1]] = self.seen
+        self.sums, self.seen = sums, seen
+
+    def update(self, frame: "RegionFrame") -> np.ndarray:
+        """Met à jour les sommes ; retourne les cellules sales (k, 2) en (cx, cy)."""
+        c = self.cell
+        out: List[np.ndarray] = []
+        for px, py, arr in frame.patches:
+            # cellules entièrement couvertes par le patch (coordonnées canvas >= 0)
+            cx0, cy0 = -(-max(px, 0) // c), -(-max(py, 0) // c)
+            cx1, cy1 = (px + arr.shape[1]) // c, (py + arr.shape[0]) // c
+            if cx1 <= cx0 or cy1 <= cy0:
+                continue
+            v = arr[cy0 * c - py : cy1 * c - py, cx0 * c - px : cx1 * c - px]
+            v = np.ascontiguousarray(v).view(np.uint32).reshape(cy1 - cy0, c, cx1 - cx0, c)
+            sums = (v * self.weights).sum(axis=(1, 3), dtype=np.uint64)
+            self._grow(cy1, cx1)
+            old = self.sums[cy0:cy1, cx0:cx1]
+            seen = self.seen[cy0:cy1, cx0:cx1]
+            dirty = np.argwhere(seen & (old != sums))
+            if dirty.size:
+                out.append(dirty[:, ::-1] + (cx0, cy0))
+            old[...] = sums
+            seen[...] = True
+        cells = np.concatenate(out) if out else np.zeros((0, 2), dtype=np.int64)
+        self.dirty_cells += len(cells)
+        return cells
+
+    def reset(self):
+        self.sums = np.zeros((0, 0), dtype=np.uint64)
+        self.seen = np.zeros((0, 0), dtype=bool)
+
+DELTA = DeltaDetector()
+# Tuiles de toutes les œuvres en coordonnées canvas ; clé (œuvre, (x, y, w, h) dans l'œuvre)
+TILE_INDEX = GridIndex(DELTA_CELL)
+TILE_INDEX_FP: Dict[int, tuple] = {}
+TILE_KEYS: Dict[int, List[tuple]] = {}
+
+def sync_tile_index(table: Dict[int, Any]):
+    """Réindexe les tuiles des œuvres déplacées, retuilées, ajoutées ou supprimées."""
+    for aid in [a for a in TILE_KEYS if a not in table]:
+        for key in TILE_KEYS.pop(aid):
+            TILE_INDEX.remove(key)
+        TILE_INDEX_FP.pop(aid, None)
+    for aid, a in table.items():
+        fp = (a["x"], a["y"], TPL_FP.get(aid))
+        if TILE_INDEX_FP.get(aid) == fp:
+            continue
+        for key in TILE_KEYS.pop(aid, []):
+            TILE_INDEX.remove(key)
+        keys = TILE_KEYS[aid] = []
+        for tr in TILERS.get(aid, TilerState([])).tiles:
+            x0, y0 = a["x"] + tr.x, a["y"] + tr.y
+            key = (aid, (tr.x, tr.y, tr.w, tr.h))
+            TILE_INDEX.insert(key, (x0, y0, x0 + tr.w, y0 + tr.h))
+            keys.append(key)
+        TILE_INDEX_FP[aid] = fp
+
+# ============================================================================
+# Pipeline de scan : scheduler -> matérialisation -> diff -> alertes -> sink
+# ============================================================================
+@dataclass
+class ScanCtx:
+    """Paramètres d'une passe, relus depuis la config à chaque tick."""
+
+    tol: int
+    susp_t: int
+    degr_t: int
+    stride: int
+    staged: bool
+    tile_w: int
+    tile_h: int
+    tiles_global: int
+    one_per_art: bool
+    ignore_outside: bool
+    detourage_mode: str
+    capture_mode: str
+    scan_workers: int
+    scheduler: str
+    max_revisit: float
+    auto_rate: bool
+    target_load: float
+    target_lag: float
+    record_frames: bool
+    record_interval: float
+    alert_scope: str
+    diff_engine: str
+    period: float
+    tiles_plan: int = 0  # tuiles à planifier (>= tiles_global si des tuiles inchangées sont sautées)
+
+    @classmethod
+    def from_row(cls, cfg) -> "ScanCtx":
+        scan_hz = float(cfg["scan_hz"] or 1.0)
+        return cls(
+            tol=int(cfg["tolerance"]),
+            susp_t=int(cfg["suspicion_threshold"]),
+            degr_t=int(cfg["degradation_threshold"]),
+            stride=max(1, int(cfg["stride"] or 1)),
+            staged=bool(cfg["staged_scan"]),
+            tile_w=max(10, min(1000, int(cfg["tile_w"] or 100))),
+            tile_h=max(10, min(1000, int(cfg["tile_h"] or 100))),
+            tiles_global=max(1, int(cfg["tiles_global_per_tick"] or 64)),
+            one_per_art=bool(cfg["one_tile_per_artwork"]),
+            ignore_outside=bool(cfg["ignore_outside"]),
+            detourage_mode=(cfg["detourage_mode"] or "alpha_only").strip(),
+            capture_mode=(cfg["capture_mode"] or "roi").strip(),
+            scan_workers=max(0, int(cfg["scan_workers"] or 0)),
+            scheduler=(cfg["scheduler"] or "priority").strip(),
+            max_revisit=max(1.0, float(cfg["max_revisit_s"] or 60.0)),
+            auto_rate=bool(cfg["auto_rate"]),
+            target_load=max(0.05, min(0.95, float(cfg["target_load"] or 0.5))),
+            target_lag=max(1, int(cfg["target_lag_ms"] or 50)) / 1000.0,
+            record_frames=bool(cfg["record_frames"]),
+            record_interval=max(0.2, float(cfg["record_interval_s"] or 1.0)),
+            alert_scope=(cfg["alert_scope"] or "tile").strip(),
+            diff_engine=(cfg["diff_engine"] or "rgba").strip(),
+            period=max(0.2, 1.0 / scan_hz),
+        )
+
+@dataclass
+class TileJob:
+    art: Any  # ligne `artworks`
+    tile: TileRect
+    rect: Box  # rectangle absolu sur le canvas
+    slot: Optional[int] = None  # index dans le DiffBatch de la passe
+    diffs: int = 0
+    fp: Optional[tuple] = None  # (clé, crc, signature) à mémoriser après le diff
+    reused: bool = False  # diff repris de la passe précédente (pixels inchangés)
+    remote: bool = False  # diff calculé dans la page (diff_engine="page")
+    bbox: Optional[Box] = None  # englobante des défauts (x, y, w, h) en coordonnées tuile, si remote
+    coarse: float = 0.0  # passe grossière : pixels de la tuile par pixel échantillonné (0 : pleine résolution)
+    assets: Optional[ArtAssets] = field(default=None, repr=False, compare=False)  # tenus pour toute la passe
+
+HOT_DECAY = 0.9  # chaleur d'une œuvre conservée à chaque passe
+HOT_MIN = 0.05  # en dessous, l'œuvre redevient froide
+ALERT_WEIGHT = {"none": 0.0, "suspicion": 1.0, "degradation": 2.0}
+
+def _job(a, tile: TileRect) -> TileJob:
+    x0, y0 = a["x"] + tile.x, a["y"] + tile.y
+    return TileJob(a, tile, (x0, y0, x0 + tile.w, y0 + tile.h))
+
+class TileStats:
+    """Historique des tuiles d'une œuvre (tableaux alignés sur TILERS[aid].tiles)."""
+
+    def __init__(self, tiles: List[TileRect], now: float, max_revisit: float):
+        n = len(tiles)
+        self.tiles = tiles
+        self.index = {(t.x, t.y, t.w, t.h): i for i, t in enumerate(tiles)}
+        # une tuile jamais scannée est due tout de suite
+        self.last = np.full(n, now - max_revisit)
+        self.scans = np.zeros(n, dtype=np.int64)
+        self.diff_ema = np.zeros(n)
+        self.alert = np.zeros(n)
+        self.worst_gap = np.zeros(n)  # plus long intervalle observé entre deux scans
+
+class BaseScheduler:
+    """État commun aux planificateurs : œuvres chaudes, tuiles sales, historique des scans.
+
+    La chaleur d'une œuvre (alerte : 1.0, cellule modifiée : 0.5) décroît de
+    HOT_DECAY par passe. Une tuile sale est planifiée une fois (passe 0) puis
+    oubliée. `observe()` enregistre, après chaque passe, la date et le diff
+    des tuiles scannées : `staleness()` en tire le retard par œuvre.
+    """
+
+    def __init__(self):
+        self.hot: Dict[int, float] = {}
+        self.dirty: Dict[Tuple[int, tuple], float] = {}  # (œuvre, tuile) -> date de détection
+        self.stats: Dict[int, TileStats] = {}
+        self.ctx: Optional[ScanCtx] = None
+
+    def mark_hot(self, aid: int, heat: float = 1.0):
+        self.hot[aid] = max(self.hot.get(aid, 0.0), heat)
+
+    def mark_dirty(self, key: Tuple[int, tuple]):
+        self.dirty.setdefault(key, time.time())
+
+    def _decay(self):
+        for aid in list(self.hot):
+            self.hot[aid] *= HOT_DECAY
+            if self.hot[aid] < HOT_MIN:
+                del self.hot[aid]
+
+    def _sync(self, table: Dict[int, Any], ctx: ScanCtx, now: float):
+        """Aligne l'historique sur les tuiles courantes (œuvres retuilées, ajoutées, supprimées)."""
+        self.ctx = ctx
+        for aid in [a for a in self.stats if a not in table]:
+            del self.stats[aid]
+        for aid in table:
+            st = TILERS.get(aid)
+            tiles = st.tiles if st else []
+            cur = self.stats.get(aid)
+            if cur is None or cur.tiles is not tiles:
+                self.stats[aid] = TileStats(tiles, now, ctx.max_revisit)
+
+    def _take_dirty(self, table: Dict[int, Any], budget: int) -> List[TileJob]:
+        """Passe 0 : tuiles sales, les plus anciennes d'abord."""
+        jobs: List[TileJob] = []
+        for key in sorted(self.dirty, key=self.dirty.get):
+            if len(jobs) >= budget:
+                break
+            del self.dirty[key]
+            a = table.get(key[0])
+            if a is None or key not in TILE_INDEX:
+                continue
+            jobs.append(_job(a, TileRect(*key[1])))
+        return jobs
+
+    def plan(self, table: Dict[int, Any], ctx: ScanCtx) -> List[TileJob]:
+        raise NotImplementedError
+
+    def observe(self, scanned: List[TileJob]):
+        now = time.monotonic()
+        for job in scanned:
+            aid = job.art["id"]
+            st = self.stats.get(aid)
+            i = st.index.get((job.tile.x, job.tile.y, job.tile.w, job.tile.h)) if st else None
+            if i is None:
+                continue
+            if st.scans[i]:
+                st.worst_gap[i] = max(st.worst_gap[i], now - st.last[i])
+            st.last[i] = now
+            st.scans[i] += 1
+            st.diff_ema[i] = 0.7 * st.diff_ema[i] + 0.3 * job.diffs
+            state = LAST_EVENT.get((aid, (job.tile.x, job.tile.y, job.tile.w, job.tile.h)), ("none", 0.0))[0]
+            st.alert[i] = ALERT_WEIGHT.get(state, 0.0)
+
+    def staleness(self) -> Dict[str, Any]:
+        """Retard par œuvre : âge max actuel, pire intervalle observé, tuiles en retard."""
+        now = time.monotonic()
+        ctx = self.ctx
+        max_revisit = ctx.max_revisit if ctx else 60.0
+        arts = {}
+        total = 0
+        for aid, st in self.stats.items():
+            n = len(st.tiles)
+            total += n
+            if not n:
+                continue
+            age = now - st.last
+            arts[aid] = {
+                "tiles": n,
+                "never_scanned": int((st.scans == 0).sum()),
+                "max_age_s": round(float(age.max()), 2),
+                "worst_gap_s": round(float(st.worst_gap.max()), 2),
+                "overdue": int((age > max_revisit).sum()),
+            }
+        # débit soutenable : budget par passe x passes par échéance
+        capacity = int(ctx.tiles_global * max_revisit / ctx.period) if ctx else 0
+        return {
+            "max_revisit_s": max_revisit,
+            "tiles": total,
+            "capacity_per_deadline": capacity,
+            "feasible": capacity >= total,
+            "worst_max_age_s": max((v["max_age_s"] for v in arts.values()), default=0.0),
+            "artworks": arts,
+        }
+
+class RoundRobinScheduler(BaseScheduler):
+    """Passe 0 : tuiles sales (delta). Passe 1 : une tuile par œuvre (chaudes d'abord).
+    Passe 2 : reste du budget en RR."""
+
+    def __init__(self):
+        super().__init__()
+        self.rr_ids: List[int] = []
+        self.rr_pos = 0
+
+    def plan(self, table: Dict[int, Any], ctx: ScanCtx) -> List[TileJob]:
+        ids = list(table)
+        if self.rr_ids != ids:
+            self.rr_ids, self.rr_pos = ids, 0
+        rr_ids = self.rr_ids
+        budget = ctx.tiles_plan or ctx.tiles_global
+        self._decay()
+        self._sync(table, ctx, time.monotonic())
+        jobs = self._take_dirty(table, budget)
+        budget -= len(jobs)
+
+        def take(aid: int) -> bool:
+            a = table.get(aid)
+            tile = next_tile(aid) if a else None
+            if not tile:
+                return False
+            jobs.append(_job(a, tile))
+            return True
+
+        order = rr_ids[:]
+        if self.hot:
+            hot_order = sorted((i for i in order if i in self.hot), key=lambda i: -self.hot[i])
+            cold_order = [i for i in order if i not in self.hot]
+            order = hot_order + cold_order
+
+        idx = self.rr_pos
+        if ctx.one_per_art:
+            for _ in range(len(order)):
+                if budget <= 0:
+                    break
+                aid = order[idx]
+                idx = (idx + 1) % len(order)
+                if take(aid):
+                    budget -= 1
+        self.rr_pos = idx
+
+        # Passe 2 : consomme le reste du budget en round-robin
+        # (s'arrête après un tour complet sans aucune tuile disponible)
+        idx2 = self.rr_pos
+        idle = 0
+        while budget > 0 and rr_ids and idle < len(rr_ids):
+            aid = rr_ids[idx2]
+            idx2 = (idx2 + 1) % len(rr_ids)
+            if not take(aid):
+                idle += 1
+                continue
+            idle = 0
+            budget -= 1
+        return jobs
+
+class PriorityScheduler(BaseScheduler):
+    """Tuiles triées par score de risque, avec échéance de revisite.
+
+    Chaque tuile a un intervalle de revisite effectif
+        max_revisit / (poids_mode x (1 + risque_diff + alerte + chaleur))
+    (poids_mode : protect 1.5, build 1.0 ; risque_diff : moyenne glissante des
+    diffs rapportée au seuil de suspicion, plafonnée à 2) et son score est
+    âge / intervalle. Les tuiles qui ont dépassé max_revisit passent avant
+    toutes les autres, les plus en retard d'abord : aucune œuvre n'est
+    affamée tant que le budget le permet (voir `staleness()["feasible"]`).
+    `one_tile_per_artwork` ne concerne que le round-robin.
+    """
+
+    OVERDUE = 1e6  # décalage de score des tuiles en retard
+
+    def plan(self, table: Dict[int, Any], ctx: ScanCtx) -> List[TileJob]:
+        now = time.monotonic()
+        budget = ctx.tiles_plan or ctx.tiles_global
+        self._decay()
+        self._sync(table, ctx, now)
+        jobs = self._take_dirty(table, budget)
+        taken = {(j.art["id"], (j.tile.x, j.tile.y, j.tile.w, j.tile.h)) for j in jobs}
+        budget -= len(jobs)
+        if budget <= 0:
+            return jobs
+
+        aids: List[int] = []
+        scores: List[np.ndarray] = []
+        for aid, st in self.stats.items():
+            if not st.tiles:
+                continue
+            a = table[aid]
+            weight = 1.5 if (a["mode"] or "build") == "protect" else 1.0
+            risk = np.minimum(2.0, st.diff_ema / max(1, ctx.susp_t))
+            urgency = weight * (1.0 + risk + st.alert + self.hot.get(aid, 0.0))
+            age = now - st.last
+            score = age * urgency / ctx.max_revisit
+            score[age >= ctx.max_revisit] += self.OVERDUE
+            aids.append(aid)
+            scores.append(score)
+        if not scores:
+            return jobs
+        flat = np.concatenate(scores)
+        owner = np.repeat(np.arange(len(aids)), [len(s) for s in scores])
+        offset = np.cumsum([0] + [len(s) for s in scores])
+        k = min(len(flat), budget + len(taken))
+        top = np.argpartition(-flat, k - 1)[:k] if k < len(flat) else np.arange(len(flat))
+        for i in top[np.argsort(-flat[top], kind="stable")]:
+            if budget <= 0:
+                break
+            aid = aids[owner[i]]
+            tile = self.stats[aid].tiles[i - offset[owner[i]]]
+            if (aid, (tile.x, tile.y, tile.w, tile.h)) in taken:
+                continue
+            jobs.append(_job(table[aid], tile))
+            budget -= 1
+        return jobs
+
+SCHEDULERS: Dict[str, BaseScheduler] = {"priority": PriorityScheduler(), "rr": RoundRobinScheduler()}
+
+async def materialize(src: CanvasSource, jobs: List[TileJob], ctx: ScanCtx) -> Optional[RegionFrame]:
+    """Capture la frame partagée : union des tuiles planifiées, ou canvas entier.
+    En mode "stream", les tuiles sont prises dans la dernière frame du screencast.
+    Avec diff_engine="page", voir `offload_capture`."""
+    if ctx.diff_engine == "page":
+        frame = await offload_capture(src, jobs, ctx)
+        if frame is not None:
+            return frame
+    live = await src.stream(ctx.capture_mode == "stream")
+    if live is not None:
+        src = live
+    elif ctx.capture_mode == "full" and src.full_frame:
+        full = await get_full_canvas(src)
+        return RegionFrame.whole(full) if full is not None else None
+    return await get_regions(src, plan_capture([j.rect for j in jobs], max_boxes=src.max_boxes))
+
+PAGE_DIFF = {"tiles": 0, "fallback": 0, "pixels_avoided": 0}
+
+async def offload_capture(src: CanvasSource, jobs: List[TileJob], ctx: ScanCtx) -> Optional[RegionFrame]:
+    """Diffs template+sol comptés dans la page (pagediff.py) : ces tuiles ne
+    reviennent que sous forme (défauts, englobante). Seuls les pixels encore
+    utiles sont lus : tuiles baseline ou non comptées, englobantes des défauts
+    (carte des dégâts), tout si l'historique est enregistré. None si la source
+    n'a pas de page : capture habituelle."""
+    remote: List[TileJob] = []
+    specs = []
+    held: Dict[int, ArtAssets] = {}
+    for job in jobs:
+        a, t = job.art, job.tile
+        if a["id"] not in held:
+            held[a["id"]] = await ASSETS.aget(a["id"])
+        assets = job.assets = held[a["id"]]
+        if assets.tpl is None or assets.grd is None:
+            continue
+        build = (a["mode"] or "build") == "build"
+        det = detourage_code(ctx.detourage_mode, assets.poly is not None)
+        remote.append(job)
+        specs.append((a["id"], assets.version, a["x"], a["y"], t.x, t.y, t.w, t.h, build, det))
+    boxes = plan_capture([j.rect for j in remote], max_boxes=src.max_boxes) if remote else []
+    groups = group_tiles(boxes, [j.rect for j in remote])
+    by_box = {b: [specs[i] for i in g] for b, g in zip(boxes, groups)}
+
+    def refs(aid: int):
+        assets = held[aid]
+        return pack_refs(assets.tpl, assets.grd, assets.alpha, assets.deface, assets.poly)
+
+    results = await src.map_pages(
+        boxes, lambda page, b: count_in_page(page, b, by_box[b], ctx.tol, ctx.ignore_outside, refs)
+    )
+    if results is None:
+        return None
+    for g, res in zip(groups, results):
+        for i, r in zip(g, res or [None] * len(g)):
+            job = remote[i]
+            if r is None:  # canvas illisible ou références non gardées : pixels lus
+                PAGE_DIFF["fallback"] += 1
+                continue
+            job.remote, job.diffs = True, int(r[0])
+            job.bbox = tuple(r[1:]) if job.diffs else None
+            PAGE_DIFF["tiles"] += 1
+    need = [j.rect for j in jobs if ctx.record_frames or not j.remote]
+    if not ctx.record_frames:
+        read = 0
+        for j in jobs:
+            if j.bbox is not None and ctx.alert_scope == "artwork":
+                x, y, w, h = j.bbox
+                need.append((j.rect[0] + x, j.rect[1] + y, j.rect[0] + x + w, j.rect[1] + y + h))
+                read += w * h
+            if j.remote:
+                read -= (j.rect[2] - j.rect[0]) * (j.rect[3] - j.rect[1])
+        PAGE_DIFF["pixels_avoided"] -= read
+    if not need:
+        return RegionFrame()
+    return await get_regions(src, plan_capture(need, max_boxes=src.max_boxes))
+
+# Empreintes de tuiles : une tuile dont les pixels n'ont pas bougé depuis son
+# dernier diff (même crc32, mêmes assets et paramètres) reprend ce résultat.
+FP_MAX_REUSE = 64  # re-diff forcé après N reprises consécutives
+FP_MAX_OVERSCAN = 4.0  # planification max = N x tiles_global_per_tick
+
+@dataclass
+class TileFp:
+    crc: int
+    sig: tuple
+    diffs: int
+    reused: int = 0
+
+class TileFingerprints:
+    """Dernier diff connu par tuile + compteurs de saut.
+
+    `plan_budget()` convertit le budget de diff en nombre de tuiles à
+    planifier d'après le taux de saut récent : le budget de
+    `tiles_global_per_tick` va ainsi aux tuiles qui ont réellement changé.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[int, tuple], TileFp] = {}
+        self.checked = 0
+        self.skipped = 0
+        self.skip_ema = 0.0
+
+    @staticmethod
+    def crc(cur: np.ndarray) -> int:
+        return zlib.crc32(np.ascontiguousarray(cur))
+
+    def lookup(self, key: Tuple[int, tuple], crc: int, sig: tuple) -> Optional[int]:
+        e = self.entries.get(key)
+        if e is None or e.crc != crc or e.sig != sig or e.reused >= FP_MAX_REUSE:
+            return None
+        e.reused += 1
+        return e.diffs
+
+    def store(self, key: Tuple[int, tuple], crc: int, sig: tuple, diffs: int):
+        self.entries[key] = TileFp(crc, sig, diffs)
+
+    def end_pass(self, checked: int, skipped: int):
+        self.checked += checked
+        self.skipped += skipped
+        if checked:
+            self.skip_ema = 0.8 * self.skip_ema + 0.2 * (skipped / checked)
+
+    def plan_budget(self, budget: int) -> int:
+        return max(budget, min(int(budget * FP_MAX_OVERSCAN), int(budget / max(1e-3, 1.0 - self.skip_ema))))
+
+    def drop(self, aid: int):
+        for key in [k for k in self.entries if k[0] == aid]:
+            del self.entries[key]
+
+    def forget(self, keep: Dict[int, Any]):
+        for key in [k for k in self.entries if k[0] not in keep]:
+            del self.entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.checked, 4) if self.checked else 0.0,
+            "skip_rate_recent": round(self.skip_ema, 4),
+            "entries": len(self.entries),
+        }
+
+FINGERPRINTS = TileFingerprints()
+
+def delta_step(frame: RegionFrame, jobs: List[TileJob], table: Dict[int, Any], ctx: ScanCtx, scheduler) -> List[TileJob]:
+    """Cellules modifiées -> tuiles. Celles que la frame couvre déjà sont ajoutées à la passe
+    (dans la limite de tiles_global_per_tick), les autres sont planifiées en tête à la suivante."""
+    cells = DELTA.update(frame)
+    if not len(cells):
+        return jobs
+    dirty: set = set()
+    for cx, cy in cells.tolist():
+        dirty |= TILE_INDEX.bucket(cx, cy)
+    DELTA.dirty_tiles += len(dirty)
+    planned = {(j.art["id"], (j.tile.x, j.tile.y, j.tile.w, j.tile.h)) for j in jobs}
+    extra: List[TileJob] = []
+    for key in sorted(dirty):
+        a = table.get(key[0])
+        if a is None:
+            continue
+        scheduler.mark_hot(key[0], 0.5)
+        if key in planned:
+            continue
+        tile = TileRect(*key[1])
+        x0, y0 = a["x"] + tile.x, a["y"] + tile.y
+        rect = (x0, y0, x0 + tile.w, y0 + tile.h)
+        if len(extra) < ctx.tiles_global and frame.locate(*rect) is not None:
+            extra.append(TileJob(a, tile, rect))
+        else:
+            scheduler.mark_dirty(key)
+    return jobs + extra
+
+_DIFF_POOL: Optional[DiffPool] = None
+
+def get_diff_pool(workers: int) -> Optional[DiffPool]:
+    """Pool de diff partagé, (re)créé quand le nombre de workers change ; None = inline."""
+    global _DIFF_POOL
+    if _DIFF_POOL is not None and _DIFF_POOL.workers != workers:
+        _DIFF_POOL.close()
+        _DIFF_POOL = None
+    if workers > 0 and _DIFF_POOL is None:
+        _DIFF_POOL = DiffPool(workers)
+    return _DIFF_POOL
+
+# Passe grossière des tuiles template+sol (stride > 1, moteur RGBA dans la boucle) :
+# un pixel sur stride x stride, avec une phase qui tourne à chaque passe. Une
+# tuile est recomptée en pleine résolution (staged_scan) dès que ses pixels
+# échantillonnés en défaut, comptés stride² chacun, atteignent COARSE_ESCALATE x
+# le seuil de suspicion. Tant que stride² >= ce seuil, un seul pixel échantillonné
+# suffit : un défaut contenant un carré stride x stride est recompté dès la
+# première passe, tout autre défaut persistant en au plus stride² passes.
+# Une tuile aux dégâts connus (état d'alerte, défauts dans DAMAGE) est toujours
+# recomptée : une estimation ne peut ni effacer ses défauts ni baisser l'état.
+COARSE_ESCALATE = 0.5
+COARSE = {"passes": 0, "tiles": 0, "escalated": 0}
+
+def coarse_escalates(hits: int, stride: int, susp_t: int) -> bool:
+    return hits * stride * stride >= max(1, int(COARSE_ESCALATE * susp_t))
+
+def known_damage(job: TileJob) -> bool:
+    """La tuile a des dégâts connus : état d'alerte en cours ou défauts dans sa carte."""
+    a, t = job.art, job.tile
+    if LAST_EVENT.get((a["id"], (t.x, t.y, t.w, t.h)), ("none", 0.0))[0] != "none":
+        return True
+    dm = DAMAGE.get(a["id"])
+    return dm is not None and dm.mask.shape == (a["h"], a["w"]) and bool(dm.mask[t.y : t.y + t.h, t.x : t.x + t.w].any())
+
+def refine_coarse(frame: RegionFrame, scanned: List[TileJob], ctx: ScanCtx):
+    """Estimations grossières mises à l'échelle ; recomptage exact des tuiles suspectes
+    ou déjà endommagées. Une estimation n'est pas mémorisée par empreinte : la phase
+    suivante la revoit."""
+    batch = DiffBatch()
+    fine: List[TileJob] = []
+    for job in scanned:
+        if not job.coarse:
+            continue
+        COARSE["tiles"] += 1
+        hits, job.diffs = job.diffs, int(job.diffs * job.coarse)
+        susp_t = art_thresholds(job.art, ctx)[0] if ctx.alert_scope == "artwork" else ctx.susp_t
+        if not known_damage(job) and not (ctx.staged and coarse_escalates(hits, ctx.stride, susp_t)):
+            job.fp = None
+            continue
+        a, tile = job.art, job.tile
+        build = (a["mode"] or "build") == "build"
+        job.slot = batch.add(frame.view(*job.rect), job.assets.tile_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside))
+        fine.append(job)
+    if fine:
+        counts = batch.run(ctx.tol)
+        for job in fine:
+            job.diffs = int(counts[job.slot])
+        COARSE["escalated"] += len(fine)
+
+async def diff_jobs(frame: RegionFrame, jobs: List[TileJob], ctx: ScanCtx) -> List[TileJob]:
+    """Remplit `diffs` : tuiles template+sol en un lot, baseline à part. Retourne les tuiles scannées.
+
+    Les tuiles inchangées depuis leur dernier diff (voir TileFingerprints),
+    et les doublons d'une même passe, reprennent le résultat connu. Avec
+    stride > 1, les tuiles template+sol passent d'abord en grossier (refine_coarse).
+    """
+    pool = get_diff_pool(ctx.scan_workers)
+    indexed = pool is None and ctx.diff_engine == "palette"
+    coarse = pool is None and not indexed and ctx.stride > 1
+    if coarse:
+        COARSE["passes"] += 1
+    batch = IndexedBatch(PALETTE) if indexed else DiffBatch()
+    items: List[tuple] = []  # lot destiné au pool
+    scanned: List[TileJob] = []
+    firsts: Dict[Tuple[int, tuple], TileJob] = {}
+    dups: List[Tuple[TileJob, TileJob]] = []
+    for job in jobs:
+        if job.remote:
+            scanned.append(job)  # compté dans la page (offload_capture)
+            continue
+        hit = frame.locate(*job.rect)
+        if hit is None:
+            continue
+        cur = frame.view(*job.rect)
+        tile = job.tile
+        aid = job.art["id"]
+        key = (aid, (tile.x, tile.y, tile.w, tile.h))
+        if key in firsts:
+            dups.append((job, firsts[key]))
+            scanned.append(job)
+            continue
+        assets = job.assets = job.assets or await ASSETS.aget(aid)
+        build = (job.art["mode"] or "build") == "build"
+        if assets.tpl is not None and assets.grd is not None:
+            sig = (assets.version, ctx.tol, ctx.detourage_mode, build, ctx.ignore_outside)
+        elif assets.base is not None:
+            sig = (assets.version, ctx.tol, ctx.stride, ctx.staged, ctx.susp_t)
+        else:
+            continue
+        firsts[key] = job
+        scanned.append(job)
+        crc = FINGERPRINTS.crc(cur)
+        prev = FINGERPRINTS.lookup(key, crc, sig)
+        if prev is not None:
+            job.diffs, job.reused = prev, True
+            continue
+        job.fp = (key, crc, sig)
+        if assets.tpl is not None and assets.grd is not None:
+            if indexed:
+                job.slot = batch.add(
+                    cur, assets.indexed_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside),
+                    functools.partial(assets.tile_ref, tile, ctx.detourage_mode, build, ctx.ignore_outside),
+                )
+            elif coarse:
+                s = ctx.stride
+                ox, oy = coarse_phase(COARSE["passes"], s, tile.w, tile.h)
+                sample = cur[oy::s, ox::s]
+                job.coarse = cur.shape[0] * cur.shape[1] / (sample.shape[0] * sample.shape[1])
+                job.slot = batch.add(sample, assets.coarse_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside, s, ox, oy))
+            elif pool is None:
+                job.slot = batch.add(cur, assets.tile_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside))
+            else:
+                seg, layout = pool.publish_assets(aid, assets.version, assets.shared_arrays())
+                job.slot = len(items)
+                items.append(
+                    (aid, seg, layout, hit[0], hit[1:], (tile.x, tile.y, tile.w, tile.h),
+                     ctx.detourage_mode, build, ctx.ignore_outside)
+                )
+        elif assets.base is not None:
+            # Fallback baseline uniquement
+            base_t = assets.base[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
+            job.diffs = count_diff_pixels(base_t, cur, ctx.tol, stride=ctx.stride)
+            if ctx.staged and job.diffs >= max(3, ctx.susp_t // 2) and ctx.stride > 1:
+                job.diffs = count_diff_pixels(base_t, cur, ctx.tol, stride=1)
+    if pool is None:
+        counts = batch.run(ctx.tol)
+    elif items:
+        name, layout = pool.publish_frame([p[2] for p in frame.patches])
+        counts = await pool.count(name, layout, items, ctx.tol)
+    for job in scanned:
+        if job.slot is not None:
+            job.diffs = int(counts[job.slot])
+    if coarse:
+        refine_coarse(frame, scanned, ctx)
+    for job in scanned:
+        if job.fp is not None:
+            FINGERPRINTS.store(*job.fp, job.diffs)
+    for job, first in dups:
+        job.diffs, job.reused = first.diffs, True
+    FINGERPRINTS.end_pass(len(scanned), sum(1 for j in scanned if j.reused))
+    return scanned
+
+def alert_step(job: TileJob, ctx: ScanCtx) -> Optional[Alert]:
+    """Machine d'état par tuile (LAST_EVENT) : none -> suspicion -> dégradation."""
+    a, tile, diffs = job.art, job.tile, job.diffs
+    tile_key = (a["id"], (tile.x, tile.y, tile.w, tile.h))
+    prev = LAST_EVENT.get(tile_key, ("none", 0.0))[0]
+    where = f"tuile=({tile.x},{tile.y},{tile.w},{tile.h})"
+    zone = f"zone=({a['x']},{a['y']},{a['w']},{a['h']})"
+    if diffs >= ctx.degr_t:
+        LAST_EVENT[tile_key] = ("degradation", time.time())
+        return Alert(
+            "degradation",
+            prev == "suspicion",
+            "Dégradation en cours !",
+            f"Œuvre: {a['name']} | {where} | diffs={diffs} (≥{ctx.degr_t}) | {zone}",
+            "#E74C3C",
+            a["id"],
+            tile_key[1],
+        )
+    if diffs >= ctx.susp_t:
+        LAST_EVENT[tile_key] = ("suspicion", time.time())
+        return Alert(
+            "suspicion",
+            prev in ("suspicion", "degradation"),
+            "Suspicion de dégradation",
+            f"Œuvre: {a['name']} | {where} | diffs={diffs} (≥{ctx.susp_t}) | {zone}",
+            "#F1C40F",
+            a["id"],
+            tile_key[1],
+        )
+    return None
+
+# Dégâts agrégés par œuvre (alert_scope="artwork") : carte des défauts, état d'alerte
+DAMAGE: Dict[int, DamageMap] = {}
+ART_EVENT: Dict[int, Tuple[str, float, int]] = {}  # œuvre -> (état, instant, pixels signalés)
+
+def art_thresholds(a, ctx: ScanCtx) -> Tuple[int, int]:
+    """(suspicion, dégradation) de l'œuvre : les siens s'ils sont définis, sinon la config."""
+    s, d = a["suspicion_threshold"], a["degradation_threshold"]
+    return (ctx.susp_t if s is None else int(s)), (ctx.degr_t if d is None else int(d))
+
+def _update_damage(frame: RegionFrame, job: TileJob, ctx: ScanCtx):
+    a, tile = job.art, job.tile
+    dm = DAMAGE.get(a["id"])
+    if dm is None or dm.mask.shape != (a["h"], a["w"]):
+        dm = DAMAGE[a["id"]] = DamageMap(a["w"], a["h"])
+    if job.diffs == 0:
+        dm.clear_tile(tile.x, tile.y, tile.w, tile.h)
+        return
+    assets = job.assets  # tenus par diff_jobs / offload_capture
+    if job.bbox is not None:
+        # diff compté dans la page : seule l'englobante des défauts a été lue
+        x, y, w, h = job.bbox
+        cur = frame.view(job.rect[0] + x, job.rect[1] + y, job.rect[0] + x + w, job.rect[1] + y + h)
+        if cur is None:
+            return
+        build = (a["mode"] or "build") == "build"
+        rect = (tile.x + x, tile.y + y, w, h)
+        ref = tile_ref_from_assets(assets.tpl, assets.grd, assets.alpha, assets.deface, assets.poly, rect,
+                                   ctx.detourage_mode, build, ctx.ignore_outside)
+        dm.clear_tile(tile.x, tile.y, tile.w, tile.h)
+        dm.set_tile(rect[0], rect[1], tile_defects(cur, ref, ctx.tol), cur)
+        return
+    cur = frame.view(*job.rect)
+    if assets.tpl is not None and assets.grd is not None:
+        build = (a["mode"] or "build") == "build"
+        if ctx.diff_engine == "palette" and ctx.scan_workers == 0:
+            iref = assets.indexed_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside)
+            idx = PALETTE.quantize(cur)
+            table, identity = PALETTE.match(ctx.tol)
+            if needs_rgba(iref, idx, ctx.tol):
+                bad = tile_defects(cur, assets.tile_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside), ctx.tol)
+            else:
+                bad = indexed_defects(idx, iref, table, identity).reshape(cur.shape[:2])
+        else:
+            bad = tile_defects(cur, assets.tile_ref(tile, ctx.detourage_mode, build, ctx.ignore_outside), ctx.tol)
+    else:
+        bad = ~within_tol(cur, assets.base[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w], ctx.tol)
+    dm.set_tile(tile.x, tile.y, bad, cur)
+
+def _zones(report: DamageReport, n: int = 3) -> str:
+    parts = [f"({c.x},{c.y},{c.w},{c.h}) {c.pixels}px {'/'.join(c.colors)}" for c in report.components[:n]]
+    more = report.count - len(parts)
+    return "; ".join(parts) + (f"; +{more}" if more > 0 else "")
+
+def damage_step(frame: RegionFrame, scanned: List[TileJob], ctx: ScanCtx) -> List[Tuple[TileJob, Alert]]:
+    """Met à jour les cartes de défauts puis applique les seuils au total de chaque œuvre.
+
+    Une alerte n'est émise que si l'état de l'œuvre change ou si le nombre de
+    pixels en défaut a bougé depuis la précédente.
+    """
+    touched: Dict[int, List[TileJob]] = {}
+    for job in scanned:
+        touched.setdefault(job.art["id"], []).append(job)
+        if not job.reused:
+            _update_damage(frame, job, ctx)
+    out = []
+    now = time.time()
+    for aid, jobs in touched.items():
+        dm = DAMAGE.get(aid)
+        if dm is None:
+            continue
+        job = jobs[0]
+        a = job.art
+        report = dm.analyze()
+        susp_t, degr_t = art_thresholds(a, ctx)
+        prev, _, prev_px = ART_EVENT.get(aid, ("none", 0.0, 0))
+        state = "degradation" if report.pixels >= degr_t else "suspicion" if report.pixels >= susp_t else "none"
+        if state == "none":
+            if prev != "none":
+                ART_EVENT[aid] = ("none", now, 0)
+            continue
+        # l'état de l'œuvre sert de risque aux tuiles en défaut (planificateur)
+        for j in jobs:
+            if j.diffs:
+                LAST_EVENT[(aid, (j.tile.x, j.tile.y, j.tile.w, j.tile.h))] = (state, now)
+        if state == prev and report.pixels == prev_px:
+            continue
+        ART_EVENT[aid] = (state, now, report.pixels)
+        t = degr_t if state == "degradation" else susp_t
+        out.append((job, Alert(
+            state,
+            prev != "none",  # un seul embed par incident, modifié ensuite
+            "Dégradation en cours !" if state == "degradation" else "Suspicion de dégradation",
+            f"Œuvre: {a['name']} | dégâts={report.pixels} px (≥{t}) en {report.count} zone(s) : {_zones(report)}"
+            f" | zone=({a['x']},{a['y']},{a['w']},{a['h']})",
+            "#E74C3C" if state == "degradation" else "#F1C40F",
+            aid,
+        )))
+    return out
+
+RECORDER = FrameRecorder(FRAMES_DIR, FRAMES_MAX_MB << 20, FRAMES_MAX_HOURS * 3600)
+
+def record_step(frame: RegionFrame, scanned: List[TileJob], ctx: ScanCtx):
+    """Recopie les pixels scannés dans l'historique (l'encodage se fait hors boucle)."""
+    if not ctx.record_frames:
+        return
+    changed = {job.art["id"] for job in scanned if not job.reused}
+    done = set()
+    for job in scanned:
+        a = job.art
+        aid = a["id"]
+        if aid in done:
+            continue
+        # œuvre entièrement capturée : recopiée d'un coup ; sinon tuile par tuile
+        whole = frame.view(a["x"], a["y"], a["x"] + a["w"], a["y"] + a["h"])
+        if whole is not None:
+            RECORDER.update(aid, a["w"], a["h"], 0, 0, whole, aid in changed)
+            done.add(aid)
+            continue
+        patch = frame.view(*job.rect)
+        if patch is not None:
+            RECORDER.update(aid, a["w"], a["h"], job.tile.x, job.tile.y, patch, not job.reused)
+    RECORDER.tick(ctx.record_interval)
+
+StageHook = Callable[[str, float], None]
+
+class ScanPipeline:
+    """Enchaîne les étapes d'une passe ; chaque étape est remplaçable.
+
+    `on_stage(nom, secondes)` est appelé après chaque étape (plan, capture,
+    delta, diff, damage, alert, record) si défini. `delta=None` désactive la
+    détection de changements, `recorder=None` l'historique. Avec
+    alert_scope="artwork", les alertes viennent de `damage` (dégâts agrégés
+    par œuvre) ; sinon de `alerter`, tuile par tuile. `sink` ne doit pas
+    bloquer : par défaut, dépôt dans la file de DISPATCHER.
+    """
+
+    def __init__(
+        self,
+        scheduler=None,
+        capture=materialize,
+        delta=delta_step,
+        differ=diff_jobs,
+        alerter=alert_step,
+        damage=damage_step,
+        sink=alert_sink,
+        recorder=record_step,
+    ):
+        self.scheduler = scheduler or SCHEDULERS["priority"]
+        self.capture = capture
+        self.delta = delta
+        self.differ = differ
+        self.alerter = alerter
+        self.damage = damage
+        self.sink = sink
+        self.recorder = recorder
+        self.on_stage: Optional[StageHook] = None
+
+    def _timed(self, stage: str, t0: float) -> float:
+        t1 = time.perf_counter()
+        if self.on_stage:
+            self.on_stage(stage, t1 - t0)
+        return t1
+
+    async def tick(self, src: CanvasSource, table: Dict[int, Any], ctx: ScanCtx) -> List[TileJob]:
+        t = time.perf_counter()
+        jobs = self.scheduler.plan(table, ctx)
+        t = self._timed("plan", t)
+        if not jobs:
+            return []
+        frame = await self.capture(src, jobs, ctx)
+        t = self._timed("capture", t)
+        if frame is None:
+            return []
+        if self.delta is not None:
+            jobs = self.delta(frame, jobs, table, ctx, self.scheduler)
+            t = self._timed("delta", t)
+        scanned = self.differ(frame, jobs, ctx)
+        if inspect.isawaitable(scanned):
+            scanned = await scanned
+        t = self._timed("diff", t)
+        if self.damage is not None and ctx.alert_scope == "artwork":
+            alerts = self.damage(frame, scanned, ctx)
+            t = self._timed("damage", t)
+        else:
+            alerts = [(job, self.alerter(job, ctx)) for job in scanned]
+        for job, alert in alerts:
+            if alert is not None:
+                self.scheduler.mark_hot(job.art["id"])
+                ALERTS_TOTAL.inc(alert.kind, "update" if alert.update else "send")
+                self.sink(alert)
+        self.scheduler.observe(scanned)
+        t = self._timed("alert", t)
+        if self.recorder is not None:
+            self.recorder(frame, scanned, ctx)
+            self._timed("record", t)
+        return scanned
+
+async def refresh_tilers(table: Dict[int, Any], ctx: ScanCtx):
+    """(Re)build les tuiles d'une œuvre si ses assets ou le tuilage ont changé."""
+    for aid, a in table.items():
+        assets = await ASSETS.aget(aid)
+        fp = (assets.version, a["w"], a["h"], ctx.tile_w, ctx.tile_h, ctx.ignore_outside, ctx.detourage_mode)
+        if aid in TILERS and TPL_FP.get(aid) == fp:
+            continue
+        tiles = build_tiles(a["w"], a["h"], ctx.tile_w, ctx.tile_h)
+        if ctx.ignore_outside:
+            inside = assets.inside_mask(ctx.detourage_mode)
+            if inside is not None:
+                tiles = [tr for tr in tiles if np.any(inside[tr.y : tr.y + tr.h, tr.x : tr.x + tr.w])]
+        TILERS[aid] = TilerState(tiles, 0)
+        TPL_FP[aid] = fp
+        FINGERPRINTS.drop(aid)
+        DAMAGE.pop(aid, None)
+
+# ============================================================================
+# Cadence adaptative
+# ============================================================================
+AUTO_MAX_FACTOR = 16  # budget auto plafonné à N x tiles_global_per_tick
+
+class RateController:
+    """Boucle fermée sur le coût mesuré des passes.
+
+    Chaque passe mesure son temps de travail (lecture config -> alertes) et
+    le retard de la boucle asyncio (dépassement du sleep). Avec `auto_rate`,
+    le budget de tuiles vise `target_load` x période d'après le coût moyen
+    d'une tuile de budget, il est réduit de 30 % quand le retard dépasse
+    `target_lag_ms`, et la période s'allonge si une seule tuile par passe
+    dépasse déjà la cible. Sans `auto_rate`, seule la config s'applique.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.budget: Optional[float] = None
+        self.cap = 1.0
+        self.period = 1.0
+        self.work = 0.0  # s par passe (moyenne glissante)
+        self.unit_cost = 0.0  # s par tuile de budget (moyenne glissante)
+        self.lag = 0.0  # retard de la boucle asyncio (moyenne glissante)
+        self.stages: Dict[str, float] = {}
+        self.ticks = 0
+
+    @staticmethod
+    def _ema(old: float, new: float, first: bool) -> float:
+        return new if first else 0.8 * old + 0.2 * new
+
+    def on_stage(self, stage: str, dt: float):
+        self.stages[stage] = self._ema(self.stages.get(stage, dt), dt, stage not in self.stages)
+
+    def apply(self, ctx: ScanCtx):
+        """Fixe le budget et la période de la passe à venir."""
+        self.enabled = ctx.auto_rate
+        if not ctx.auto_rate:
+            self.budget = None
+            self.period = ctx.period
+            return
+        if self.budget is None:
+            self.budget = float(ctx.tiles_global)
+        self.cap = float(ctx.tiles_global * AUTO_MAX_FACTOR)
+        ctx.tiles_global = max(1, int(self.budget))
+        ctx.period = max(ctx.period, self.unit_cost / ctx.target_load)
+        self.period = ctx.period
+
+    def record(self, ctx: ScanCtx, work: float):
+        first = self.ticks == 0
+        self.ticks += 1
+        self.work = self._ema(self.work, work, first)
+        self.unit_cost = self._ema(self.unit_cost, work / max(1, ctx.tiles_global), first)
+        if ctx.auto_rate and self.budget is not None and self.unit_cost > 0:
+            target = ctx.target_load * ctx.period / self.unit_cost
+            self.budget = 0.7 * self.budget + 0.3 * target
+            if self.lag > ctx.target_lag:
+                self.budget *= 0.7
+            self.budget = min(max(self.budget, 1.0), self.cap)
+
+    def record_lag(self, lag: float):
+        self.lag = self._ema(self.lag, max(0.0, lag), self.ticks <= 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "auto": self.enabled,
+            "tiles_global_per_tick": int(self.budget) if self.budget is not None else None,
+            "scan_hz": round(1.0 / self.period, 3) if self.period else None,
+            "work_ms": round(self.work * 1000, 2),
+            "tile_cost_ms": round(self.unit_cost * 1000, 3),
+            "loop_lag_ms": round(self.lag * 1000, 2),
+            "load": round(self.work / self.period, 3) if self.period else None,
+            "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()},
+            "ticks": self.ticks,
+        }
+
+RATE = RateController()
+
 # ============================================================================
 # Worker principal
 # ============================================================================
 _running = False
+PIPELINE = ScanPipeline()
+
+def _on_stage(stage: str, dt: float):
+    RATE.on_stage(stage, dt)
+    STAGE_SECONDS.observe(dt, stage)
+
+PIPELINE.on_stage = _on_stage
+
+# ============================================================================
+# Flux /events : œuvres, résultats de tuiles, transitions d'alerte, couverture
+# ============================================================================
+EVENTS = EventBus()
+COVERAGE_EVERY_S = 2.0
+TILE_DIFFS: Dict[int, Dict[Tuple[int, int, int, int], int]] = {}  # dernier diff connu par tuile
+ART_STATE: Dict[int, str] = {}  # état d'alerte publié par œuvre
+COVERAGE: Dict[str, Any] = {"rate": 0.0, "arts": {}}  # dernière couverture publiée
+_next_coverage = 0.0
+
+def _art_payload(r) -> Dict[str, Any]:
+    return {k: r[k] for k in ("id", "name", "x", "y", "w", "h", "mode")}
+
+def publish_art(aid: int, row=None):
+    """Œuvre créée, modifiée ou supprimée (appelé après l'écriture ; `row` évite une relecture)."""
+    if not EVENTS.active:
+        EVENTS.skip()
+        return
+    if row is None:
+        row = DB.read(lambda con: con.execute("SELECT * FROM artworks WHERE id=?", (aid,)).fetchone())
+    EVENTS.publish("art", {"op": "put", "art": _art_payload(row)} if row else {"op": "del", "id": aid})
+
+def _art_state(aid: int, ctx: ScanCtx) -> str:
+    if ctx.alert_scope == "artwork":
+        return ART_EVENT.get(aid, ("none", 0.0, 0))[0]
+    worst = max(TILE_DIFFS.get(aid, {}).values(), default=0)
+    return "degradation" if worst >= ctx.degr_t else "suspicion" if worst >= ctx.susp_t else "none"
+
+def publish_pass(scanned: List[TileJob], table: Dict[int, Any], ctx: ScanCtx, rate: float):
+    """Deltas d'une passe : tuiles dont le diff a changé, états d'œuvre, couverture (périodique)."""
+    global _next_coverage
+    for aid in [k for k in TILE_DIFFS if k not in table]:
+        del TILE_DIFFS[aid]
+        ART_STATE.pop(aid, None)
+        LAST_ALERT.pop(aid, None)
+    changed = []
+    for job in scanned:
+        aid, t = job.art["id"], job.tile
+        key = (t.x, t.y, t.w, t.h)
+        tiles = TILE_DIFFS.setdefault(aid, {})
+        if tiles.get(key, 0) != job.diffs:
+            changed.append([aid, *key, job.diffs])
+        tiles[key] = job.diffs
+    live = EVENTS.active
+    if changed and live:
+        EVENTS.publish("tiles", changed)
+    elif changed:
+        EVENTS.skip()
+    for aid in {job.art["id"] for job in scanned}:
+        state = _art_state(aid, ctx)
+        if state == ART_STATE.get(aid, "none"):
+            continue
+        ART_STATE[aid] = state
+        if not live:
+            EVENTS.skip()
+            continue
+        alert = LAST_ALERT.get(aid) if state != "none" else None
+        EVENTS.publish("alert", {
+            "id": aid, "state": state,
+            "title": alert.title if alert else "", "description": alert.description if alert else "",
+        })
+    now = time.monotonic()
+    if now < _next_coverage:
+        return
+    _next_coverage = now + COVERAGE_EVERY_S
+    if not live:
+        return  # couverture recalculée à l'instantané
+    cov = {str(aid): [round(v["max_age_s"]), v["overdue"]] for aid, v in PIPELINE.scheduler.staleness()["artworks"].items()}
+    delta = {k: v for k, v in cov.items() if COVERAGE["arts"].get(k) != v}
+    gone = [k for k in COVERAGE["arts"] if k not in cov]
+    rate = round(rate, 1)
+    if delta or gone or rate != COVERAGE["rate"]:
+        EVENTS.publish("coverage", {"rate": rate, "arts": delta, "gone": gone})
+    COVERAGE["rate"], COVERAGE["arts"] = rate, cov
+
+async def events_snapshot() -> Dict[str, Any]:
+    rows = await DB.aread(lambda con: con.execute("SELECT * FROM artworks ORDER BY id ASC").fetchall())
+    cov = {str(aid): [round(v["max_age_s"]), v["overdue"]] for aid, v in PIPELINE.scheduler.staleness()["artworks"].items()}
+    return {
+        "running": _running,
+        "arts": [_art_payload(r) for r in rows],
+        "tiles": [[aid, *k, d] for aid, tiles in TILE_DIFFS.items() for k, d in tiles.items() if d],
+        "states": {str(aid): s for aid, s in ART_STATE.items() if s != "none"},
+        "coverage": {"rate": COVERAGE["rate"], "arts": cov},
+    }
 
 async def monitor_loop():
     """Boucle de scan tuilé, équitable multi-œuvres, priorisation 'hot'."""
     global _running
-    page = await ensure_page()
+    src = await ensure_source()
     print("Surveillance ...")
+    DISPATCHER.start()
+    next_evict = 0.0
 
-    rr_ids: List[int] = []
-    rr_pos = 0
-    hot: set[int] = set()
-
-    while _running:
-        try:
-            con = db()
-            cfg = con.execute("SELECT * FROM config WHERE id=1").fetchone()
-            tol = int(cfg["tolerance"])
-            susp_t = int(cfg["suspicion_threshold"])
-            degr_t = int(cfg["degradation_threshold"])
-            stride = max(1, int(cfg["stride"] or 1))
-            staged = bool(cfg["staged_scan"])
-            tile_w = max(10, min(1000, int(cfg["tile_w"] or 100)))
-            tile_h = max(10, min(1000, int(cfg["tile_h"] or 100)))
-            tiles_global = max(1, int(cfg["tiles_global_per_tick"] or 64))
-            one_per_art = bool(cfg["one_tile_per_artwork"])
-            ignore_outside = bool(cfg["ignore_outside"])
-            detourage_mode = (cfg["detourage_mode"] or "alpha_only").strip()
-            scan_hz = float(cfg["scan_hz"] or 1.0)
-            period = max(0.2, 1.0 / scan_hz)
-
-            arts = con.execute("SELECT * FROM artworks ORDER BY id ASC").fetchall()
-            ids = [a["id"] for a in arts]
-            if rr_ids != ids:
-                rr_ids, rr_pos = ids, 0
-
-            # (Re)build tuiles si template a changé
-            for a in arts:
-                aid = a["id"]
-                trow = con.execute("SELECT w,h,rgba FROM templates WHERE artwork_id=?", (aid,)).fetchone()
-                fp = (trow["w"], trow["h"], len(trow["rgba"])) if trow else (0, 0, 0)
-                rebuild = (aid not in TILERS) or (TPL_FP.get(aid) != fp)
-                if rebuild:
-                    tiles = build_tiles(a["w"], a["h"], tile_w, tile_h)
-                    if ignore_outside:
-                        tpl_alpha = None
-                        poly_mask = None
-                        if trow:
-                            tpl = np.frombuffer(trow["rgba"], dtype=np.uint8).reshape((trow["h"], trow["w"], 4))
-                            tpl_alpha = (tpl[..., 3] > 0)
-                        mrow = con.execute("SELECT w,h,mask FROM masks WHERE artwork_id=?", (aid,)).fetchone()
-                        if mrow:
-                            poly_mask = (
-                                np.frombuffer(mrow["mask"], dtype=np.uint8)
-                                .reshape((mrow["h"], mrow["w"])) > 0
-                            )
-                        keep = []
-                        for tr in tiles:
-                            sub = None
-                            if detourage_mode == "alpha_only" and tpl_alpha is not None:
-                                sub = tpl_alpha[tr.y : tr.y + tr.h, tr.x : tr.x + tr.w]
-                            elif detourage_mode == "polygon_only" and poly_mask is not None:
-                                sub = poly_mask[tr.y : tr.y + tr.h, tr.x : tr.x + tr.w]
-                            else:  # alpha_or_polygon
-                                if tpl_alpha is not None and poly_mask is not None:
-                                    sub = tpl_alpha[tr.y:tr.y+tr.h, tr.x:tr.x+tr.w] | poly_mask[tr.y:tr.y+tr.h, tr.x:tr.x+tr.w]
-                                elif tpl_alpha is not None:
-                                    sub = tpl_alpha[tr.y:tr.y+tr.h, tr.x:tr.x+tr.w]
-                                elif poly_mask is not None:
-                                    sub = poly_mask[tr.y:tr.y+tr.h, tr.x:tr.x+tr.w]
-                            if (sub is None) or np.any(sub):
-                                keep.append(tr)
-                        tiles = keep
-                    TILERS[aid] = TilerState(tiles, 0)
-                    TPL_FP[aid] = fp
-
-            # Frame unique partagée pour la passe
-            frame = await get_full_canvas(page)
-            if frame is None:
-                await asyncio.sleep(period)
-                continue
-
-            # Planification équitable
-            budget = tiles_global
-            order = rr_ids[:]
-            if hot:
-                hot_order = [i for i in order if i in hot]
-                cold_order = [i for i in order if i not in hot]
-                order = hot_order + cold_order
-
-            idx = rr_pos
-            if one_per_art:
-                for _ in range(len(order)):
-                    if budget <= 0:
-                        break
-                    aid = order[idx]
-                    idx = (idx + 1) % len(order)
-                    a = next((x for x in arts if x["id"] == aid), None)
-                    if not a:
-                        continue
-                    tile = next_tile(aid)
-                    if not tile:
-                        continue
-
-                    y0 = a["y"] + tile.y
-                    y1 = y0 + tile.h
-                    x0 = a["x"] + tile.x
-                    x1 = x0 + tile.w
-                    cur = frame[y0:y1, x0:x1, :]
-
-                    trow = con.execute("SELECT w,h,rgba FROM templates WHERE artwork_id=?", (aid,)).fetchone()
-                    grow = con.execute("SELECT w,h,rgba FROM grounds   WHERE artwork_id=?", (aid,)).fetchone()
-                    mrow = con.execute("SELECT w,h,mask FROM masks WHERE artwork_id=?", (aid,)).fetchone()
-                    mode = a["mode"] or "build"
-
-                    if trow and grow:
-                        tpl = np.frombuffer(trow["rgba"], dtype=np.uint8).reshape((trow["h"], trow["w"], 4))
-                        grd = np.frombuffer(grow["rgba"], dtype=np.uint8).reshape((grow["h"], grow["w"], 4))
-                        tpl_t = tpl[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-                        grd_t = grd[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-
-                        alpha_mask = tpl_t[..., 3] > 0
-                        deface_mask = (
-                            (tpl_t[..., 0] == DEFACE_RGB[0])
-                            & (tpl_t[..., 1] == DEFACE_RGB[1])
-                            & (tpl_t[..., 2] == DEFACE_RGB[2])
-                        )
-
-                        poly_mask_t = None
-                        if mrow:
-                            msk = np.frombuffer(mrow["mask"], dtype=np.uint8).reshape((mrow["h"], mrow["w"]))
-                            poly_mask_t = msk[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w] > 0
-
-                        if detourage_mode == "alpha_only":
-                            inside = alpha_mask
-                        elif detourage_mode == "polygon_only":
-                            inside = poly_mask_t if poly_mask_t is not None else alpha_mask
-                        else:
-                            inside = alpha_mask | (poly_mask_t if poly_mask_t is not None else False)
-
-                        tpl_ok = within_tol(cur, tpl_t, tol)
-                        grd_ok = within_tol(cur, grd_t, tol)
-                        ok_inside_nondef = (tpl_ok | grd_ok) if mode == "build" else tpl_ok
-                        ok_inside = np.where(deface_mask, grd_ok, ok_inside_nondef)
-                        ok_outside = True if ignore_outside else grd_ok
-                        ok = np.where(inside, ok_inside, ok_outside)
-                        diffs = count_diff_mask(ok)
-                    else:
-                        # Fallback baseline uniquement
-                        brow = con.execute("SELECT w,h,rgba FROM baselines WHERE artwork_id=?", (aid,)).fetchone()
-                        if not brow:
-                            budget -= 1
-                            continue
-                        base = np.frombuffer(brow["rgba"], dtype=np.uint8).reshape((brow["h"], brow["w"], 4))
-                        base_t = base[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-                        diffs = count_diff_pixels(base_t, cur, tol, stride=stride)
-                        if staged and diffs >= max(3, susp_t // 2) and stride > 1:
-                            diffs = count_diff_pixels(base_t, cur, tol, stride=1)
-
-                    tile_key = (aid, (tile.x, tile.y, tile.w, tile.h))
-                    prev = LAST_EVENT.get(tile_key, ("none", 0.0))[0]
-
-                    if diffs >= degr_t:
-                        print("Dégradation en cours !")
-                        title = "Dégradation en cours !"
-                        desc = (
-                            f"Œuvre: {a['name']} | tuile=({tile.x},{tile.y},{tile.w},{tile.h}) | "
-                            f"diffs={diffs} (≥{degr_t}) | zone=({a['x']},{a['y']},{a['w']},{a['h']})"
-                        )
-                        if prev == "suspicion":
-                            sim_embed_update(title, desc, "#E74C3C")
-                        else:
-                            sim_embed_send(title, desc, "#E74C3C")
-                        LAST_EVENT[tile_key] = ("degradation", time.time())
-                        hot.add(aid)
-                    elif diffs >= susp_t:
-                        print("Suspicion dégradation")
-                        title = "Suspicion de dégradation"
-                        desc = (
-                            f"Œuvre: {a['name']} | tuile=({tile.x},{tile.y},{tile.w},{tile.h}) | "
-                            f"diffs={diffs} (≥{susp_t}) | zone=({a['x']},{a['y']},{a['w']},{a['h']})"
-                        )
-                        if prev in ("suspicion", "degradation"):
-                            sim_embed_update(title, desc, "#F1C40F")
-                        else:
-                            sim_embed_send(title, desc, "#F1C40F")
-                        LAST_EVENT[tile_key] = ("suspicion", time.time())
-                        hot.add(aid)
-
-                    budget -= 1
-                    if budget <= 0:
-                        break
-
-            rr_pos = idx
-
-            # Passe 2 : consomme le reste du budget en round-robin
-            idx2 = rr_pos
-            while budget > 0 and rr_ids:
-                aid = rr_ids[idx2]
-                idx2 = (idx2 + 1) % len(rr_ids)
-                a = next((x for x in arts if x["id"] == aid), None)
-                if not a:
-                    continue
-                tile = next_tile(aid)
-                if not tile:
-                    continue
-
-                y0 = a["y"] + tile.y
-                y1 = y0 + tile.h
-                x0 = a["x"] + tile.x
-                x1 = x0 + tile.w
-                cur = frame[y0:y1, x0:x1, :]
-
-                trow = con.execute("SELECT w,h,rgba FROM templates WHERE artwork_id=?", (aid,)).fetchone()
-                grow = con.execute("SELECT w,h,rgba FROM grounds   WHERE artwork_id=?", (aid,)).fetchone()
-                mrow = con.execute("SELECT w,h,mask FROM masks WHERE artwork_id=?", (aid,)).fetchone()
-                mode = a["mode"] or "build"
-
-                if trow and grow:
-                    tpl = np.frombuffer(trow["rgba"], dtype=np.uint8).reshape((trow["h"], trow["w"], 4))
-                    grd = np.frombuffer(grow["rgba"], dtype=np.uint8).reshape((grow["h"], grow["w"], 4))
-                    tpl_t = tpl[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-                    grd_t = grd[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-
-                    alpha_mask = tpl_t[..., 3] > 0
-                    deface_mask = (
-                        (tpl_t[..., 0] == DEFACE_RGB[0])
-                        & (tpl_t[..., 1] == DEFACE_RGB[1])
-                        & (tpl_t[..., 2] == DEFACE_RGB[2])
-                    )
-
-                    poly_mask_t = None
-                    if mrow:
-                        msk = np.frombuffer(mrow["mask"], dtype=np.uint8).reshape((mrow["h"], mrow["w"]))
-                        poly_mask_t = msk[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w] > 0
-
-                    if detourage_mode == "alpha_only":
-                        inside = alpha_mask
-                    elif detourage_mode == "polygon_only":
-                        inside = poly_mask_t if poly_mask_t is not None else alpha_mask
-                    else:
-                        inside = alpha_mask | (poly_mask_t if poly_mask_t is not None else False)
-
-                    tpl_ok = within_tol(cur, tpl_t, tol)
-                    grd_ok = within_tol(cur, grd_t, tol)
-                    ok_inside_nondef = (tpl_ok | grd_ok) if mode == "build" else tpl_ok
-                    ok_inside = np.where(deface_mask, grd_ok, ok_inside_nondef)
-                    ok_outside = True if ignore_outside else grd_ok
-                    ok = np.where(inside, ok_inside, ok_outside)
-                    diffs = count_diff_mask(ok)
-                else:
-                    brow = con.execute("SELECT w,h,rgba FROM baselines WHERE artwork_id=?", (aid,)).fetchone()
-                    if not brow:
-                        budget -= 1
-                        continue
-                    base = np.frombuffer(brow["rgba"], dtype=np.uint8).reshape((brow["h"], brow["w"], 4))
-                    base_t = base[tile.y : tile.y + tile.h, tile.x : tile.x + tile.w, :]
-                    diffs = count_diff_pixels(base_t, cur, tol, stride=stride)
-                    if staged and diffs >= max(3, susp_t // 2) and stride > 1:
-                        diffs = count_diff_pixels(base_t, cur, tol, stride=1)
-
-                tile_key = (aid, (tile.x, tile.y, tile.w, tile.h))
-                prev = LAST_EVENT.get(tile_key, ("none", 0.0))[0]
-
-                if diffs >= degr_t:
-                    print("Dégradation en cours !")
-                    title = "Dégradation en cours !"
-                    desc = (
-                        f"Œuvre: {a['name']} | tuile=({tile.x},{tile.y},{tile.w},{tile.h}) | "
-                        f"diffs={diffs} (≥{degr_t}) | zone=({a['x']},{a['y']},{a['w']},{a['h']})"
-                    )
-                    if prev == "suspicion":
-                        sim_embed_update(title, desc, "#E74C3C")
-                    else:
-                        sim_embed_send(title, desc, "#E74C3C")
-                    LAST_EVENT[tile_key] = ("degradation", time.time())
-                    hot.add(aid)
-                elif diffs >= susp_t:
-                    print("Suspicion dégradation")
-                    title = "Suspicion de dégradation"
-                    desc = (
-                        f"Œuvre: {a['name']} | tuile=({tile.x},{tile.y},{tile.w},{tile.h}) | "
-                        f"diffs={diffs} (≥{susp_t}) | zone=({a['x']},{a['y']},{a['w']},{a['h']})"
+    try:
+        while _running:
+            t_tick = time.perf_counter()
+            try:
+                cfg, arts = await DB.monitor.aread(
+                    lambda con: (
+                        con.execute("SELECT * FROM config WHERE id=1").fetchone(),
+                        con.execute("SELECT * FROM artworks ORDER BY id ASC").fetchall(),
                     )
-                    if prev in ("suspicion", "degradation"):
-                        sim_embed_update(title, desc, "#F1C40F")
-                    else:
-                        sim_embed_send(title, desc, "#F1C40F")
-                    LAST_EVENT[tile_key] = ("suspicion", time.time())
-                    hot.add(aid)
-
-                budget -= 1
+                )
+                ctx = ScanCtx.from_row(cfg)
+                RATE.apply(ctx)
+                ctx.tiles_plan = FINGERPRINTS.plan_budget(ctx.tiles_global)
+                PIPELINE.scheduler = SCHEDULERS.get(ctx.scheduler, SCHEDULERS["priority"])
+                table = {a["id"]: a for a in arts}
+                await refresh_tilers(table, ctx)
+                sync_tile_index(table)
+                FINGERPRINTS.forget(table)
+                if _DIFF_POOL is not None:
+                    _DIFF_POOL.forget(list(table))
+                RECORDER.forget(table)
+                for aid in [k for k in DAMAGE if k not in table]:
+                    del DAMAGE[aid]
+                    ART_EVENT.pop(aid, None)
+                DISPATCHER.configure(cfg["discord_webhook"])
+                if time.monotonic() >= next_evict:
+                    next_evict = time.monotonic() + 60.0
+                    for key in [k for k in LAST_EVENT if k[0] not in table]:
+                        del LAST_EVENT[key]
+                    evict_events(LAST_EVENT, EVENT_TTL)
+                    DISPATCHER.forget(table)
+                scanned = await PIPELINE.tick(src, table, ctx)
+                # le temps de la passe est déduit du sleep : cadence sans dérive
+                elapsed = time.perf_counter() - t_tick
+                RATE.record(ctx, elapsed)
+                reused = sum(1 for j in scanned if j.reused)
+                TILES_TOTAL.inc("diffed", n=len(scanned) - reused)
+                TILES_TOTAL.inc("reused", n=reused)
+                TILES_RATE.set(len(scanned) / max(ctx.period, elapsed))
+                publish_pass(scanned, table, ctx, len(scanned) / max(ctx.period, elapsed))
+                TICK_SECONDS.observe(elapsed)
+                delay = max(0.0, ctx.period - elapsed)
+                t_sleep = time.perf_counter()
+                await asyncio.sleep(delay)
+                RATE.record_lag(time.perf_counter() - t_sleep - delay)
+
+            except Exception as e:
+                print("[Worker] erreur:", e)
+                await asyncio.sleep(0.5)
+    finally:
+        get_diff_pool(0)  # workers et segments de mémoire partagée libérés
+    # arrêt : les alertes encore en file partent tout de suite
+    await DISPATCHER.flush()
 
-            await asyncio.sleep(period)
-
-        except Exception as e:
-            print("[Worker] erreur:", e)
-            await asyncio.sleep(0.5)
+# ============================================================================
+# Index spatial des œuvres (requêtes /artworks/at et /artworks/region)
+# ============================================================================
+class ArtworkIndex:
+    """Grille des rectangles d'œuvres, reconstruite à la demande après `invalidate()`."""
+
+    def __init__(self, cell: int = 256):
+        self.cell = cell
+        self.lock = threading.Lock()
+        self.grid = GridIndex(cell)
+        self.rows: Dict[int, Any] = {}
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def _fresh(self) -> GridIndex:
+        with self.lock:
+            if self.stale:
+                self.stale = False  # avant la lecture : une écriture concurrente re-invalide
+                rows = DB.read(lambda con: con.execute("SELECT * FROM artworks").fetchall())
+                grid = GridIndex(self.cell)
+                for r in rows:
+                    if r["w"] and r["h"]:
+                        grid.insert(r["id"], (r["x"], r["y"], r["x"] + r["w"], r["y"] + r["h"]))
+                self.grid, self.rows = grid, {r["id"]: r for r in rows}
+            return self.grid
+
+    def query(self, box: Box) -> List[Any]:
+        ids = self._fresh().query(box)
+        return [self.rows[i] for i in sorted(ids, reverse=True)]
+
+# Côté max d'un rectangle de requête (/artworks/region) : la carte wplace, 2048 tuiles de 1000 px.
+REGION_MAX = 2048 * 1000
+ART_INDEX = ArtworkIndex()
 
 # ============================================================================
 # FastAPI app & routes
 # ============================================================================
-app = FastAPI(title="Blue Scan (strict BM)")
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    yield
+    await _shutdown()
+
+app = FastAPI(title="Blue Scan (strict BM)", lifespan=_lifespan)
 
 # CORS large pour l’UI userscript
 app.add_middleware(
@@ -661,18 +2119,19 @@ def healthz():
 
 @app.post("/config")
 def set_config(c: ConfigIn):
-    con = db()
-    con.execute(
-        """
+    sql = """
       UPDATE config SET guild_id=?, channel_id=?, discord_webhook=?,
         poll_ms=?, scan_hz=?, tolerance=?,
         suspicion_threshold=?, degradation_threshold=?,
         stride=?, staged_scan=?,
         tile_w=?, tile_h=?, tiles_per_tick=?, ignore_outside=?,
-        tiles_global_per_tick=?, one_tile_per_artwork=?, detourage_mode=?
+        tiles_global_per_tick=?, one_tile_per_artwork=?, detourage_mode=?,
+        capture_mode=?, scan_workers=?, scheduler=?, max_revisit_s=?,
+        auto_rate=?, target_load=?, target_lag_ms=?,
+        record_frames=?, record_interval_s=?, alert_scope=?, diff_engine=?
       WHERE id=1
-    """,
-        (
+    """
+    params = (
             c.guild_id,
             c.channel_id,
             c.discord_webhook,
@@ -690,15 +2149,24 @@ def set_config(c: ConfigIn):
             max(1, c.tiles_global_per_tick),
             1 if c.one_tile_per_artwork else 0,
             (c.detourage_mode or "alpha_only"),
-        ),
+            (c.capture_mode if c.capture_mode in ("roi", "full", "stream") else "roi"),
+            max(0, min(os.cpu_count() or 1, c.scan_workers)),
+            (c.scheduler if c.scheduler in SCHEDULERS else "priority"),
+            max(1.0, c.max_revisit_s),
+            1 if c.auto_rate else 0,
+            max(0.05, min(0.95, c.target_load)),
+            max(1, c.target_lag_ms),
+            1 if c.record_frames else 0,
+            max(0.2, c.record_interval_s),
+            (c.alert_scope if c.alert_scope in ("artwork", "tile") else "tile"),
+            (c.diff_engine if c.diff_engine in ("rgba", "palette", "page") else "rgba"),
     )
-    con.commit()
+    DB.write(lambda con: con.execute(sql, params))
     return {"ok": True}
 
 @app.get("/config", response_model=ConfigIn)
 def get_config():
-    con = db()
-    r = con.execute("SELECT * FROM config WHERE id=1").fetchone()
+    r = DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
     return ConfigIn(
         guild_id=r["guild_id"] or "",
         channel_id=r["channel_id"] or "",
@@ -717,20 +2185,35 @@ def get_config():
         tiles_global_per_tick=int(r["tiles_global_per_tick"] or 64),
         one_tile_per_artwork=bool(r["one_tile_per_artwork"]),
         detourage_mode=r["detourage_mode"] or "alpha_only",
+        capture_mode=r["capture_mode"] or "roi",
+        scan_workers=int(r["scan_workers"] or 0),
+        scheduler=r["scheduler"] or "priority",
+        max_revisit_s=float(r["max_revisit_s"] or 60.0),
+        auto_rate=bool(r["auto_rate"]),
+        target_load=float(r["target_load"] or 0.5),
+        target_lag_ms=int(r["target_lag_ms"] or 50),
+        record_frames=bool(r["record_frames"]),
+        record_interval_s=float(r["record_interval_s"] or 1.0),
+        alert_scope=r["alert_scope"] or "tile",
+        diff_engine=r["diff_engine"] or "rgba",
     )
 
 @app.post("/artworks", response_model=ArtworkOut)
 def add_artwork(a: ArtworkIn):
     if a.w <= 0 or a.h <= 0:
         raise HTTPException(400, "w/h > 0")
-    con = db()
     added = time.strftime("%Y-%m-%d %H:%M:%S")
-    cur = con.execute(
-        "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
-        (a.name, a.x, a.y, a.w, a.h, added),
-    )
-    con.commit()
-    r = con.execute("SELECT * FROM artworks WHERE id=?", (cur.lastrowid,)).fetchone()
+
+    def _w(con):
+        cur = con.execute(
+            "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
+            (a.name, a.x, a.y, a.w, a.h, added),
+        )
+        return con.execute("SELECT * FROM artworks WHERE id=?", (cur.lastrowid,)).fetchone()
+
+    r = DB.write(_w)
+    ART_INDEX.invalidate()
+    publish_art(r["id"], r)
     return ArtworkOut(
         id=r["id"],
         name=r["name"],
@@ -752,24 +2235,25 @@ def add_artwork_corners(a: ArtworkCornersIn):
     h = y1 - y0 + 1
     if w <= 0 or h <= 0:
         raise HTTPException(400, "corners invalides")
-    con = db()
     added = time.strftime("%Y-%m-%d %H:%M:%S")
-    cur = con.execute(
-        "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
-        (a.name, x0, y0, w, h, added),
-    )
-    art_id = cur.lastrowid
     # Mask polygon relatif
     poly_rel = [(p[0] - x0, p[1] - y0) for p in a.corners]
     mask_img = Image.new("L", (w, h), 0)
     ImageDraw.Draw(mask_img).polygon(poly_rel, fill=255)
     arr = np.array(mask_img, dtype=np.uint8)
-    con.execute(
-        "REPLACE INTO masks(artwork_id,w,h,mask) VALUES(?,?,?,?)",
-        (art_id, w, h, sqlite3.Binary(arr.tobytes())),
-    )
-    con.commit()
-    r = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+
+    def _w(con):
+        cur = con.execute(
+            "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
+            (a.name, x0, y0, w, h, added),
+        )
+        set_asset(con, ASSET_STORE, cur.lastrowid, "mask", arr)
+        return con.execute("SELECT * FROM artworks WHERE id=?", (cur.lastrowid,)).fetchone()
+
+    r = DB.write(_w)
+    ASSETS.invalidate(r["id"])
+    ART_INDEX.invalidate()
+    publish_art(r["id"], r)
     return ArtworkOut(
         id=r["id"],
         name=r["name"],
@@ -781,10 +2265,7 @@ def add_artwork_corners(a: ArtworkCornersIn):
         mode=r["mode"],
     )
 
-@app.get("/artworks", response_model=List[ArtworkOut])
-def list_artworks():
-    con = db()
-    rows = con.execute("SELECT * FROM artworks ORDER BY id DESC").fetchall()
+def _art_list(rows) -> List[ArtworkOut]:
     return [
         ArtworkOut(
             id=r["id"],
@@ -799,22 +2280,40 @@ def list_artworks():
         for r in rows
     ]
 
+@app.get("/artworks", response_model=List[ArtworkOut])
+def list_artworks():
+    rows = DB.read(lambda con: con.execute("SELECT * FROM artworks ORDER BY id DESC").fetchall())
+    return _art_list(rows)
+
+@app.get("/artworks/at", response_model=List[ArtworkOut])
+def artworks_at(x: int, y: int):
+    """Œuvres contenant le pixel (x, y)."""
+    return _art_list(ART_INDEX.query((x, y, x + 1, y + 1)))
+
+@app.get("/artworks/region", response_model=List[ArtworkOut])
+def artworks_region(x: int, y: int, w: int, h: int):
+    """Œuvres qui recoupent le rectangle (x, y, w, h), ex. le viewport de l'overlay."""
+    if w <= 0 or h <= 0:
+        raise HTTPException(400, "w/h > 0")
+    w, h = min(w, REGION_MAX), min(h, REGION_MAX)
+    return _art_list(ART_INDEX.query((x, y, x + w, y + h)))
+
 @app.delete("/artworks/{art_id}")
 def del_artwork(art_id: int):
-    con = db()
-    con.execute("DELETE FROM templates WHERE artwork_id=?", (art_id,))
-    con.execute("DELETE FROM grounds   WHERE artwork_id=?", (art_id,))
-    con.execute("DELETE FROM baselines WHERE artwork_id=?", (art_id,))
-    con.execute("DELETE FROM masks     WHERE artwork_id=?", (art_id,))
-    con.execute("DELETE FROM artworks  WHERE id=?", (art_id,))
-    con.commit()
+    def _w(con):
+        con.execute("DELETE FROM artworks WHERE id=?", (art_id,))
+        return drop_assets(con, art_id)
+
+    _collect(DB.write(_w))
+    ASSETS.invalidate(art_id)
+    ART_INDEX.invalidate()
+    publish_art(art_id)
     return {"ok": True}
 
 # -- STRICT BM: aucun resize ; on garde la taille native du PNG
 @app.post("/artworks/{art_id}/template")
 def set_template(art_id: int, t: TemplateIn):
-    con = db()
-    a = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+    a = DB.read(lambda con: con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone())
     if not a:
         raise HTTPException(404, "œuvre inconnue")
     if not t.data_url.startswith("data:image/"):
@@ -825,15 +2324,17 @@ def set_template(art_id: int, t: TemplateIn):
     im = Image.open(io.BytesIO(raw)).convert("RGBA")
     W, H = im.size
 
-    if (W, H) != (a["w"], a["h"]):
-        con.execute("UPDATE artworks SET w=?, h=? WHERE id=?", (W, H, art_id))
-
     arr = np.array(im, dtype=np.uint8)
-    con.execute(
-        "REPLACE INTO templates(artwork_id,w,h,rgba) VALUES(?,?,?,?)",
-        (art_id, W, H, sqlite3.Binary(arr.tobytes())),
-    )
-    con.commit()
+
+    def _w(con):
+        if (W, H) != (a["w"], a["h"]):
+            con.execute("UPDATE artworks SET w=?, h=? WHERE id=?", (W, H, art_id))
+        return set_asset(con, ASSET_STORE, art_id, "template", arr)
+
+    _collect(DB.write(_w))
+    ASSETS.invalidate(art_id)
+    ART_INDEX.invalidate()
+    publish_art(art_id)
     return {"ok": True, "w": W, "h": H}
 
 # -- Création stricte BM via TL + Template
@@ -847,20 +2348,21 @@ def place_tl(p: PlaceTLIn):
     W, H = im.size
     arr = np.array(im, dtype=np.uint8)
 
-    con = db()
     added = time.strftime("%Y-%m-%d %H:%M:%S")
-    cur = con.execute(
-        "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
-        (p.name, p.tl_x, p.tl_y, W, H, added),
-    )
-    art_id = cur.lastrowid
-    con.execute(
-        "REPLACE INTO templates(artwork_id,w,h,rgba) VALUES(?,?,?,?)",
-        (art_id, W, H, sqlite3.Binary(arr.tobytes())),
-    )
-    con.commit()
 
-    r = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+    def _w(con):
+        cur = con.execute(
+            "INSERT INTO artworks(name,x,y,w,h,added_at) VALUES(?,?,?,?,?,?)",
+            (p.name, p.tl_x, p.tl_y, W, H, added),
+        )
+        set_asset(con, ASSET_STORE, cur.lastrowid, "template", arr)
+        return con.execute("SELECT * FROM artworks WHERE id=?", (cur.lastrowid,)).fetchone()
+
+    r = DB.write(_w)
+    ASSETS.invalidate(r["id"])
+    ART_INDEX.invalidate()
+    publish_art(r["id"], r)
+
     return ArtworkOut(
         id=r["id"],
         name=r["name"],
@@ -874,47 +2376,171 @@ def place_tl(p: PlaceTLIn):
 
 @app.post("/artworks/{art_id}/snapshot")
 async def snapshot_baseline(art_id: int):
-    con = db()
-    a = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+    a = await DB.aread(lambda con: con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone())
     if not a:
         raise HTTPException(404, "œuvre inconnue")
-    page = await ensure_page()
-    arr = await get_region_rgba(page, a["x"], a["y"], a["w"], a["h"])
+    async with lease_source() as src:
+        arr = await get_region_rgba(src, a["x"], a["y"], a["w"], a["h"])
     if arr is None:
         raise HTTPException(500, "canvas introuvable")
-    con.execute(
-        "REPLACE INTO baselines(artwork_id,w,h,rgba) VALUES(?,?,?,?)",
-        (a["id"], a["w"], a["h"], sqlite3.Binary(arr.tobytes())),
-    )
-    con.commit()
+    _collect(await DB.awrite(lambda con: set_asset(con, ASSET_STORE, a["id"], "baseline", arr)))
+    ASSETS.invalidate(a["id"])
     return {"ok": True}
 
 @app.post("/artworks/{art_id}/ground_snapshot")
 async def snapshot_ground(art_id: int):
-    con = db()
-    a = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+    a = await DB.aread(lambda con: con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone())
     if not a:
         raise HTTPException(404, "œuvre inconnue")
-    page = await ensure_page()
-    arr = await get_region_rgba(page, a["x"], a["y"], a["w"], a["h"])
+    async with lease_source() as src:
+        arr = await get_region_rgba(src, a["x"], a["y"], a["w"], a["h"])
     if arr is None:
         raise HTTPException(500, "canvas introuvable")
-    con.execute(
-        "REPLACE INTO grounds(artwork_id,w,h,rgba) VALUES(?,?,?,?)",
-        (a["id"], a["w"], a["h"], sqlite3.Binary(arr.tobytes())),
-    )
-    con.commit()
+    _collect(await DB.awrite(lambda con: set_asset(con, ASSET_STORE, a["id"], "ground", arr)))
+    ASSETS.invalidate(a["id"])
     return {"ok": True}
 
 @app.post("/artworks/{art_id}/mode")
 def set_mode(art_id: int, m: ModeIn):
     if m.mode not in ("build", "protect"):
         raise HTTPException(400, "mode invalide")
-    con = db()
-    con.execute("UPDATE artworks SET mode=? WHERE id=?", (m.mode, art_id))
-    con.commit()
+    DB.write(lambda con: con.execute("UPDATE artworks SET mode=? WHERE id=?", (m.mode, art_id)))
+    ASSETS.invalidate(art_id)
+    publish_art(art_id)
     return {"ok": True, "mode": m.mode}
 
+@app.post("/artworks/{art_id}/thresholds")
+def set_thresholds(art_id: int, t: ThresholdsIn):
+    """Seuils de dégâts propres à l'œuvre (pixels agrégés) ; None rétablit ceux de la config."""
+    vals = [None if v is None else max(1, v) for v in (t.suspicion_threshold, t.degradation_threshold)]
+    n = DB.write(
+        lambda con: con.execute(
+            "UPDATE artworks SET suspicion_threshold=?, degradation_threshold=? WHERE id=?", (*vals, art_id)
+        ).rowcount
+    )
+    if not n:
+        raise HTTPException(404, "œuvre inconnue")
+    return {"ok": True, "suspicion_threshold": vals[0], "degradation_threshold": vals[1]}
+
+@app.get("/artworks/{art_id}/damage")
+def artwork_damage(art_id: int):
+    """Dernière analyse des dégâts : total, zones (englobante, pixels, couleurs posées)."""
+    dm = DAMAGE.get(art_id)
+    report = dm.report if dm is not None else DamageReport()
+    state, t, _ = ART_EVENT.get(art_id, ("none", 0.0, 0))
+    return {
+        "artwork_id": art_id,
+        "state": state,
+        "since": t or None,
+        "pixels": report.pixels,
+        "count": report.count,
+        "components": [c.__dict__ for c in report.components],
+    }
+
+# -- Import / export d'une œuvre complète (métadonnées + assets) en .npz
+@app.get("/artworks/{art_id}/export")
+def export_artwork(art_id: int):
+    def _r(con):
+        a = con.execute("SELECT * FROM artworks WHERE id=?", (art_id,)).fetchone()
+        return a, (load_assets(con, ASSET_STORE, art_id) if a else {})
+
+    a, arrs = DB.read(_r)
+    if not a:
+        raise HTTPException(404, "œuvre inconnue")
+    meta = {k: a[k] for k in ("name", "x", "y", "w", "h", "mode")}
+    return Response(
+        export_npz(meta, arrs),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="artwork-{art_id}.npz"'},
+    )
+
+# -- Historique (config record_frames) : frise, état à un instant, timelapse
+TIMELAPSE_MAX_FRAMES = 1000
+
+def _png(arr: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(arr, "RGBA").save(buf, "PNG")
+    return buf.getvalue()
+
+@app.get("/artworks/{art_id}/history")
+def artwork_history(art_id: int, start: float = 0.0, end: Optional[float] = None):
+    """Instants enregistrés (epoch, s) entre `start` et `end`."""
+    end = time.time() if end is None else end
+    return {
+        "artwork_id": art_id,
+        "frames": [{"t": t, "key": k == 0} for t, k in RECORDER.timeline(art_id, start, end)],
+    }
+
+@app.get("/artworks/{art_id}/history/frame")
+def artwork_history_frame(art_id: int, t: Optional[float] = None):
+    """État de l'œuvre à l'instant `t` (dernier enregistré) en PNG ; en-tête X-Frame-Time."""
+    got = RECORDER.at(art_id, time.time() if t is None else t)
+    if got is None:
+        raise HTTPException(404, "aucune frame enregistrée à cet instant")
+    ts, arr = got
+    return Response(_png(arr), media_type="image/png", headers={"X-Frame-Time": repr(ts)})
+
+@app.get("/artworks/{art_id}/history/timelapse")
+def artwork_history_timelapse(
+    art_id: int, start: float, end: Optional[float] = None, max_frames: int = 300, fps: float = 5.0
+):
+    """PNG animé (APNG) des états entre `start` et `end`, sous-échantillonné à `max_frames`."""
+    end = time.time() if end is None else end
+    n = len(RECORDER.timeline(art_id, start, end)) + 1  # + état en vigueur à start
+    step = -(-n // max(1, min(TIMELAPSE_MAX_FRAMES, max_frames)))
+    frames = [
+        Image.fromarray(st.copy(), "RGBA")
+        for i, (_, st) in enumerate(RECORDER.frames(art_id, start, end))
+        if i % step == 0 or i == n - 1
+    ]
+    if not frames:
+        raise HTTPException(404, "aucune frame enregistrée sur cet intervalle")
+    buf = io.BytesIO()
+    frames[0].save(
+        buf, "PNG", save_all=True, append_images=frames[1:],
+        duration=int(1000 / max(0.1, fps)), loop=0,
+    )
+    return Response(buf.getvalue(), media_type="image/apng")
+
+@app.post("/artworks/import", response_model=ArtworkOut)
+async def import_artwork(request: Request):
+    try:
+        meta, arrs = import_npz(await request.body())
+        x, y = int(meta["x"]), int(meta["y"])
+    except Exception as e:
+        raise HTTPException(400, f"archive invalide : {e}")
+    # STRICT BM : la taille native du template fait foi
+    ref = arrs.get("template")
+    H, W = ref.shape[:2] if ref is not None else (int(meta.get("h", 0)), int(meta.get("w", 0)))
+    if W <= 0 or H <= 0 or any(a.shape[:2] != (H, W) for a in arrs.values()):
+        raise HTTPException(400, "tailles d'assets incohérentes")
+    mode = meta.get("mode") if meta.get("mode") in ("build", "protect") else "build"
+    added = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _w(con):
+        cur = con.execute(
+            "INSERT INTO artworks(name,x,y,w,h,added_at,mode) VALUES(?,?,?,?,?,?,?)",
+            (str(meta.get("name") or "import"), x, y, W, H, added, mode),
+        )
+        for kind, arr in arrs.items():
+            set_asset(con, ASSET_STORE, cur.lastrowid, kind, arr)
+        return con.execute("SELECT * FROM artworks WHERE id=?", (cur.lastrowid,)).fetchone()
+
+    r = await DB.awrite(_w)
+    ASSETS.invalidate(r["id"])
+    ART_INDEX.invalidate()
+    publish_art(r["id"], r)
+    return ArtworkOut(
+        id=r["id"],
+        name=r["name"],
+        x=r["x"],
+        y=r["y"],
+        w=r["w"],
+        h=r["h"],
+        added_at=r["added_at"],
+        mode=r["mode"],
+    )
+
 @app.post("/monitor/start")
 async def monitor_start():
     global _running
@@ -923,10 +2549,128 @@ async def monitor_start():
     _running = True
     # Important: ne pas bloquer la requête HTTP
     asyncio.get_event_loop().create_task(monitor_loop())
+    EVENTS.publish("monitor", {"running": True})
     return {"ok": True, "status": "started"}
 
 @app.post("/monitor/stop")
 async def monitor_stop():
     global _running
     _running = False
-    return {"ok": True, "status": "stopped"}
\ No newline at end of file
+    EVENTS.publish("monitor", {"running": False})
+    return {"ok": True, "status": "stopped"}
+
+@app.get("/monitor/stats")
+def monitor_stats():
+    return {
+        "running": _running,
+        "tiles": FINGERPRINTS.stats(),
+        "delta": {
+            "dirty_cells": DELTA.dirty_cells,
+            "dirty_tiles": DELTA.dirty_tiles,
+            "pending_tiles": len(PIPELINE.scheduler.dirty),
+            "hot_artworks": len(PIPELINE.scheduler.hot),
+        },
+        "asset_cache": {
+            "entries": len(ASSETS.entries),
+            "bytes": ASSETS.total,
+            "hits": ASSETS.hits,
+            "misses": ASSETS.misses,
+        },
+        "source": {"kind": type(SOURCE).__name__, **SOURCE.stats()} if SOURCE is not None else None,
+        "page_diff": dict(PAGE_DIFF),
+        "coarse": dict(COARSE),
+    }
+
+@app.get("/monitor/rate")
+def monitor_rate():
+    """Budget et cadence retenus, coûts mesurés par étape et retard de la boucle."""
+    return RATE.stats()
+
+@app.get("/monitor/staleness")
+def monitor_staleness():
+    """Retard de scan par œuvre selon le planificateur actif."""
+    return PIPELINE.scheduler.staleness()
+
+@app.get("/monitor/recorder")
+def monitor_recorder():
+    """Historique des frames : segments, disque, compression, échantillons abandonnés."""
+    return RECORDER.stats()
+
+@app.get("/events")
+async def events(request: Request, max_s: float = 300.0, last_id: Optional[int] = None):
+    """Flux SSE : `snapshot` à la connexion (ou reprise via Last-Event-ID), puis les deltas
+    `art`, `tiles`, `alert`, `coverage` et `monitor`. Le flux se ferme après `max_s` secondes ;
+    le client se reconnecte avec le dernier id reçu."""
+    header = request.headers.get("last-event-id", "")
+    if header.isdigit():
+        last_id = int(header)
+    return StreamingResponse(
+        EVENTS.stream(events_snapshot, last_id, max(5.0, min(3600.0, max_s)), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/monitor/alerts")
+def monitor_alerts():
+    """Dispatcher d'alertes : file, fusions, envois, 429, échecs ; états par tuile conservés."""
+    return {**DISPATCHER.stats(), "tile_states": len(LAST_EVENT), "events": EVENTS.stats()}
+
+# ============================================================================
+# Métriques lues au scrape
+# ============================================================================
+gauge("bluescan_coverage_age_seconds", "Âge de la tuile la plus ancienne, par œuvre", ("artwork",),
+      fn=lambda: {(str(aid),): v["max_age_s"] for aid, v in PIPELINE.scheduler.staleness()["artworks"].items()})
+counter("bluescan_asset_cache_total", "Accès au cache d'assets", ("result",),
+        fn=lambda: {("hit",): ASSETS.hits, ("miss",): ASSETS.misses})
+gauge("bluescan_asset_cache_bytes", "Mémoire comptée par le cache d'assets", fn=lambda: {(): ASSETS.total})
+counter("bluescan_fingerprint_total", "Tuiles vérifiées par empreinte (hit : diff évité)", ("result",),
+        fn=lambda: {("hit",): FINGERPRINTS.skipped, ("miss",): FINGERPRINTS.checked - FINGERPRINTS.skipped})
+gauge("bluescan_rate_budget_tiles", "Budget de tuiles par passe retenu",
+      fn=lambda: {(): RATE.budget} if RATE.budget is not None else {})
+gauge("bluescan_recorder_disk_bytes", "Taille de l'historique des frames sur disque",
+      fn=lambda: {(): RECORDER.stats()["disk_bytes"]})
+counter("bluescan_recorder_dropped_total", "Échantillons d'historique abandonnés (file pleine)",
+        fn=lambda: {(): RECORDER.dropped})
+gauge("bluescan_loop_lag_seconds", "Retard de la boucle asyncio (moyenne glissante)", fn=lambda: {(): RATE.lag})
+counter("bluescan_alert_deliveries_total", "Embeds traités par le dispatcher d'alertes", ("result",),
+        fn=lambda: {(k,): DISPATCHER.counts[k] for k in ("sent", "edited", "unchanged", "failed", "dropped", "coalesced")})
+counter("bluescan_alert_rate_limited_total", "Réponses 429 du webhook", fn=lambda: {(): DISPATCHER.counts["rate_limited"]})
+gauge("bluescan_alert_queue", "Alertes en attente d'envoi", fn=lambda: {(): DISPATCHER.size})
+gauge("bluescan_alert_states", "États d'alerte par tuile conservés (LAST_EVENT)", fn=lambda: {(): len(LAST_EVENT)})
+gauge("bluescan_event_clients", "Clients connectés au flux /events", fn=lambda: {(): len(EVENTS.clients)})
+counter("bluescan_events_total", "Événements publiés sur /events", fn=lambda: {(): EVENTS.published})
+gauge("bluescan_palette_colors", "Couleurs indexées par le moteur palette", fn=lambda: {(): len(PALETTE)})
+counter("bluescan_palette_overflow_total", "Pixels hors palette (palette pleine)", fn=lambda: {(): PALETTE.overflow})
+counter("bluescan_palette_fallback_total", "Tuiles recomptées en RGBA (couleur sans index)", fn=lambda: {(): PALETTE.fallbacks})
+counter("bluescan_chunk_requests_total", "Requêtes de tuiles de la carte (source HTTP)", ("result",),
+        fn=lambda: {(k,): SOURCE.counts[k] for k in ("not_modified", "decoded", "empty", "errors")}
+        if isinstance(SOURCE, ChunkSource) else {})
+gauge("bluescan_pages", "Pages Chromium du pool de capture", ("state",),
+      fn=lambda: {(k,): sum(1 for s in PW.pool.slots if s.ready == (k == "ready")) for k in ("ready", "down")}
+      if PW.pool is not None else {})
+counter("bluescan_page_recycles_total", "Pages recyclées", ("reason",),
+        fn=lambda: {(k,): v for k, v in PW.pool.recycled.items()} if PW.pool is not None else {})
+counter("bluescan_screencast_frames_total", "Frames du screencast CDP", ("result",),
+        fn=lambda: {(k,): SOURCE.cast.cast.counts[k] for k in ("received", "decoded", "dropped", "errors")}
+        if isinstance(SOURCE, PoolSource) and SOURCE.cast is not None and SOURCE.cast.cast is not None else {})
+counter("bluescan_coarse_tiles_total", "Tuiles template+sol en passe grossière (escalated : recomptées en pleine résolution)",
+        ("result",), fn=lambda: {("estimated",): COARSE["tiles"] - COARSE["escalated"], ("escalated",): COARSE["escalated"]})
+counter("bluescan_page_diff_tiles_total", "Tuiles du moteur page (fallback : pixels lus côté Python)", ("result",),
+        fn=lambda: {(k,): PAGE_DIFF[k] for k in ("tiles", "fallback")})
+gauge("bluescan_chunk_cache_bytes", "Tuiles de la carte décodées en cache",
+      fn=lambda: {(): SOURCE.total} if isinstance(SOURCE, ChunkSource) else {})
+
+@app.get("/metrics")
+def metrics():
+    """Format texte Prometheus ; vide si BLUE_SCAN_METRICS=0."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def _shutdown():
+    """Arrêt du serveur (voir _lifespan)."""
+    # libère les workers de diff et leurs segments de mémoire partagée
+    get_diff_pool(0)
+    RECORDER.close()
+    await DISPATCHER.close()
+    if SOURCE is not None:
+        await SOURCE.close()
+    DB.close()
\ No newline at end of file
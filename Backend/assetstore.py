@@ -0,0 +1,188 @@
+# backend/assetstore.py
+"""Stockage des gros tableaux (templates, sols, baselines, masques) hors SQLite.
+
+- Un fichier `.npy` par contenu, nommé par son empreinte :
+  `<racine>/<sha[:2]>/<sha>.npy`. Le format `.npy` aligne les données sur
+  64 octets : `np.load(mmap_mode="r")` donne des vues sans copie, et une
+  œuvre froide ne coûte que du cache de pages (récupérable par l'OS).
+- SQLite ne garde que les métadonnées dans la table `assets`
+  (œuvre, type, w, h, empreinte). Deux œuvres au contenu identique
+  partagent le même fichier.
+- Les écritures (`set_asset`, `drop_assets`, `collect`) sont prévues pour
+  tourner dans le thread écrivain : écriture du fichier, mise à jour de la
+  ligne et ramassage des fichiers orphelins y sont sérialisés.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+KINDS = ("template", "ground", "baseline", "mask")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets(
+  artwork_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  w INTEGER NOT NULL, h INTEGER NOT NULL,
+  sha TEXT NOT NULL,
+  PRIMARY KEY(artwork_id, kind)
+);
+CREATE INDEX IF NOT EXISTS assets_sha ON assets(sha);
+"""
+
+# Anciennes tables à BLOB : table -> (type, colonne, canaux)
+LEGACY_TABLES = {
+    "templates": ("template", "rgba", 4),
+    "grounds": ("ground", "rgba", 4),
+    "baselines": ("baseline", "rgba", 4),
+    "masks": ("mask", "mask", 1),
+}
+
+def _digest(arr: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(f"{arr.dtype.str}{arr.shape}".encode())
+    h.update(memoryview(np.ascontiguousarray(arr)).cast("B"))
+    return h.hexdigest()
+
+class AssetStore:
+    """Fichiers `.npy` adressés par contenu, ouverts en memmap lecture seule."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha + ".npy")
+
+    def put(self, arr: np.ndarray) -> str:
+        """Écrit le tableau s'il n'existe pas déjà ; retourne son empreinte."""
+        sha = _digest(arr)
+        path = self.path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr), allow_pickle=False)
+            os.replace(tmp, path)  # atomique : un lecteur ne voit jamais de fichier partiel
+        return sha
+
+    def open(self, sha: str) -> np.ndarray:
+        return np.load(self.path(sha), mmap_mode="r", allow_pickle=False)
+
+    def unlink(self, sha: str):
+        try:
+            os.remove(self.path(sha))
+        except FileNotFoundError:
+            pass
+        except OSError:  # encore mappé (Windows) : `sweep` s'en chargera au prochain démarrage
+            pass
+
+    def sweep(self, live: Set[str]) -> int:
+        """Supprime les fichiers non référencés (écritures interrompues, orphelins)."""
+        n = 0
+        for d in os.listdir(self.root):
+            sub = os.path.join(self.root, d)
+            if not os.path.isdir(sub):
+                continue
+            for name in os.listdir(sub):
+                if name.endswith(".tmp") or (name.endswith(".npy") and name[:-4] not in live):
+                    try:
+                        os.remove(os.path.join(sub, name))
+                        n += 1
+                    except OSError:
+                        pass
+        return n
+
+# ============================================================================
+# Métadonnées SQLite (à appeler depuis le thread écrivain)
+# ============================================================================
+def set_asset(con: sqlite3.Connection, store: AssetStore, aid: int, kind: str, arr: np.ndarray) -> List[str]:
+    """Associe `arr` à (œuvre, type) ; retourne les empreintes devenues orphelines."""
+    old = con.execute("SELECT sha FROM assets WHERE artwork_id=? AND kind=?", (aid, kind)).fetchone()
+    sha = store.put(arr)
+    con.execute(
+        "REPLACE INTO assets(artwork_id,kind,w,h,sha) VALUES(?,?,?,?,?)",
+        (aid, kind, arr.shape[1], arr.shape[0], sha),
+    )
+    return [old["sha"]] if old and old["sha"] != sha else []
+
+def drop_assets(con: sqlite3.Connection, aid: int) -> List[str]:
+    shas = [r["sha"] for r in con.execute("SELECT sha FROM assets WHERE artwork_id=?", (aid,))]
+    con.execute("DELETE FROM assets WHERE artwork_id=?", (aid,))
+    return shas
+
+def collect(con: sqlite3.Connection, store: AssetStore, shas: Iterable[str]):
+    """Supprime les fichiers qui ne sont plus référencés par aucune ligne.
+
+    À lancer comme travail d'écriture distinct, après celui qui a produit les
+    orphelins : il voit alors l'état committé et ne peut pas supprimer un
+    fichier qu'une transaction annulée référencerait encore.
+    """
+    for sha in set(shas):
+        if con.execute("SELECT 1 FROM assets WHERE sha=? LIMIT 1", (sha,)).fetchone() is None:
+            store.unlink(sha)
+
+def load_assets(con: sqlite3.Connection, store: AssetStore, aid: int) -> Dict[str, np.ndarray]:
+    """Vues memmap des assets d'une œuvre, par type."""
+    out: Dict[str, np.ndarray] = {}
+    for r in con.execute("SELECT kind,w,h,sha FROM assets WHERE artwork_id=?", (aid,)):
+        arr = store.open(r["sha"])
+        if arr.shape[:2] != (r["h"], r["w"]):
+            raise ValueError(f"asset {r['kind']} de l'œuvre {aid} : taille {arr.shape} != {r['w']}x{r['h']}")
+        out[r["kind"]] = arr
+    return out
+
+def live_shas(con: sqlite3.Connection) -> Set[str]:
+    return {r[0] for r in con.execute("SELECT DISTINCT sha FROM assets")}
+
+def migrate_legacy_blobs(con: sqlite3.Connection, store: AssetStore) -> int:
+    """Déplace les BLOB des anciennes tables vers le store puis supprime ces tables.
+
+    Idempotent : une table absente est ignorée ; une migration interrompue
+    reprend là où elle s'est arrêtée (les lignes migrées sont effacées au fil
+    de l'eau, dans la même transaction que leur insertion dans `assets`).
+    """
+    tables = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    moved = 0
+    for table, (kind, col, ch) in LEGACY_TABLES.items():
+        if table not in tables:
+            continue
+        ids = [r[0] for r in con.execute(f"SELECT artwork_id FROM {table}")]
+        for aid in ids:
+            row = con.execute(f"SELECT w,h,{col} FROM {table} WHERE artwork_id=?", (aid,)).fetchone()
+            shape = (row[1], row[0], ch) if ch > 1 else (row[1], row[0])
+            arr = np.frombuffer(row[2], dtype=np.uint8).reshape(shape)
+            sha = store.put(arr)
+            con.execute(
+                "REPLACE INTO assets(artwork_id,kind,w,h,sha) VALUES(?,?,?,?,?)",
+                (aid, kind, row[0], row[1], sha),
+            )
+            con.execute(f"DELETE FROM {table} WHERE artwork_id=?", (aid,))
+            con.commit()
+            moved += 1
+        con.execute(f"DROP TABLE {table}")
+        con.commit()
+    return moved
+
+# ============================================================================
+# Import / export (.npz : un tableau par type + métadonnées JSON)
+# ============================================================================
+def export_npz(meta: dict, arrays: Dict[str, np.ndarray]) -> bytes:
+    buf = io.BytesIO()
+    payload = {k: np.asarray(v) for k, v in arrays.items() if k in KINDS}
+    payload["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+    np.savez(buf, **payload)
+    return buf.getvalue()
+
+def import_npz(data: bytes) -> Tuple[dict, Dict[str, np.ndarray]]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as z:
+        meta = json.loads(z["meta"].tobytes().decode()) if "meta" in z.files else {}
+        arrays = {k: z[k] for k in z.files if k in KINDS}
+    for k, a in arrays.items():
+        if a.dtype != np.uint8 or a.ndim != (2 if k == "mask" else 3) or (a.ndim == 3 and a.shape[2] != 4):
+            raise ValueError(f"asset {k} invalide : {a.dtype} {a.shape}")
+    return meta, arrays
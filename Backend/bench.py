@@ -0,0 +1,1117 @@
+# backend/bench.py
+"""Micro-benchmarks du scanner.
+
+Usage : python bench.py <scénario> [options]   (python bench.py -h pour la liste)
+"""
+import argparse
+import asyncio
+import base64
+import io
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# La base de bench ne doit jamais toucher la base de prod.
+os.environ.setdefault("BLUE_SCAN_DB", os.path.join(tempfile.mkdtemp(prefix="bluescan-bench-"), "bench.sqlite"))
+
+import numpy as np
+
+import app
+
+def _fmt_ms(dt: float) -> str:
+    return f"{dt * 1000:8.1f} ms"
+
+# ============================================================================
+# transfer : getImageData -> NumPy (btoa historique vs tranches binaires)
+# ============================================================================
+LEGACY_READ = """
+([w, h]) => {
+  const c = document.querySelector('canvas');
+  const img = c.getContext('2d', {willReadFrequently:true}).getImageData(0, 0, w, h);
+  return btoa(String.fromCharCode.apply(null, img.data));
+}
+"""
+
+FILL_CANVAS = """
+([w, h]) => {
+  const c = document.createElement('canvas');
+  c.width = w; c.height = h; document.body.appendChild(c);
+  const ctx = c.getContext('2d');
+  const img = ctx.createImageData(w, h);
+  for (let i = 0; i < img.data.length; i++) img.data[i] = (i * 2654435761) >>> 24;
+  for (let i = 3; i < img.data.length; i += 4) img.data[i] = 255;
+  ctx.putImageData(img, 0, 0);
+}
+"""
+
+async def _legacy_full(page, w: int, h: int) -> np.ndarray:
+    b64 = await page.evaluate(LEGACY_READ, [w, h])
+    return np.frombuffer(base64.b64decode(b64), dtype=np.uint8).reshape((h, w, 4))
+
+async def _measure(fn, repeat: int):
+    best, peak, out = float("inf"), 0, None
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            out = await fn()
+        except Exception as e:
+            tracemalloc.stop()
+            return None, 0, f"échec ({str(e).splitlines()[0][:60]})"
+        best = min(best, time.perf_counter() - t0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak, out
+
+async def bench_transfer(args):
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True, args=["--disable-dev-shm-usage", "--no-sandbox"])
+        page = await browser.new_page()
+        for size in args.sizes:
+            w = h = size
+            await page.set_content("<body style='margin:0'></body>")
+            await page.evaluate(FILL_CANVAS, [w, h])
+            print(f"canvas {w}x{h} ({w * h * 4 / 1e6:.1f} Mo)")
+            ref = None
+            for label, fn in (
+                ("btoa(fromCharCode)", lambda: _legacy_full(page, w, h)),
+                ("tranches binaires ", lambda: app.get_full_canvas(app.PlaywrightSource(page))),
+            ):
+                dt, peak, out = await _measure(fn, args.repeat)
+                if dt is None:
+                    print(f"  {label} : {out}")
+                    continue
+                if ref is None:
+                    ref = out.copy()
+                same = "" if np.array_equal(ref, out) else "  /!\\ contenu différent"
+                print(f"  {label} : {_fmt_ms(dt)} | pic Python {peak / 1e6:7.1f} Mo{same}")
+        await browser.close()
+
+# ============================================================================
+# screencast : screenshot par passe vs dernière frame du screencast CDP
+# ============================================================================
+async def bench_screencast(args):
+    from playwright.async_api import async_playwright
+    from screencast import ScreencastSource
+
+    w = h = args.size
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True, args=["--disable-dev-shm-usage", "--no-sandbox"])
+        page = await browser.new_page(viewport={"width": w + 100, "height": h + 100})
+        await page.set_content("<body style='margin:0'></body>")
+        await page.evaluate(FILL_CANVAS, [w, h])
+        direct = app.PlaywrightSource(page)
+        info = await direct.info()
+        box = [(0, 0, w, h)]
+        live = ScreencastSource(lambda: page, direct)
+        await live.info()
+        while live.cast.ring.latest is None:
+            await asyncio.sleep(0.01)
+        ref = await direct.full(info)
+        got = (await live.regions(info, box))[0]
+        print(f"canvas {w}x{h} | parité screencast : {'OK' if np.array_equal(ref, got) else 'ÉCHEC'}")
+
+        shot, cast = [], []
+        clip = {"x": info["bx"], "y": info["by"], "width": info["bw"], "height": info["bh"]}
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            await app._read_screenshot(page, clip, w, h)
+            shot.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            await live.regions(info, box)
+            cast.append(time.perf_counter() - t0)
+        print(f"  lecture par passe : screenshot {_fmt_ms(_pct(shot, 50))} | screencast {_fmt_ms(_pct(cast, 50))}")
+
+        # fraîcheur : un pixel repeint -> visible dans la dernière frame
+        fresh = []
+        for i in range(args.repeat):
+            seq = live.cast.ring.seq
+            t0 = time.perf_counter()
+            await page.evaluate("([v]) => { const c = document.querySelector('canvas').getContext('2d');"
+                                " c.fillStyle = `rgb(${v},0,0)`; c.fillRect(0, 0, 4, 4); }", [i % 256])
+            while live.cast.ring.seq == seq or (await live.regions(info, [(0, 0, 1, 1)]))[0][0, 0, 0] != i % 256:
+                await asyncio.sleep(0.001)
+                if time.perf_counter() - t0 > 5:
+                    break
+            fresh.append(time.perf_counter() - t0)
+        st = live.stats()
+        print(f"  repeint -> frame lue : p50 {_fmt_ms(_pct(fresh, 50))} p95 {_fmt_ms(_pct(fresh, 95))} | "
+              f"décodage {st['decode_ms']} ms, frames {st['received']} reçues / {st['decoded']} décodées / {st['dropped']} sautées")
+        await live.close()
+        await browser.close()
+
+# ============================================================================
+# diff : boucle historique tuile par tuile vs moteur par lot
+# ============================================================================
+def legacy_tile_diff(cur, tpl_t, grd_t, inside, deface_mask, build: bool, tol: int, ignore_outside: bool) -> int:
+    """Calcul historique de monitor_loop (référence de parité)."""
+    tpl_ok = app.within_tol(cur, tpl_t, tol)
+    grd_ok = app.within_tol(cur, grd_t, tol)
+    ok_inside_nondef = (tpl_ok | grd_ok) if build else tpl_ok
+    ok_inside = np.where(deface_mask, grd_ok, ok_inside_nondef)
+    ok_outside = True if ignore_outside else grd_ok
+    ok = np.where(inside, ok_inside, ok_outside)
+    return app.count_diff_mask(ok)
+
+def synth_tiles(n: int, tw: int, th: int, seed: int = 0):
+    """Tuiles synthétiques : sol, template partiellement posé, DEFACE, trous, dégâts."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        h = th - (i % 3) * 7  # quelques tuiles de bord plus petites
+        grd = rng.integers(0, 256, (h, tw, 4), dtype=np.uint8)
+        tpl = rng.integers(0, 256, (h, tw, 4), dtype=np.uint8)
+        tpl[rng.random((h, tw)) < 0.2, 3] = 0
+        tpl[rng.random((h, tw)) < 0.05, :3] = app.DEFACE_RGB
+        pick = rng.random((h, tw))
+        cur = np.where((pick < 0.6)[..., None], tpl, grd)
+        noise = rng.integers(-10, 11, cur.shape)
+        cur = np.clip(cur.astype(np.int16) + noise * (rng.random((h, tw, 1)) < 0.1), 0, 255).astype(np.uint8)
+        cur[rng.random((h, tw)) < 0.02] = rng.integers(0, 256, 4, dtype=np.uint8)
+        inside = tpl[..., 3] > 0
+        if i % 2:
+            inside = inside | (rng.random((h, tw)) < 0.5)
+        deface = (tpl[..., 0] == 0xDE) & (tpl[..., 1] == 0xFA) & (tpl[..., 2] == 0xCE)
+        out.append((cur, tpl, grd, inside, deface, bool(i % 4)))
+    return out
+
+def bench_diff(args):
+    tiles = synth_tiles(args.tiles, args.tile, args.tile)
+    # parité stricte sur toutes les combinaisons de sémantique
+    for tol in (0, 8, -1, 255):
+        for ignore_outside in (True, False):
+            batch = app.DiffBatch()
+            ref = []
+            for cur, tpl, grd, inside, deface, build in tiles:
+                ref.append(legacy_tile_diff(cur, tpl, grd, inside, deface, build, tol, ignore_outside))
+                batch.add(cur, app.make_tile_ref(tpl, grd, inside, deface, build, ignore_outside))
+            got = batch.run(tol).tolist()
+            assert got == ref, f"parité KO (tol={tol}, ignore_outside={ignore_outside})"
+    print(f"parité OK sur {len(tiles)} tuiles x 8 combinaisons")
+
+    for tol in (0, args.tol):
+        refs = [app.make_tile_ref(tpl, grd, inside, deface, build, True) for cur, tpl, grd, inside, deface, build in tiles]
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for cur, tpl, grd, inside, deface, build in tiles:
+                legacy_tile_diff(cur, tpl, grd, inside, deface, build, tol, True)
+        dt_legacy = (time.perf_counter() - t0) / args.repeat
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            batch = app.DiffBatch()
+            for (cur, *_), r in zip(tiles, refs):
+                batch.add(cur, r)
+            batch.run(tol)
+        dt_batch = (time.perf_counter() - t0) / args.repeat
+        n = len(tiles)
+        print(
+            f"tol={tol:3d} | boucle historique {n / dt_legacy:9.0f} tuiles/s | "
+            f"lot {n / dt_batch:9.0f} tuiles/s | x{dt_legacy / dt_batch:.1f}"
+        )
+
+# ============================================================================
+# workers : diff inline vs pool de processus (1..N cœurs)
+# ============================================================================
+async def bench_workers(args):
+    from workers import DiffPool
+
+    tiles = synth_tiles(args.tiles, args.tile, args.tile)
+    patches = [t[0] for t in tiles]
+    refs = [app.make_tile_ref(tpl, grd, inside, deface, build, True) for _, tpl, grd, inside, deface, build in tiles]
+
+    def inline():
+        batch = app.DiffBatch()
+        for cur, r in zip(patches, refs):
+            batch.add(cur, r)
+        return batch.run(args.tol).tolist()
+
+    expected = inline()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        inline()
+    base = args.repeat * len(tiles) / (time.perf_counter() - t0)
+    print(f"inline     : {base:9.0f} tuiles/s")
+
+    for n in range(1, args.max_workers + 1):
+        pool = DiffPool(n)
+        try:
+            items = []
+            for i, (_, tpl, grd, inside, deface, build) in enumerate(tiles):
+                seg, layout = pool.publish_assets(i, 0, {"tpl": tpl, "grd": grd, "alpha": inside, "deface": deface})
+                h, w = tpl.shape[:2]
+                items.append((i, seg, layout, i, (0, 0), (0, 0, w, h), "alpha_only", build, True))
+            name, layout = pool.publish_frame(patches)
+            got = await pool.count(name, layout, items, args.tol)  # chauffe : attache + TileRef
+            assert got == expected, "parité pool/inline KO"
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                name, layout = pool.publish_frame(patches)
+                await pool.count(name, layout, items, args.tol)
+            rate = args.repeat * len(tiles) / (time.perf_counter() - t0)
+            print(f"{n:2d} worker(s): {rate:9.0f} tuiles/s | x{rate / base:.2f} vs inline")
+        finally:
+            pool.close()
+    print(f"(cœurs disponibles : {os.cpu_count()})")
+
+# ============================================================================
+# scan : boucle de surveillance complète sur un canvas rejoué (sans navigateur)
+# ============================================================================
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Ko sous Linux
+
+def _data_url(arr: np.ndarray) -> str:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(arr, "RGBA").save(buf, "PNG", compress_level=1)
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+def _pct(xs, q: float) -> float:
+    return float(np.percentile(xs, q)) if xs else float("nan")
+
+async def _scan_once(args, n_arts: int, n_tiles: int):
+    from sources import GriefEvent, ReplaySource, synthetic_canvas
+
+    tw = th = args.tile
+    cols = max(1, round(math.sqrt(n_tiles)))
+    aw, ah = cols * tw, -(-n_tiles // cols) * th
+    per_row = max(1, math.ceil(math.sqrt(n_arts)))
+    origins = [((i % per_row) * aw, (i // per_row) * ah) for i in range(n_arts)]
+    W, H = per_row * aw, math.ceil(n_arts / per_row) * ah
+    rng = np.random.default_rng(args.seed)
+
+    # dégradations : une par tuile tirée sans remise, étalées après la chauffe
+    slots = rng.choice(n_arts * n_tiles, size=min(args.events, n_arts * n_tiles), replace=False)
+    times = np.sort(rng.uniform(args.warmup, args.seconds * 0.8, len(slots)))
+    events, expect = [], []
+    for slot, t in zip(slots, times):
+        i, k = divmod(int(slot), n_tiles)
+        tx, ty = (k % cols) * tw, (k // cols) * th
+        g = min(args.grief, tw, th)
+        ex = tx + int(rng.integers(0, tw - g + 1))
+        ey = ty + int(rng.integers(0, th - g + 1))
+        events.append(GriefEvent(float(t), origins[i][0] + ex, origins[i][1] + ey, g, g))
+        expect.append((i, (tx, ty)))
+
+    if args.replay:
+        src = ReplaySource.load(args.replay, events=events)
+    else:
+        src = ReplaySource([(0.0, synthetic_canvas(W, H, args.seed))], events)
+    base = src.frames[0][1]
+    if base.shape[0] < H or base.shape[1] < W:
+        raise SystemExit(f"frames {base.shape[1]}x{base.shape[0]} trop petites pour {W}x{H}")
+    app.SOURCE = src
+
+    ids = []
+    for i, (x, y) in enumerate(origins):
+        art = app.place_tl(app.PlaceTLIn(name=f"bench{i}", tl_x=x, tl_y=y, data_url=_data_url(base[y : y + ah, x : x + aw])))
+        ids.append(art.id)
+    src.start()
+    for aid in ids:
+        await app.snapshot_ground(aid)
+
+    c = app.get_config().model_dump()
+    c.update(
+        scan_hz=args.hz, tile_w=tw, tile_h=th, tiles_global_per_tick=args.budget,
+        capture_mode=args.capture, scheduler=args.scheduler, scan_workers=args.workers,
+    )
+    app.set_config(app.ConfigIn(**c))
+
+    # détection : première passe où la tuile dégradée dépasse le seuil de suspicion
+    index = {aid: i for i, aid in enumerate(ids)}
+    seen = {}
+    counts = {"ticks": 0, "tiles": 0, "reused": 0}
+    tick = app.PIPELINE.tick
+
+    async def counting_tick(s, table, ctx):
+        scanned = await tick(s, table, ctx)
+        now = src.clock()
+        counts["ticks"] += 1
+        counts["tiles"] += len(scanned)
+        for job in scanned:
+            counts["reused"] += job.reused
+            if job.diffs >= ctx.susp_t:
+                seen.setdefault((index[job.art["id"]], (job.tile.x, job.tile.y)), now)
+        return scanned
+
+    app.PIPELINE.tick = counting_tick
+    app.PIPELINE.sink = lambda alert: None  # alertes muettes
+    src.start()  # t=0 : début de la surveillance
+    app._running = True
+    task = asyncio.ensure_future(app.monitor_loop())
+    try:
+        await asyncio.sleep(args.seconds)
+    finally:
+        app._running = False
+        await task
+        app.get_diff_pool(0)  # segments partagés libérés avant la combinaison suivante
+    elapsed = src.elapsed()
+
+    lat, missed = [], 0
+    for (ev, t_ev), key in zip(src.applied, expect):
+        t_seen = seen.get(key)
+        if t_seen is None or t_seen < t_ev:
+            missed += 1
+        else:
+            lat.append(t_seen - t_ev)
+    missed += len(events) - len(src.applied)
+    rate = app.RATE.stats()
+    print(
+        f"{n_arts:3d} œuvres x {n_tiles:4d} tuiles ({W}x{H}, {args.capture}, {args.scheduler}) | "
+        f"{counts['tiles'] / elapsed:8.0f} tuiles/s ({counts['reused'] / max(1, counts['tiles']):.0%} réutilisées, "
+        f"{counts['ticks']} passes) | détection p50 {_pct(lat, 50) * 1000:6.0f} ms p95 {_pct(lat, 95) * 1000:6.0f} ms "
+        f"max {max(lat, default=float('nan')) * 1000:6.0f} ms, {missed}/{len(events)} manquées | "
+        f"RSS pic {_peak_rss_mb():6.0f} Mo, cache assets {app.ASSETS.total / 1e6:6.1f} Mo"
+    )
+    if args.verbose:
+        print("  étapes (ms) :", rate["stages_ms"], "| retard boucle", rate["loop_lag_ms"], "ms")
+
+def bench_scan(args):
+    combos = [(n, m) for n in args.arts for m in args.tiles]
+    if len(combos) == 1:
+        asyncio.run(_scan_once(args, *combos[0]))
+        return
+    # un processus par combinaison : état et mémoire de pointe isolés
+    for n, m in combos:
+        argv = [sys.executable, os.path.abspath(__file__), "scan", "--arts", str(n), "--tiles", str(m)]
+        for k in ("tile", "hz", "budget", "capture", "scheduler", "workers", "events", "grief", "seconds", "warmup", "seed", "replay"):
+            v = getattr(args, k)
+            if v is not None:
+                argv += ["--" + k, str(v)]
+        if args.verbose:
+            argv.append("-v")
+        env = dict(os.environ)
+        env.pop("BLUE_SCAN_DB", None)
+        subprocess.run(argv, check=True, env=env)
+
+# ============================================================================
+# palette : références RGBA vs index de palette uint8
+# ============================================================================
+def palette_tiles(n: int, tw: int, th: int, colors: int = 32, seed: int = 0):
+    """Tuiles dont le canvas ne contient que les couleurs d'une palette ; templates avec
+    quelques couleurs hors palette (anticrénelage), DEFACE, trous et dégâts."""
+    rng = np.random.default_rng(seed)
+    pal = rng.integers(0, 256, (colors, 4), dtype=np.uint8)
+    pal[:, 3] = 255
+    pal[0] = 0  # transparent
+    off = rng.integers(0, 256, (8, 4), dtype=np.uint8)
+    off[:, 3] = 255
+    out = []
+    for i in range(n):
+        h = th - (i % 3) * 7
+        grd = pal[rng.integers(0, colors, (h, tw))]
+        tpl = pal[rng.integers(1, colors, (h, tw))]
+        aa = rng.random((h, tw)) < 0.03
+        tpl[aa] = off[rng.integers(0, len(off), int(aa.sum()))]
+        tpl[rng.random((h, tw)) < 0.2, 3] = 0
+        tpl[rng.random((h, tw)) < 0.05, :3] = app.DEFACE_RGB
+        pick = rng.random((h, tw))
+        cur = np.where((pick < 0.6)[..., None], tpl, grd)
+        cur[aa] = pal[rng.integers(0, colors, int(aa.sum()))]  # le canvas ne peut pas poser ces couleurs
+        cur[(cur[..., :3] == app.DEFACE_RGB).all(axis=2)] = pal[1]
+        cur[rng.random((h, tw)) < 0.02] = pal[rng.integers(0, colors)]
+        inside = tpl[..., 3] > 0
+        if i % 2:
+            inside = inside | (rng.random((h, tw)) < 0.5)
+        deface = (tpl[..., 0] == 0xDE) & (tpl[..., 1] == 0xFA) & (tpl[..., 2] == 0xCE)
+        out.append((cur, tpl, grd, inside, deface, bool(i % 4)))
+    return out
+
+def bench_palette(args):
+    from diffengine import defects
+    from palette import IndexedBatch, IndexedRef, Palette, index_ref, indexed_defects
+
+    # parité, y compris au-delà de MAX_COLORS couleurs (palette pleine : repli RGBA)
+    for colors in (args.colors, args.overflow_colors):
+        tiles = palette_tiles(args.tiles, args.tile, args.tile, colors)
+        for tol in (0, 8, -1, 255):
+            for ignore_outside in (True, False):
+                pal = Palette()
+                ref_batch, idx_batch = app.DiffBatch(), IndexedBatch(pal)
+                for cur, tpl, grd, inside, deface, build in tiles:
+                    r = app.make_tile_ref(tpl, grd, inside, deface, build, ignore_outside)
+                    ref_batch.add(cur, r)
+                    idx_batch.add(cur, index_ref(pal, r), lambda r=r: r)
+                got, ref = idx_batch.run(tol).tolist(), ref_batch.run(tol).tolist()
+                assert got == ref, f"parité KO ({colors} couleurs, tol={tol}, ignore_outside={ignore_outside})"
+        print(f"parité OK sur {len(tiles)} tuiles x 8 combinaisons, palette de {colors} couleurs "
+              f"({len(pal)} indexées, {pal.overflow} px hors palette, {pal.fallbacks} tuiles recomptées en RGBA)")
+
+    tiles = palette_tiles(args.tiles, args.tile, args.tile, args.colors)
+
+    pal = Palette()
+    refs = [app.make_tile_ref(tpl, grd, inside, deface, build, True) for _, tpl, grd, inside, deface, build in tiles]
+    irefs = [index_ref(pal, r) for r in refs]
+    rgba_b, idx_b = sum(r.nbytes for r in refs), sum(r.nbytes for r in irefs)
+    print(f"références : RGBA {rgba_b / 1e6:7.2f} Mo | palette {idx_b / 1e6:7.2f} Mo | x{rgba_b / idx_b:.1f}")
+
+    stacked = app.TileRef(*(np.concatenate([getattr(r, f) for r in refs]) for f in ("tpl", "grd", "use_tpl", "use_grd", "free")))
+    cur_all = np.concatenate([c.reshape(-1, 4) for c, *_ in tiles])
+    idx_ref = IndexedRef(np.concatenate([r.tpl for r in irefs]), np.concatenate([r.grd for r in irefs]))
+    for tol in (0, args.tol):
+        timings = {}
+        for label, fn in (
+            ("RGBA (lot)", lambda: _run_batch(app.DiffBatch(), [t[0] for t in tiles], refs, tol)),
+            ("palette (lot)", lambda: _run_indexed(IndexedBatch(pal), [t[0] for t in tiles], irefs, refs, tol)),
+        ):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                fn()
+            timings[label] = (time.perf_counter() - t0) / args.repeat
+        # comparaison seule (tuiles déjà empilées, canvas déjà quantifié)
+        cur_idx = pal.quantize(cur_all)
+        table, identity = pal.match(tol)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            defects(cur_all, stacked, tol)
+        timings["RGBA (comparaison)"] = (time.perf_counter() - t0) / args.repeat
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            indexed_defects(cur_idx, idx_ref, table, identity)
+        timings["palette (comparaison)"] = (time.perf_counter() - t0) / args.repeat
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            pal.quantize(cur_all)
+        timings["quantification"] = (time.perf_counter() - t0) / args.repeat
+        n = len(tiles)
+        print(f"tol={tol:3d} ({'identité' if identity else 'matrice'})")
+        for label, dt in timings.items():
+            print(f"  {label:22s} {_fmt_ms(dt)} | {n / dt:9.0f} tuiles/s")
+
+def _run_batch(batch, curs, refs, tol: int):
+    for c, r in zip(curs, refs):
+        batch.add(c, r)
+    return batch.run(tol)
+
+def _run_indexed(batch, curs, irefs, refs, tol: int):
+    for c, i, r in zip(curs, irefs, refs):
+        batch.add(c, i, lambda r=r: r)
+    return batch.run(tol)
+
+# ============================================================================
+# alerts : dispatcher face à un webhook local (429, keep-alive, tempête)
+# ============================================================================
+class StandInServer:
+    """Serveur HTTP/1.1 keep-alive minimal servi dans son propre thread (bouchon de bench).
+
+    Les sous-classes implémentent `respond(method, path, headers, body)` et
+    rendent (statut, en-têtes, corps). Compte connexions et requêtes par méthode.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.connections = 0
+        self.requests: dict = {}
+        self.n = 0
+        self.loop = asyncio.new_event_loop()
+        self.port = 0
+
+    def respond(self, method: str, path: str, headers: dict, body: bytes):
+        raise NotImplementedError
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path = line.decode().split(" ")[:2]
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode().partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.n += 1
+                self.requests[method] = self.requests.get(method, 0) + 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, extra, out = self.respond(method, path, headers, body)
+                head = "".join(f"{k}: {v}\r\n" for k, v in extra.items())
+                writer.write(f"HTTP/1.1 {status}\r\n{head}Content-Length: {len(out)}\r\n\r\n".encode() + out)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        writer.close()
+
+    def start(self) -> str:
+        import threading
+
+        ready = threading.Event()
+
+        async def serve():
+            server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+
+        threading.Thread(target=lambda: (self.loop.run_until_complete(serve()), self.loop.run_forever()), daemon=True).start()
+        ready.wait()
+        return f"http://127.0.0.1:{self.port}"
+
+class WebhookStandIn(StandInServer):
+    """Webhook Discord : {"id": n} avec une latence fixe ; une requête sur `every`
+    reçoit un 429 {"retry_after": ...}."""
+
+    def __init__(self, every: int, retry_after: float, latency: float):
+        super().__init__(latency)
+        self.every = every
+        self.retry_after = retry_after
+        self.limited = 0
+
+    def respond(self, method: str, path: str, headers: dict, body: bytes):
+        if self.every and self.n % self.every == 0:
+            self.limited += 1
+            out = '{"retry_after": %s, "global": false}' % self.retry_after
+            return "429 Too Many Requests", {"Content-Type": "application/json"}, out.encode()
+        return "200 OK", {"Content-Type": "application/json"}, ('{"id": "%d"}' % self.n).encode()
+
+    def start(self) -> str:
+        return super().start() + "/api/webhooks/1/token"
+
+async def bench_alerts(args):
+    from alerts import Alert, AlertDispatcher
+
+    stand_in = WebhookStandIn(args.every, args.retry_after, args.latency / 1000)
+    url = stand_in.start()
+    rng = np.random.default_rng(args.seed)
+
+    # référence : un POST bloquant par alerte, depuis la boucle de scan (ancien schéma, sur échantillon)
+    import httpx
+
+    sample = min(args.baseline, args.arts * args.tiles)
+    t0 = time.perf_counter()
+    for i in range(sample):
+        httpx.post(url + "?wait=true", json={"embeds": [{"title": "t", "description": str(i), "color": 0}]})
+    blocking = (time.perf_counter() - t0) / max(1, sample)
+    base_conn = stand_in.connections
+    stand_in.connections = stand_in.n = stand_in.limited = 0
+    stand_in.requests = {}
+
+    d = AlertDispatcher(args.queue, args.window)
+    d.configure(url)
+    d.start()
+    submit_cost, lags = [], []
+    period = 1.0 / args.hz
+    t_end = time.perf_counter() + args.seconds
+    while time.perf_counter() < t_end:
+        diffs = rng.integers(5, 200, (args.arts, args.tiles)).tolist()
+        alerts = [
+            Alert("degradation" if v >= 30 else "suspicion", True, "Dégradation en cours !",
+                  f"Œuvre: A{aid} | tuile=({k * 100},0,100,100) | diffs={v}", "#E74C3C", aid, (k,))
+            for aid, row in enumerate(diffs) for k, v in enumerate(row)
+        ]
+        t0 = time.perf_counter()
+        for alert in alerts:
+            d.submit(alert)
+        submit_cost.append(time.perf_counter() - t0)
+        t_sleep = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - t_sleep - period)
+    t0 = time.perf_counter()
+    await d.close()
+    drain = time.perf_counter() - t0
+    st = d.stats()
+    n = args.arts * args.tiles
+    print(f"tempête : {args.arts} œuvres x {args.tiles} tuiles en alerte, {args.hz:g} passes/s, {args.seconds:g} s")
+    print(f"  POST bloquant (référence) : {blocking * 1000:7.2f} ms/alerte -> {n * blocking * 1000:8.1f} ms de passe "
+          f"({base_conn} connexions pour {sample} requêtes)")
+    print(f"  submit()                  : {_pct(submit_cost, 50) * 1e6 / n:7.2f} µs/alerte | passe p99 "
+          f"{_pct(submit_cost, 99) * 1000:6.2f} ms | retard boucle p99 {_pct(lags, 99) * 1000:6.2f} ms")
+    print(f"  alertes {st['submitted']} -> fusionnées {st['coalesced']}, abandonnées {st['dropped']} ; "
+          f"embeds envoyés {st['sent']}, modifiés {st['edited']}, identiques {st['unchanged']}, échecs {st['failed']}")
+    print(f"  webhook : {stand_in.n} requêtes {stand_in.requests} dont {stand_in.limited} x 429 "
+          f"(vus {st['rate_limited']}) sur {stand_in.connections} connexion(s) ; vidage final {drain * 1000:.0f} ms")
+
+# ============================================================================
+# chunks : carte lue en tuiles HTTP (ETag, keep-alive) face à un serveur local
+# ============================================================================
+class ChunkStandIn(StandInServer):
+    """Serveur de tuiles façon wplace : GET /{x}/{y}.png, PNG à palette (index 0 transparent).
+
+    Tuiles générées à la demande (aplats 8x8) sur une grille `grid` x `grid` ;
+    celles de `empty` répondent 404. ETag par version de tuile : If-None-Match
+    à jour -> 304. `paint()` repeint un rectangle de la carte (nouvelle version).
+    """
+
+    def __init__(self, chunk: int, grid: int, colors: int = 32, seed: int = 0, empty=()):
+        super().__init__()
+        self.chunk = chunk
+        self.grid = grid
+        self.seed = seed
+        self.colors = colors
+        rng = np.random.default_rng(seed)
+        self.lut = rng.integers(0, 256, (256, 4), dtype=np.uint8)
+        self.lut[:, 3] = 255
+        self.lut[0] = 0
+        self.empty = set(empty)
+        self.tiles: dict = {}  # (tx, ty) -> [index (chunk, chunk), version, png]
+        self.not_modified = 0
+
+    def tile(self, tx: int, ty: int):
+        t = self.tiles.get((tx, ty))
+        if t is None:
+            rng = np.random.default_rng((self.seed, tx, ty))
+            n = self.chunk
+            blocks = rng.integers(1, self.colors, (-(-n // 8), -(-n // 8))).astype(np.uint8)
+            t = self.tiles[(tx, ty)] = [np.ascontiguousarray(blocks.repeat(8, 0).repeat(8, 1)[:n, :n]), 0, None]
+        return t
+
+    def _png(self, t) -> bytes:
+        from PIL import Image
+
+        if t[2] is None:
+            im = Image.fromarray(t[0], "P")
+            im.putpalette(self.lut[:, :3].tobytes())
+            buf = io.BytesIO()
+            im.save(buf, "PNG", transparency=0, compress_level=1)
+            t[2] = buf.getvalue()
+        return t[2]
+
+    def respond(self, method: str, path: str, headers: dict, body: bytes):
+        try:
+            tx, ty = (int(v) for v in path.split("?")[0].rsplit(".", 1)[0].strip("/").split("/")[-2:])
+        except ValueError:
+            return "400 Bad Request", {}, b""
+        if (tx, ty) in self.empty or not (0 <= tx < self.grid and 0 <= ty < self.grid):
+            return "404 Not Found", {}, b""
+        t = self.tile(tx, ty)
+        etag = f'"{tx}-{ty}-{t[1]}"'
+        if headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return "304 Not Modified", {"ETag": etag}, b""
+        return "200 OK", {"Content-Type": "image/png", "ETag": etag}, self._png(t)
+
+    def paint(self, x: int, y: int, w: int, h: int, index: int = 0):
+        """Repeint un rectangle (coordonnées carte) ; appelé depuis le thread du serveur."""
+        n = self.chunk
+        for ty in range(y // n, (y + h - 1) // n + 1):
+            for tx in range(x // n, (x + w - 1) // n + 1):
+                t = self.tile(tx, ty)
+                t[0][max(0, y - ty * n) : y + h - ty * n, max(0, x - tx * n) : x + w - tx * n] = index
+                t[1] += 1
+                t[2] = None
+
+    def truth(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """RGBA attendu pour un rectangle (mêmes règles que ChunkSource)."""
+        out = np.zeros((h, w, 4), dtype=np.uint8)
+        n = self.chunk
+        for ty in range(y // n, (y + h - 1) // n + 1):
+            for tx in range(x // n, (x + w - 1) // n + 1):
+                if (tx, ty) in self.empty:
+                    continue
+                idx = self.tile(tx, ty)[0]
+                x0, y0, x1, y1 = max(x, tx * n), max(y, ty * n), min(x + w, (tx + 1) * n), min(y + h, (ty + 1) * n)
+                out[y0 - y : y1 - y, x0 - x : x1 - x] = self.lut[idx[y0 - ty * n : y1 - ty * n, x0 - tx * n : x1 - tx * n]]
+        return out
+
+async def bench_chunks(args):
+    from sources import ChunkSource
+
+    rng = np.random.default_rng(args.seed)
+    span = args.spread * args.chunk - args.art
+    arts = [(int(rng.integers(0, span)), int(rng.integers(0, span))) for _ in range(args.arts)]
+    # une tuile vide (404) sous la première œuvre : lue transparente
+    empty = {(arts[0][0] // args.chunk, arts[0][1] // args.chunk)} if args.arts > 1 else set()
+    stand_in = ChunkStandIn(args.chunk, args.spread, seed=args.seed, empty=empty)
+    url = stand_in.start()
+    src = ChunkSource(url, chunk=args.chunk, grid=args.spread, refresh=0.0, cache_bytes=args.cache_mb << 20)
+    info = await src.info()
+    rss0 = _peak_rss_mb()
+
+    rects = [(x, y, x + args.art, y + args.art) for x, y in arts]
+    boxes = app.plan_capture(rects, max_boxes=src.max_boxes)  # comme la boucle de scan
+    read_px = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+
+    async def one_pass():
+        t0 = time.perf_counter()
+        frame = await app.get_regions(src, boxes)
+        return time.perf_counter() - t0, [frame.view(*r) for r in rects]
+
+    def check(out) -> bool:
+        return all(np.array_equal(o, stand_in.truth(x, y, args.art, args.art)) for (x, y), o in zip(arts, out))
+
+    cold, out = await one_pass()
+    parity = check(out)
+    warm, seen = [], 0
+    for i in range(args.passes):
+        painted = None
+        if i % max(1, args.passes // max(1, args.griefs)) == 0 and len(arts) > 1:
+            k = int(rng.integers(1, len(arts)))
+            g = min(args.grief, args.art)
+            painted = (k, arts[k][0] + int(rng.integers(0, args.art - g + 1)), arts[k][1] + int(rng.integers(0, args.art - g + 1)), g)
+            stand_in.loop.call_soon_threadsafe(stand_in.paint, painted[1], painted[2], g, g)
+            await asyncio.sleep(0.01)
+        dt, out = await one_pass()
+        warm.append(dt)
+        parity = parity and check(out)
+        if painted is not None:
+            k, gx, gy, g = painted
+            x, y = arts[k]
+            seen += int((out[k][gy - y : gy - y + g, gx - x : gx - x + g, 3] == 0).all())
+    st = src.stats()
+    touched = len({(tx, ty) for x, y in arts
+                   for ty in range(y // args.chunk, (y + args.art - 1) // args.chunk + 1)
+                   for tx in range(x // args.chunk, (x + args.art - 1) // args.chunk + 1)})
+    await src.close()
+    print(f"{args.arts} œuvres {args.art}x{args.art} sur {args.spread}x{args.spread} tuiles de {args.chunk} px "
+          f"({touched} tuiles utiles), {args.passes} passes")
+    print(f"  plan_capture : {len(boxes)} lectures, {read_px / (len(rects) * args.art ** 2):.2f} x les pixels des œuvres")
+    print(f"  passe à froid {_fmt_ms(cold)} | passe à chaud p50 {_fmt_ms(_pct(warm, 50))} p95 {_fmt_ms(_pct(warm, 95))}")
+    print(f"  requêtes {st['requests']} : décodées {st['decoded']}, 304 {st['not_modified']}, vides {st['empty']}, "
+          f"erreurs {st['errors']} | {st['bytes'] / 1e6:.1f} Mo reçus sur {stand_in.connections} connexion(s)")
+    print(f"  cache {st['cached']} tuiles, {st['cache_bytes'] / 1e6:.1f} Mo (index de palette) | "
+          f"RSS pic {_peak_rss_mb():.0f} Mo (avant lecture {rss0:.0f} Mo, serveur local compris)")
+    print(f"  parité avec la carte servie : {'OK' if parity else 'ÉCHEC'} | dégradations vues {seen}/{min(args.griefs, args.passes)}")
+
+# ============================================================================
+# pagediff : noyau JS du moteur "page" (exécuté sous node) vs diff Python
+# ============================================================================
+PAGEDIFF_NODE = r"""
+const fs = require('fs');
+const dir = process.argv[2];
+const spec = JSON.parse(fs.readFileSync(dir + '/spec.json'));
+const rd = (n) => new Uint8Array(fs.readFileSync(dir + '/' + n));
+const ref = {w: spec.w, tpl: rd('tpl'), grd: rd('grd'), bits: rd('bits')};
+const cur = rd('cur');
+const stride = spec.w + 2 * spec.pad;
+const out = [];
+const t0 = process.hrtime.bigint();
+for (const [det, build, ign, tol] of spec.combos)
+  for (const [tx, ty, tw, th] of spec.tiles)
+    out.push(bsCountTile(cur, stride, tx + spec.pad, ty + spec.pad, ref, tx, ty, tw, th, det, build, ign, tol));
+const ms = Number(process.hrtime.bigint() - t0) / 1e6;
+process.stdout.write(JSON.stringify({out, ms}));
+"""
+
+def pagediff_art(w: int, h: int, griefs: int, grief: int, seed: int = 0):
+    """Œuvre synthétique : sol, template à trous et DEFACE, polygone, canvas posé à 60 % puis griefé."""
+    rng = np.random.default_rng(seed)
+    grd = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    tpl = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    tpl[rng.random((h, w)) < 0.2, 3] = 0
+    tpl[rng.random((h, w)) < 0.05, :3] = app.DEFACE_RGB
+    yy, xx = np.mgrid[:h, :w]
+    poly = np.abs(xx - w / 2) / w + np.abs(yy - h / 2) / h < 0.45  # losange
+    cur = np.where((rng.random((h, w)) < 0.6)[..., None], tpl, grd)
+    noise = rng.integers(-10, 11, cur.shape)
+    cur = np.clip(cur.astype(np.int16) + noise * (rng.random((h, w, 1)) < 0.1), 0, 255).astype(np.uint8)
+    for _ in range(griefs):
+        x, y = int(rng.integers(0, w - grief)), int(rng.integers(0, h - grief))
+        cur[y : y + grief, x : x + grief] = rng.integers(0, 256, 4, dtype=np.uint8)
+    alpha = tpl[..., 3] > 0
+    deface = (tpl[..., 0] == 0xDE) & (tpl[..., 1] == 0xFA) & (tpl[..., 2] == 0xCE)
+    return cur, tpl, grd, alpha, deface, poly
+
+def bench_pagediff(args):
+    import json
+    import pagediff
+    from diffengine import tile_ref_from_assets
+
+    w, h, t, pad = args.width, args.height, args.tile, 7
+    cur, tpl, grd, alpha, deface, poly = pagediff_art(w, h, args.griefs, args.grief, args.seed)
+    tiles = [(x, y, min(t, w - x), min(t, h - y)) for y in range(0, h, t) for x in range(0, w, t)]
+    modes = ("alpha_only", "polygon_only", "alpha_or_polygon")
+    combos = [(m, b, i, tol) for m in modes for b in (True, False) for i in (True, False) for tol in (0, args.tol, -1)]
+
+    # référence : diff Python (tile_ref_from_assets + tile_defects), englobante du masque
+    ref = []
+    t0 = time.perf_counter()
+    for m, build, ign, tol in combos:
+        for x, y, tw, th in tiles:
+            r = tile_ref_from_assets(tpl, grd, alpha, deface, poly, (x, y, tw, th), m, build, ign)
+            bad = app.tile_defects(cur[y : y + th, x : x + tw], r, tol)
+            n = int(bad.sum())
+            if n:
+                rows, cols = np.flatnonzero(bad.any(axis=1)), np.flatnonzero(bad.any(axis=0))
+                ref.append([n, int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)])
+            else:
+                ref.append([0])
+    dt_py = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory(prefix="bluescan-pagediff-") as d:
+        width, tpl_b, grd_b, bits_b = pagediff.pack_refs(tpl, grd, alpha, deface, poly)
+        boxed = np.zeros((h + 2 * pad, w + 2 * pad, 4), np.uint8)  # œuvre décalée dans la boîte lue
+        boxed[pad : pad + h, pad : pad + w] = cur
+        for name, data in (("tpl", tpl_b), ("grd", grd_b), ("bits", bits_b), ("cur", boxed.tobytes())):
+            with open(os.path.join(d, name), "wb") as f:
+                f.write(data)
+        spec = {
+            "w": width, "pad": pad, "tiles": tiles,
+            "combos": [(pagediff.detourage_code(m, True), b, i, tol) for m, b, i, tol in combos],
+        }
+        with open(os.path.join(d, "spec.json"), "w") as f:
+            json.dump(spec, f)
+        with open(os.path.join(d, "run.js"), "w") as f:
+            f.write(pagediff.KERNEL_JS + PAGEDIFF_NODE)
+        try:
+            res = json.loads(subprocess.run([args.node, os.path.join(d, "run.js"), d], check=True, capture_output=True).stdout)
+        except FileNotFoundError:
+            print(f"{args.node} introuvable : noyau JS non vérifié")
+            return
+    got = res["out"]
+    bad = [(combos[k // len(tiles)], tiles[k % len(tiles)], ref[k], got[k]) for k in range(len(ref)) if ref[k] != got[k]]
+    for c, tile, r, g in bad[:5]:
+        print(f"  écart {c} tuile={tile} : python={r} js={g}")
+    n = len(ref)
+    print(f"parité {'OK' if not bad else 'ÉCHEC'} : {n - len(bad)}/{n} tuiles ({len(tiles)} tuiles x {len(combos)} combinaisons, "
+          f"comptes et englobantes)")
+    print(f"  noyau JS {n / (res['ms'] / 1000):9.0f} tuiles/s | Python tuile par tuile {n / dt_py:9.0f} tuiles/s")
+
+    # octets rapatriés par passe, œuvre terminée puis griefée : RGBA des tuiles vs
+    # résultats JSON (+ englobantes relues pour la carte des dégâts, alert_scope="artwork")
+    rng = np.random.default_rng(args.seed + 1)
+    done = np.where((alpha & ~deface)[..., None], tpl, grd)
+    for _ in range(args.griefs):
+        x, y = int(rng.integers(0, w - args.grief)), int(rng.integers(0, h - args.grief))
+        done[y : y + args.grief, x : x + args.grief] = rng.integers(0, 256, 4, dtype=np.uint8)
+    results, boxes = [], 0
+    for x, y, tw, th in tiles:
+        r = tile_ref_from_assets(tpl, grd, alpha, deface, poly, (x, y, tw, th), "alpha_only", True, False)
+        bad = app.tile_defects(done[y : y + th, x : x + tw], r, 0)
+        if bad.any():
+            rows, cols = np.flatnonzero(bad.any(axis=1)), np.flatnonzero(bad.any(axis=0))
+            results.append([int(bad.sum()), int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)])
+            boxes += results[-1][3] * results[-1][4] * 4
+        else:
+            results.append([0])
+    rgba = sum(tw * th * 4 for _, _, tw, th in tiles)
+    size = len(json.dumps(results, separators=(",", ":")))
+    print(f"  par passe ({len(tiles)} tuiles, {args.griefs} griefs) : RGBA {rgba / 1e6:.2f} Mo | résultats {size} o | "
+          f"+ englobantes en défaut {boxes / 1e3:.1f} ko (x{rgba / max(1, size + boxes):.0f} de moins)")
+
+# ============================================================================
+# coarse : passe grossière des tuiles template+sol, rappel sur griefs synthétiques
+# ============================================================================
+def coarse_griefs(kind: str, inside: np.ndarray, deface: np.ndarray, alpha: np.ndarray, poly: np.ndarray,
+                  stride: int, susp: int, rng):
+    """Masque (h, w) des pixels repeints par un grief de type `kind`, ou None si la tuile ne s'y prête pas."""
+    h, w = inside.shape
+    out = np.zeros((h, w), bool)
+    if kind.startswith("carré"):
+        k = stride if kind == "carré stride" else math.isqrt(susp - 1) + 1
+        x, y = int(rng.integers(0, w - k + 1)), int(rng.integers(0, h - k + 1))
+        out[y : y + k, x : x + k] = True
+    elif kind == "ligne":
+        n = min(susp, w)
+        x, y = int(rng.integers(0, w - n + 1)), int(rng.integers(0, h))
+        out[y, x : x + n] = True
+    elif kind == "colonne":
+        n = min(susp, h)
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h - n + 1))
+        out[y : y + n, x] = True
+    else:
+        pool = {"épars": np.ones((h, w), bool), "DEFACE": inside & deface, "polygone": poly & ~alpha}[kind]
+        idx = np.flatnonzero(pool)
+        if idx.size < susp:
+            return None
+        out.reshape(-1)[rng.choice(idx, susp, replace=False)] = True
+    return out
+
+def bench_coarse(args):
+    from diffengine import coarse_phase, coarse_ref, tile_ref_from_assets
+
+    s, t, susp = args.stride, args.tile, args.susp
+    w, h = 4 * t, 3 * t
+    _, tpl, grd, alpha, deface, poly = pagediff_art(w, h, 0, 0, args.seed)
+    rng = np.random.default_rng(args.seed)
+    tiles = [(x, y, t, t) for y in range(0, h, t) for x in range(0, w, t)]
+    kinds = ("carré stride", "carré seuil", "ligne", "colonne", "épars", "DEFACE", "polygone")
+    thr = max(1, int(app.COARSE_ESCALATE * susp))
+    single = s * s >= thr  # un pixel échantillonné suffit à l'escalade
+    print(f"stride={s} seuil de suspicion={susp} escalade à {thr} px estimés "
+          f"({'1 pixel échantillonné suffit' if single else f'{-(-thr // (s * s))} pixels échantillonnés'})")
+    print(f"{'grief':<14}{'essais':>8}{'passe 1':>10}{f'<= {s * s} passes':>15}{'passes moy.':>13}")
+
+    failures = []
+    stats = {k: [0, 0, 0, 0] for k in kinds}  # alertables, vus passe 1, vus <= s², somme des passes
+    for mode in ("alpha_only", "polygon_only", "alpha_or_polygon"):
+        for build in (True, False):
+            for ign in (True, False):
+                for kind in kinds:
+                    trials = []
+                    for _ in range(args.trials):
+                        x, y, tw, th = tiles[int(rng.integers(0, len(tiles)))]
+                        r = tile_ref_from_assets(tpl, grd, alpha, deface, poly, (x, y, tw, th), mode, build, ign)
+                        sl = (slice(y, y + th), slice(x, x + tw))
+                        ins = (alpha if mode == "alpha_only" else poly if mode == "polygon_only" else alpha | poly)[sl]
+                        cur = np.where((ins & ~deface[sl])[..., None], tpl[sl], grd[sl])  # œuvre terminée
+                        g = coarse_griefs(kind, ins, deface[sl], alpha[sl], poly[sl], s, susp, rng)
+                        if g is None:
+                            continue
+                        cur[g, :3] = grd[sl][g, :3] ^ 0x80
+                        cur[g, 3] = 255
+                        # carré stride x stride : recompte exact attendu dès la passe 1 (trop petit pour alerter) ;
+                        # autres griefs : ne comptent que s'ils alertent en pleine résolution (pixels libres, etc.)
+                        bad = app.tile_defects(cur, r, args.tol)
+                        if (bad != g).any() if kind == "carré stride" else int(bad.sum()) < susp:
+                            continue
+                        trials.append((cur, r, tw))
+                    first = [0] * len(trials)
+                    for p in range(1, s * s + 1):
+                        batch = app.DiffBatch()
+                        for cur, r, tw in trials:
+                            ox, oy = coarse_phase(p, s, tw, cur.shape[0])
+                            batch.add(cur[oy::s, ox::s], coarse_ref(r, tw, s, ox, oy))
+                        hits = batch.run(args.tol) if trials else []
+                        for i, n in enumerate(hits):
+                            if not first[i] and app.coarse_escalates(int(n), s, susp):
+                                first[i] = p
+                    st = stats[kind]
+                    st[0] += len(trials)
+                    st[1] += sum(1 for f in first if f == 1)
+                    st[2] += sum(1 for f in first if f)
+                    st[3] += sum(first)
+                    if single and (any(not f for f in first) or kind == "carré stride" and any(f != 1 for f in first)):
+                        failures.append((mode, build, ign, kind))
+    for kind, (n, p1, ps, tot) in stats.items():
+        if n:
+            print(f"{kind:<14}{n:8d}{100 * p1 / n:9.1f}%{100 * ps / n:14.1f}%{tot / max(1, ps):13.2f}")
+    if single:
+        print(f"garanties (carré stride x stride vu à la passe 1, tout grief en <= {s * s} passes) : "
+              f"{'OK' if not failures else 'ÉCHEC ' + str(failures[:5])}")
+
+    # coût par passe sur des tuiles propres : pleine résolution vs grossier
+    refs = [tile_ref_from_assets(tpl, grd, alpha, deface, poly, tile, "alpha_or_polygon", True, True) for tile in tiles]
+    clean = np.where((alpha & ~deface)[..., None], tpl, grd)
+    curs = [clean[y : y + th, x : x + tw] for x, y, tw, th in tiles] * (args.tiles // len(tiles))
+    refs = refs * (args.tiles // len(tiles))
+    subs = [coarse_ref(r, t, s, 1, 2) for r in refs[: len(tiles)]] * (args.tiles // len(tiles))
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        _run_batch(app.DiffBatch(), curs, refs, args.tol)
+    dt_full = (time.perf_counter() - t0) / args.repeat
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        _run_batch(app.DiffBatch(), [c[2::s, 1::s] for c in curs], subs, args.tol)
+    dt_coarse = (time.perf_counter() - t0) / args.repeat
+    n = len(curs)
+    print(f"tuiles propres : pleine résolution {n / dt_full:9.0f} tuiles/s | grossier {n / dt_coarse:9.0f} tuiles/s | "
+          f"x{dt_full / dt_coarse:.1f}")
+
+# ============================================================================
+# Entrée
+# ============================================================================
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks Blue-Scan")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("transfer", help="lecture du canvas : btoa vs tranches binaires (Chromium requis)")
+    p.add_argument("--sizes", type=int, nargs="+", default=[256, 1024, 2048])
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(run=bench_transfer)
+
+    p = sub.add_parser("screencast", help="screenshot par passe vs screencast CDP : parité, coût par passe, fraîcheur (Chromium requis)")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--repeat", type=int, default=10)
+    p.set_defaults(run=bench_screencast)
+
+    p = sub.add_parser("diff", help="diff tuile par tuile vs moteur par lot (parité + tuiles/s)")
+    p.add_argument("--tiles", type=int, default=256)
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--tol", type=int, default=8)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(run=bench_diff)
+
+    p = sub.add_parser("workers", help="diff inline vs pool de processus (tuiles/s de 1 à N workers)")
+    p.add_argument("--tiles", type=int, default=512)
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--tol", type=int, default=8)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    p.set_defaults(run=bench_workers)
+
+    p = sub.add_parser("scan", help="boucle de surveillance sur canvas rejoué : tuiles/s, latence de détection, mémoire")
+    p.add_argument("--arts", type=int, nargs="+", default=[4], help="nombre d'œuvres (plusieurs valeurs : une ligne par combinaison)")
+    p.add_argument("--tiles", type=int, nargs="+", default=[64], help="tuiles par œuvre")
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--hz", type=float, default=5.0)
+    p.add_argument("--budget", type=int, default=64, help="tiles_global_per_tick")
+    p.add_argument("--capture", choices=("roi", "full"), default="roi")
+    p.add_argument("--scheduler", choices=("priority", "rr"), default="priority")
+    p.add_argument("--workers", type=int, default=0)
+    p.add_argument("--events", type=int, default=20, help="dégradations scriptées")
+    p.add_argument("--grief", type=int, default=8, help="côté du carré repeint (px)")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--warmup", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--replay", default=None, help="frames .npz (frames, times) à la place du canvas synthétique")
+    p.add_argument("-v", "--verbose", action="store_true")
+    p.set_defaults(run=bench_scan)
+
+    p = sub.add_parser("palette", help="références RGBA vs index de palette uint8 (parité, mémoire, tuiles/s)")
+    p.add_argument("--tiles", type=int, default=256)
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--colors", type=int, default=32, help="couleurs de la palette du canvas")
+    p.add_argument("--overflow-colors", type=int, default=300, help="palette du second contrôle de parité (> 253 : palette pleine)")
+    p.add_argument("--tol", type=int, default=8)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(run=bench_palette)
+
+    p = sub.add_parser("alerts", help="dispatcher d'alertes face à un webhook local (429, keep-alive, tempête)")
+    p.add_argument("--arts", type=int, default=20)
+    p.add_argument("--tiles", type=int, default=16, help="tuiles en alerte par œuvre et par passe")
+    p.add_argument("--hz", type=float, default=10.0)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--queue", type=int, default=1024)
+    p.add_argument("--window", type=float, default=1.0)
+    p.add_argument("--every", type=int, default=7, help="un 429 toutes les N requêtes (0 : jamais)")
+    p.add_argument("--retry-after", type=float, default=0.05)
+    p.add_argument("--latency", type=float, default=5.0, help="latence du webhook (ms)")
+    p.add_argument("--baseline", type=int, default=50, help="POST bloquants mesurés pour la référence")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(run=bench_alerts)
+
+    p = sub.add_parser("chunks", help="carte en tuiles HTTP (ETag, keep-alive) face à un serveur local : parité, requêtes, mémoire")
+    p.add_argument("--arts", type=int, default=40)
+    p.add_argument("--art", type=int, default=300, help="côté des œuvres (px)")
+    p.add_argument("--chunk", type=int, default=1000, help="côté des tuiles de la carte (px)")
+    p.add_argument("--spread", type=int, default=32, help="côté de la grille de tuiles où sont placées les œuvres")
+    p.add_argument("--passes", type=int, default=20)
+    p.add_argument("--griefs", type=int, default=5)
+    p.add_argument("--grief", type=int, default=8, help="côté du carré repeint (px)")
+    p.add_argument("--cache-mb", type=int, default=256)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(run=bench_chunks)
+
+    p = sub.add_parser("pagediff", help="noyau JS du moteur page (sous node) vs diff Python : parité, octets rapatriés")
+    p.add_argument("--width", type=int, default=430)
+    p.add_argument("--height", type=int, default=310)
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--tol", type=int, default=8)
+    p.add_argument("--griefs", type=int, default=6)
+    p.add_argument("--grief", type=int, default=8, help="côté du carré repeint (px)")
+    p.add_argument("--node", default="node", help="exécutable node")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(run=bench_pagediff)
+
+    p = sub.add_parser("coarse", help="passe grossière template+sol : rappel sur griefs synthétiques, tuiles/s")
+    p.add_argument("--stride", type=int, default=4)
+    p.add_argument("--susp", type=int, default=30, help="seuil de suspicion")
+    p.add_argument("--tile", type=int, default=100)
+    p.add_argument("--tol", type=int, default=8)
+    p.add_argument("--trials", type=int, default=100, help="griefs par type et par combinaison de sémantique")
+    p.add_argument("--tiles", type=int, default=240, help="tuiles propres pour la mesure de débit")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(run=bench_coarse)
+
+    args = ap.parse_args()
+    res = args.run(args)
+    if asyncio.iscoroutine(res):
+        asyncio.run(res)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# backend/damage.py
+"""Analyse des dégâts d'une œuvre : composantes connexes des pixels en défaut.
+
+Le masque de défauts de chaque tuile scannée est recollé dans une carte par
+œuvre (`DamageMap`) : une attaque à cheval sur deux tuiles, même scannées à
+des passes différentes, forme une seule zone. L'étiquetage (8-connexité) est
+un union-find vectorisé : on accroche la racine la plus grande de chaque
+arête à la plus petite puis on compresse les chemins par sauts de pointeurs,
+jusqu'à ce que plus aucune arête ne relie deux racines distinctes.
+"""
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import numpy as np
+
+MAX_COMPONENTS = 32  # zones détaillées par rapport (les plus grosses)
+TOP_COLORS = 3
+
+def label(mask: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Étiquettes 1..n des composantes 8-connexes de `mask` (0 = fond)."""
+    h, w = mask.shape
+    idx = np.flatnonzero(mask)
+    n = idx.size
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    if n == 0:
+        return labels, 0
+    pos = np.full(mask.size, -1, dtype=np.int64)
+    pos[idx] = np.arange(n)
+    pos = pos.reshape(h, w)
+    # arêtes entre voisins : droite, bas, diagonales bas-droite et bas-gauche
+    a_parts, b_parts = [], []
+    for (ya, xa), (yb, xb) in (
+        ((slice(None), slice(None, -1)), (slice(None), slice(1, None))),
+        ((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+        ((slice(None, -1), slice(None, -1)), (slice(1, None), slice(1, None))),
+        ((slice(None, -1), slice(1, None)), (slice(1, None), slice(None, -1))),
+    ):
+        both = mask[ya, xa] & mask[yb, xb]
+        a_parts.append(pos[ya, xa][both])
+        b_parts.append(pos[yb, xb][both])
+    a = np.concatenate(a_parts)
+    b = np.concatenate(b_parts)
+    parent = np.arange(n)
+    while a.size:
+        ra, rb = parent[a], parent[b]
+        diff = ra != rb
+        if not diff.any():
+            break
+        a, b, ra, rb = a[diff], b[diff], ra[diff], rb[diff]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+        while True:
+            pp = parent[parent]
+            if np.array_equal(pp, parent):
+                break
+            parent = pp
+    roots, comp = np.unique(parent, return_inverse=True)
+    labels.reshape(-1)[idx] = comp + 1
+    return labels, len(roots)
+
+def hex_color(v: int) -> str:
+    """Pixel RGBA packé (uint32 little-endian) -> "#RRGGBB" ("transparent" si alpha nul)."""
+    r, g, b, a = v & 0xFF, (v >> 8) & 0xFF, (v >> 16) & 0xFF, v >> 24
+    return "transparent" if a == 0 else f"#{r:02X}{g:02X}{b:02X}"
+
+@dataclass
+class Component:
+    x: int
+    y: int
+    w: int
+    h: int
+    pixels: int
+    colors: List[str] = field(default_factory=list)  # couleurs posées les plus fréquentes
+
+@dataclass
+class DamageReport:
+    pixels: int = 0  # total des pixels en défaut de l'œuvre
+    count: int = 0  # nombre de zones
+    components: List[Component] = field(default_factory=list)
+
+def components(mask: np.ndarray, colors: np.ndarray, ox: int = 0, oy: int = 0) -> DamageReport:
+    """Zones de `mask`, des plus grosses aux plus petites ; `colors` : pixels uint32 courants."""
+    lab, n = label(mask)
+    if n == 0:
+        return DamageReport()
+    flat = lab.reshape(-1)
+    sel = np.flatnonzero(flat)
+    l = flat[sel] - 1
+    ys, xs = np.divmod(sel, mask.shape[1])
+    sizes = np.bincount(l, minlength=n)
+    x0 = np.full(n, mask.shape[1])
+    y0 = np.full(n, mask.shape[0])
+    x1 = np.zeros(n, dtype=np.int64)
+    y1 = np.zeros(n, dtype=np.int64)
+    np.minimum.at(x0, l, xs)
+    np.minimum.at(y0, l, ys)
+    np.maximum.at(x1, l, xs)
+    np.maximum.at(y1, l, ys)
+    order = np.argsort(-sizes, kind="stable")[:MAX_COMPONENTS]
+    # couleurs par zone : paires (zone, couleur) comptées en un seul np.unique
+    keys = (l.astype(np.uint64) << np.uint64(32)) | colors.reshape(-1)[sel].astype(np.uint64)
+    pairs, counts = np.unique(keys, return_counts=True)
+    pair_l = (pairs >> np.uint64(32)).astype(np.int64)
+    out = []
+    for k in order:
+        m = pair_l == k
+        top = np.argsort(-counts[m], kind="stable")[:TOP_COLORS]
+        cols = [hex_color(int(v) & 0xFFFFFFFF) for v in pairs[m][top]]
+        out.append(Component(
+            int(x0[k]) + ox, int(y0[k]) + oy, int(x1[k] - x0[k] + 1), int(y1[k] - y0[k] + 1), int(sizes[k]), cols,
+        ))
+    return DamageReport(int(sizes.sum()), n, out)
+
+class DamageMap:
+    """Défauts connus d'une œuvre (masque + couleur posée), tenus à jour tuile par tuile."""
+
+    def __init__(self, w: int, h: int):
+        self.mask = np.zeros((h, w), dtype=bool)
+        self.colors = np.zeros((h, w), dtype=np.uint32)
+        self.dirty = False
+        self.report = DamageReport()
+
+    def set_tile(self, x: int, y: int, defects: np.ndarray, cur: np.ndarray):
+        """Remplace la zone de la tuile par ses défauts (bool) et ses pixels courants (RGBA)."""
+        h, w = defects.shape
+        self.mask[y : y + h, x : x + w] = defects
+        self.colors[y : y + h, x : x + w] = np.ascontiguousarray(cur).view(np.uint32)[..., 0]
+        self.dirty = True
+
+    def clear_tile(self, x: int, y: int, w: int, h: int):
+        sub = self.mask[y : y + h, x : x + w]
+        if sub.any():
+            sub[...] = False
+            self.dirty = True
+
+    def analyze(self) -> DamageReport:
+        """Rapport à jour ; l'étiquetage ne porte que sur l'englobante des défauts."""
+        if not self.dirty:
+            return self.report
+        self.dirty = False
+        rows = np.flatnonzero(self.mask.any(axis=1))
+        if rows.size == 0:
+            self.report = DamageReport()
+            return self.report
+        cols = np.flatnonzero(self.mask.any(axis=0))
+        sl = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        self.report = components(self.mask[sl], self.colors[sl], int(cols[0]), int(rows[0]))
+        return self.report
@@ -0,0 +1,166 @@
+# backend/diffengine.py
+"""Moteur de diff par lot : toutes les tuiles d'une passe en un seul calcul NumPy.
+
+Sémantique identique au calcul historique tuile par tuile :
+
+    tpl_ok, grd_ok = within_tol(cur, tpl), within_tol(cur, grd)
+    dedans  : DEFACE -> grd_ok ; sinon build -> tpl_ok | grd_ok, protect -> tpl_ok
+    dehors  : ignore_outside -> ok ; sinon grd_ok
+
+Cette table est pliée une fois par tuile (et par version d'assets) en trois
+poids booléens, `use_tpl`, `use_grd` et `free`, de sorte qu'un pixel est en
+défaut ssi  ~free & ~(use_tpl & tpl_ok) & ~(use_grd & grd_ok).
+Les pixels sont comparés en RGBA packé uint32 ; la tolérance par canal n'est
+évaluée que sur les pixels non strictement égaux (et jamais si tol == 0).
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+@dataclass
+class TileRef:
+    """Références précalculées d'une tuile, contiguës et aplaties en (n, 4)."""
+
+    tpl: np.ndarray  # uint8 (n, 4)
+    grd: np.ndarray  # uint8 (n, 4)
+    use_tpl: np.ndarray  # bool (n,)
+    use_grd: np.ndarray  # bool (n,)
+    free: np.ndarray  # bool (n,)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.tpl, self.grd, self.use_tpl, self.use_grd, self.free))
+
+def make_tile_ref(
+    tpl_t: np.ndarray,
+    grd_t: np.ndarray,
+    inside: np.ndarray,
+    deface: np.ndarray,
+    build: bool,
+    ignore_outside: bool,
+) -> TileRef:
+    inside = inside.reshape(-1)
+    deface = deface.reshape(-1)
+    use_tpl = inside & ~deface
+    use_grd = (inside & (deface | build)) | (~inside & (not ignore_outside))
+    free = ~inside & ignore_outside
+    return TileRef(
+        tpl=np.ascontiguousarray(tpl_t).reshape(-1, 4),
+        grd=np.ascontiguousarray(grd_t).reshape(-1, 4),
+        use_tpl=np.ascontiguousarray(use_tpl),
+        use_grd=np.ascontiguousarray(use_grd),
+        free=np.ascontiguousarray(free),
+    )
+
+def tile_ref_from_assets(
+    tpl: np.ndarray,
+    grd: np.ndarray,
+    alpha: np.ndarray,
+    deface: np.ndarray,
+    poly: Optional[np.ndarray],
+    rect: Tuple[int, int, int, int],
+    detourage_mode: str,
+    build: bool,
+    ignore_outside: bool,
+) -> TileRef:
+    """TileRef d'une tuile (x, y, w, h) à partir des assets pleine taille d'une œuvre."""
+    x, y, w, h = rect
+    sl = (slice(y, y + h), slice(x, x + w))
+    if detourage_mode == "alpha_only" or poly is None:
+        inside = alpha[sl]
+    elif detourage_mode == "polygon_only":
+        inside = poly[sl]
+    else:
+        inside = alpha[sl] | poly[sl]
+    return make_tile_ref(tpl[sl], grd[sl], inside, deface[sl], build, ignore_outside)
+
+def coarse_phase(n: int, stride: int, w: int, h: int) -> Tuple[int, int]:
+    """Décalage (ox, oy) de l'échantillonnage grossier à la passe n : en stride²
+    passes consécutives, chaque pixel d'une tuile est échantillonné au moins une fois."""
+    p = n % (stride * stride)
+    return (p % stride) % w, (p // stride) % h
+
+def coarse_ref(ref: TileRef, w: int, stride: int, ox: int, oy: int) -> TileRef:
+    """Pixels (oy::stride, ox::stride) d'une TileRef de largeur `w` : même sémantique
+    (DEFACE, détourage, build / protect), à comparer à `cur[oy::stride, ox::stride]`."""
+    h = ref.free.size // w
+
+    def pick(a: np.ndarray) -> np.ndarray:
+        sub = a.reshape(h, w, *a.shape[1:])[oy::stride, ox::stride]
+        return np.ascontiguousarray(sub).reshape(-1, *a.shape[1:])
+
+    return TileRef(tpl=pick(ref.tpl), grd=pick(ref.grd), use_tpl=pick(ref.use_tpl), use_grd=pick(ref.use_grd), free=pick(ref.free))
+
+def _close(a: np.ndarray, b: np.ndarray, tol: int) -> np.ndarray:
+    # |a - b| <= tol sur chaque canal, en uint8 (pas de promotion int16) ;
+    # les 4 booléens d'un pixel valent 0x01010101 une fois vus en uint32
+    d = np.maximum(a, b)
+    d -= np.minimum(a, b)
+    return (d <= tol).view(np.uint32).reshape(-1) == 0x01010101
+
+def defects(cur: np.ndarray, ref: TileRef, tol: int) -> np.ndarray:
+    """Masque (n,) des pixels en défaut, pour `cur` (n, 4) contigu aligné sur `ref`."""
+    pend = ~ref.free
+    if tol >= 0:
+        # 1) égalité stricte en uint32 (chemin unique si tol == 0)
+        cur32 = cur.view(np.uint32).reshape(-1)
+        tpl32 = ref.tpl.view(np.uint32).reshape(-1)
+        grd32 = ref.grd.view(np.uint32).reshape(-1)
+        pend &= ~(ref.use_tpl & (cur32 == tpl32))
+        pend &= ~(ref.use_grd & (cur32 == grd32))
+        # 2) tolérance par canal sur les seuls pixels encore en défaut
+        #    (gather en uint32 : bien plus rapide que des lignes (k, 4) uint8)
+        if tol > 0:
+            idx = np.flatnonzero(pend)
+            if idx.size:
+                c = cur32[idx].view(np.uint8).reshape(-1, 4)
+                ok = ref.use_tpl[idx] & _close(c, tpl32[idx].view(np.uint8).reshape(-1, 4), tol)
+                ok |= ref.use_grd[idx] & _close(c, grd32[idx].view(np.uint8).reshape(-1, 4), tol)
+                pend[idx[ok]] = False
+    return pend
+
+def count_batch(cur: np.ndarray, ref: TileRef, sizes: List[int], tol: int) -> np.ndarray:
+    """Nombre de pixels en défaut par tuile, pour des tableaux (n, 4) déjà empilés."""
+    pend = defects(cur, ref, tol)
+    offsets = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    return np.add.reduceat(pend.view(np.uint8), offsets, dtype=np.int64)
+
+def tile_defects(cur: np.ndarray, ref: TileRef, tol: int) -> np.ndarray:
+    """Masque (h, w) des pixels en défaut d'une tuile (vue RGBA quelconque)."""
+    return defects(np.ascontiguousarray(cur).reshape(-1, 4), ref, tol).reshape(cur.shape[:2])
+
+class DiffBatch:
+    """Accumule les tuiles d'une passe puis calcule tous les diffs en un appel."""
+
+    def __init__(self):
+        self.curs: List[np.ndarray] = []
+        self.refs: List[TileRef] = []
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def add(self, cur: np.ndarray, ref: TileRef) -> int:
+        self.curs.append(cur)
+        self.refs.append(ref)
+        return len(self.refs) - 1
+
+    def run(self, tol: int) -> np.ndarray:
+        if not self.refs:
+            return np.zeros(0, dtype=np.int64)
+        sizes = [r.free.size for r in self.refs]
+        # empilement : copie unique de chaque vue `cur` (non contiguë) dans un buffer commun
+        cur = np.empty((sum(sizes), 4), dtype=np.uint8)
+        off = 0
+        for c, n in zip(self.curs, sizes):
+            cur[off : off + n].reshape(c.shape)[...] = c
+            off += n
+        stacked = TileRef(
+            tpl=np.concatenate([r.tpl for r in self.refs]),
+            grd=np.concatenate([r.grd for r in self.refs]),
+            use_tpl=np.concatenate([r.use_tpl for r in self.refs]),
+            use_grd=np.concatenate([r.use_grd for r in self.refs]),
+            free=np.concatenate([r.free for r in self.refs]),
+        )
+        return count_batch(cur, stacked, sizes, tol)
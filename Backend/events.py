@@ -0,0 +1,137 @@
+# backend/events.py
+"""Flux d'événements poussé aux clients (Server-Sent Events).
+
+Chaque événement est numéroté et sérialisé une seule fois, puis déposé tel
+quel dans la file bornée de chaque abonné : le coût d'une publication ne
+dépend pas du nombre de clients connectés. Les derniers événements restent
+dans un anneau pour la reprise (`Last-Event-ID`) ; un client trop en retard
+(file pleine, ou reprise hors de l'anneau) repart d'un instantané complet.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, List, Optional, Set, Tuple
+
+RING = 1024  # événements gardés pour la reprise
+CLIENT_QUEUE = 256  # événements en attente par client
+HEARTBEAT_S = 15.0
+
+def sse(seq: int, kind: str, data: Any) -> bytes:
+    return f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}\n\n".encode()
+
+class _Client:
+    __slots__ = ("queue", "lagging")
+
+    def __init__(self):
+        self.queue: "asyncio.Queue[Tuple[int, bytes]]" = asyncio.Queue(CLIENT_QUEUE)
+        self.lagging = False
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.ring: Deque[Tuple[int, bytes]] = deque(maxlen=RING)
+        self.clients: Set[_Client] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.lagged = 0
+
+    @property
+    def active(self) -> bool:
+        """Vrai si au moins un client écoute (sinon inutile de construire les événements)."""
+        return bool(self.clients)
+
+    def publish(self, kind: str, data: Any):
+        """Publie depuis la boucle asyncio ou depuis un thread (endpoints synchrones)."""
+        if not self.clients:
+            self.skip()
+            return
+        with self.lock:
+            self.seq += 1
+            item = (self.seq, sse(self.seq, kind, data))
+            self.ring.append(item)
+        self.published += 1
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(item)
+        else:
+            loop.call_soon_threadsafe(self._fanout, item)
+
+    def skip(self):
+        """Événement non sérialisé (aucun client) : une reprise ultérieure repartira d'un instantané."""
+        with self.lock:
+            self.seq += 1
+            self.ring.clear()
+
+    def _fanout(self, item: Tuple[int, bytes]):
+        for c in self.clients:
+            if c.lagging:
+                continue
+            try:
+                c.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # client trop lent : on coupe, il se reconnecte avec Last-Event-ID
+                c.lagging = True
+                self.lagged += 1
+
+    def since(self, last_id: int) -> Optional[List[Tuple[int, bytes]]]:
+        """Événements postérieurs à `last_id`, ou None s'ils ne sont plus dans l'anneau."""
+        with self.lock:
+            if last_id > self.seq:
+                return None
+            if last_id == self.seq:
+                return []
+            if not self.ring or self.ring[0][0] > last_id + 1:
+                return None
+            return [item for item in self.ring if item[0] > last_id]
+
+    async def stream(
+        self,
+        snapshot: Callable[[], Awaitable[Any]],
+        last_id: Optional[int] = None,
+        max_s: float = 300.0,
+        disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[bytes]:
+        """Corps SSE d'un client : reprise ou instantané, puis le direct jusqu'à `max_s`."""
+        self.loop = asyncio.get_running_loop()
+        client = _Client()
+        self.clients.add(client)  # avant l'instantané : rien n'est perdu entre les deux
+        try:
+            backlog = self.since(last_id) if last_id is not None else None
+            if backlog is None:
+                with self.lock:
+                    sent = self.seq
+                yield b"retry: 2000\n\n" + sse(sent, "snapshot", await snapshot())
+                # les événements publiés pendant la construction de l'instantané suivent
+                backlog = self.since(sent) or []
+            else:
+                sent = last_id
+            for seq, msg in backlog:
+                sent = seq
+                yield msg
+            deadline = self.loop.time() + max_s
+            while not client.lagging:
+                left = deadline - self.loop.time()
+                if left <= 0:
+                    break
+                try:
+                    seq, msg = await asyncio.wait_for(client.queue.get(), min(HEARTBEAT_S, left))
+                    if seq > sent:  # déjà envoyé avec le rattrapage sinon
+                        sent = seq
+                        yield msg
+                except asyncio.TimeoutError:
+                    if disconnected is not None and await disconnected():
+                        break
+                    yield b": ping\n\n"
+        finally:
+            self.clients.discard(client)
+
+    def stats(self):
+        return {"clients": len(self.clients), "seq": self.seq, "published": self.published, "lagged": self.lagged}
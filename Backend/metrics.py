@@ -0,0 +1,172 @@
+# backend/metrics.py
+"""Instrumentation en mémoire, exposée au format texte Prometheus (0.0.4).
+
+Sans dépendance : compteurs et jauges (valeur, ou callback lu au scrape) et
+histogrammes à buckets fixes, avec labels. Désactivé (BLUE_SCAN_METRICS=0),
+`inc` / `observe` / `time` retournent immédiatement et `/metrics` est vide.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ENABLED = os.getenv("BLUE_SCAN_METRICS", "1") != "0"
+
+# secondes : 0.1 ms .. 10 s
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class _Scalar(_Metric):
+    """Une valeur par jeu de labels ; avec `fn`, les valeurs sont lues au scrape ({labels: valeur})."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels, float] = {}
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            items = sorted(self.fn().items())
+        else:
+            with self.lock:
+                items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in items]
+
+class Counter(_Scalar):
+    kind = "counter"
+
+    def inc(self, *labels: str, n: float = 1):
+        if not ENABLED:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + n
+
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        if not ENABLED:
+            return
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Iterable[float] = TIME_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Labels, List[float]] = {}  # [compte par bucket..., +Inf, somme]
+
+    def observe(self, value: float, *labels: str):
+        if not ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels) if ENABLED else _NOOP
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        out = self.header()
+        for k, s in items:
+            acc = 0
+            for b, n in zip(self.buckets + (float("inf"),), s[:-1]):
+                acc += n
+                le = 'le="%s"' % _fmt_value(b)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {_fmt_value(s[-1])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {acc}")
+        return out
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+        return False
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        if not ENABLED:
+            return ""
+        lines: List[str] = []
+        for m in self.metrics.values():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, help: str, labels: Sequence[str] = (), fn=None) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels, fn))
+
+def gauge(name: str, help: str, labels: Sequence[str] = (), fn=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels, fn))
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Iterable[float] = TIME_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+# ============================================================================
+# Métriques partagées par plusieurs modules
+# ============================================================================
+DB_SECONDS = histogram("bluescan_db_seconds", "Durée des accès SQLite", ("pool", "op"))
+DB_BATCH = histogram("bluescan_db_write_batch_jobs", "Travaux par transaction du thread écrivain", (), (1, 2, 4, 8, 16, 32, 64))
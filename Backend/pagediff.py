@@ -0,0 +1,170 @@
+# backend/pagediff.py
+"""Diff des tuiles calculé dans la page (diff_engine="page").
+
+Les références de chaque œuvre (template, sol, et un octet de masques par
+pixel : alpha, polygone, DEFACE) sont envoyées une fois par version
+d'assets et gardées dans la page en tableaux typés. À chaque passe, la
+page lit ses boîtes de capture avec getImageData et applique la même
+sémantique que diffengine (build / protect, DEFACE, détourage,
+ignore_outside, tolérance par canal) : seuls reviennent, par tuile, le
+nombre de pixels en défaut et leur englobante.
+
+Le noyau `bsCountTile` est du JavaScript pur, sans DOM : bench.py
+l'exécute aussi sous node pour vérifier la parité avec le diff Python.
+"""
+import base64
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Box = Tuple[int, int, int, int]
+# (aid, version, x œuvre, y œuvre, x tuile, y tuile, w, h, build, détourage)
+TileSpec = Tuple[int, int, int, int, int, int, int, int, bool, int]
+
+DETOURAGE = {"alpha_only": 0, "polygon_only": 1}  # autre : alpha | polygone
+REFS_MAX_BYTES = 256 << 20  # références gardées par page (les plus anciennes sont oubliées)
+
+KERNEL_JS = r"""
+// Pixels en défaut d'une tuile : [n] ou [n, x, y, w, h] (englobante, coordonnées tuile).
+// cur : RGBA de la boîte lue (largeur stride), tuile en (cx, cy) dans la boîte.
+// ref : {w, tpl, grd, bits} pleine taille de l'œuvre ; bits : 1 alpha, 2 polygone, 4 DEFACE.
+// det : 0 alpha, 1 polygone, 2 alpha | polygone (comme tile_ref_from_assets).
+function bsCountTile(cur, stride, cx, cy, ref, tx, ty, tw, th, det, build, ignoreOutside, tol) {
+  const tpl = ref.tpl, grd = ref.grd, bits = ref.bits;
+  let n = 0, x0 = tw, y0 = th, x1 = -1, y1 = -1;
+  for (let j = 0; j < th; j++) {
+    let c = ((cy + j) * stride + cx) * 4;
+    let r = (ty + j) * ref.w + tx;
+    for (let i = 0; i < tw; i++, c += 4, r++) {
+      const b = bits[r];
+      const inside = det === 0 ? (b & 1) : det === 1 ? (b & 2) : (b & 3);
+      let useTpl = false, useGrd;
+      if (inside) {
+        useTpl = !(b & 4);
+        useGrd = (b & 4) || build;
+      } else {
+        if (ignoreOutside) continue;  // pixel libre
+        useGrd = true;
+      }
+      if (tol >= 0) {
+        const p = r * 4;
+        if (useTpl &&
+            Math.abs(cur[c] - tpl[p]) <= tol && Math.abs(cur[c + 1] - tpl[p + 1]) <= tol &&
+            Math.abs(cur[c + 2] - tpl[p + 2]) <= tol && Math.abs(cur[c + 3] - tpl[p + 3]) <= tol) continue;
+        if (useGrd &&
+            Math.abs(cur[c] - grd[p]) <= tol && Math.abs(cur[c + 1] - grd[p + 1]) <= tol &&
+            Math.abs(cur[c + 2] - grd[p + 2]) <= tol && Math.abs(cur[c + 3] - grd[p + 3]) <= tol) continue;
+      }
+      n++;
+      if (i < x0) x0 = i;
+      if (i > x1) x1 = i;
+      if (j < y0) y0 = j;
+      y1 = j;
+    }
+  }
+  return n ? [n, x0, y0, x1 - x0 + 1, y1 - y0 + 1] : [0];
+}
+"""
+
+INSTALL_JS = "(() => {" + KERNEL_JS + r"""
+  if (window.__bsDiff) return true;
+  const refs = new Map();
+  let total = 0;
+  const bytes = (s) => {
+    const b = atob(s), a = new Uint8Array(b.length);
+    for (let i = 0; i < b.length; i++) a[i] = b.charCodeAt(i);
+    return a;
+  };
+  const canvas = () => {
+    const cs = Array.from(document.querySelectorAll('canvas'));
+    let best = cs[0], area = best ? best.width * best.height : 0;
+    for (const c of cs) { const a = c.width * c.height; if (a > area) { best = c; area = a; } }
+    return best;
+  };
+  window.__bsDiff = {
+    put([aid, version, w, tpl, grd, bits, cap]) {
+      const old = refs.get(aid);
+      if (old) { total -= old.size; refs.delete(aid); }
+      const ref = {version, w, tpl: bytes(tpl), grd: bytes(grd), bits: bytes(bits)};
+      ref.size = ref.tpl.length + ref.grd.length + ref.bits.length;
+      refs.set(aid, ref);
+      total += ref.size;
+      for (const [k, v] of refs) {
+        if (total <= cap || k === aid) break;
+        refs.delete(k); total -= v.size;
+      }
+    },
+    count([box, tiles, tol, ignoreOutside]) {
+      const c = canvas();
+      if (!c) return null;
+      const bw = box[2] - box[0];
+      let cur;
+      try {
+        cur = c.getContext('2d', {willReadFrequently: true}).getImageData(box[0], box[1], bw, box[3] - box[1]).data;
+      } catch (e) {
+        return null;  // canvas "tainted" : lecture par capture d'écran côté Python
+      }
+      return tiles.map(t => {
+        const ref = refs.get(t[0]);
+        if (!ref || ref.version !== t[1]) return null;  // références absentes ou périmées
+        return bsCountTile(cur, bw, t[2] + t[4] - box[0], t[3] + t[5] - box[1], ref,
+                           t[4], t[5], t[6], t[7], t[9], t[8], ignoreOutside, tol);
+      });
+    },
+  };
+  return true;
+})()"""
+
+COUNT_JS = "(args) => window.__bsDiff ? window.__bsDiff.count(args) : -1"
+PUT_JS = "(args) => window.__bsDiff.put(args)"
+
+def pack_refs(tpl: np.ndarray, grd: np.ndarray, alpha: np.ndarray, deface: np.ndarray, poly: Optional[np.ndarray]) -> Tuple[int, bytes, bytes, bytes]:
+    """(largeur, template RGBA, sol RGBA, masques) d'une œuvre, tels que lus par bsCountTile."""
+    bits = alpha.astype(np.uint8) | (deface.astype(np.uint8) << 2)
+    if poly is not None:
+        bits |= poly.astype(np.uint8) << 1
+    return tpl.shape[1], np.ascontiguousarray(tpl).tobytes(), np.ascontiguousarray(grd).tobytes(), bits.tobytes()
+
+def detourage_code(detourage_mode: str, has_poly: bool) -> int:
+    return DETOURAGE.get(detourage_mode, 2) if has_poly else 0
+
+async def count_in_page(
+    page,
+    box: Box,
+    tiles: Sequence[TileSpec],
+    tol: int,
+    ignore_outside: bool,
+    refs: Callable[[int], Tuple[int, bytes, bytes, bytes]],
+) -> Optional[List[List[int]]]:
+    """Résultats bsCountTile des tuiles d'une boîte ; (ré)installe le noyau et
+    envoie les références manquantes au besoin. None si le canvas n'est pas lisible."""
+    args = [list(box), [list(t) for t in tiles], tol, ignore_outside]
+    out = await page.evaluate(COUNT_JS, args)
+    if out == -1:  # page (re)chargée : noyau et références perdus
+        await page.evaluate(INSTALL_JS)
+        out = await page.evaluate(COUNT_JS, args)
+    if out is None:
+        return None
+    missing = sorted({(t[0], t[1]) for t, r in zip(tiles, out) if r is None})
+    if not missing:
+        return out
+    for aid, version in missing:
+        w, *arrays = refs(aid)
+        await page.evaluate(PUT_JS, [aid, version, w, *(base64.b64encode(b).decode() for b in arrays), REFS_MAX_BYTES])
+    redo = [i for i, r in enumerate(out) if r is None]
+    again = await page.evaluate(COUNT_JS, [list(box), [list(tiles[i]) for i in redo], tol, ignore_outside])
+    if again is None or again == -1:
+        return None
+    for i, r in zip(redo, again):
+        out[i] = r  # encore None : tuile lue et comparée côté Python
+    return out
+
+def group_tiles(boxes: List[Box], rects: List[Box]) -> List[List[int]]:
+    """Index des rectangles par boîte englobante (plan_capture couvre chaque rectangle)."""
+    groups: List[List[int]] = [[] for _ in boxes]
+    for i, (x0, y0, x1, y1) in enumerate(rects):
+        for k, (bx0, by0, bx1, by1) in enumerate(boxes):
+            if bx0 <= x0 and by0 <= y0 and x1 <= bx1 and y1 <= by1:
+                groups[k].append(i)
+                break
+    return groups
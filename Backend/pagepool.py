@@ -0,0 +1,225 @@
+# backend/pagepool.py
+"""Pool de pages Chromium (Playwright) pour lire le canvas.
+
+Chaque page vit dans son propre contexte (cache, tas JS et plantages
+isolés) et charge la même URL : les coordonnées canvas sont communes.
+
+- Les pages de scan se partagent les boîtes de capture d'une passe par
+  région : une cellule `cell` x `cell` reste sur la même page d'une passe à
+  l'autre, une nouvelle cellule va à la page la moins chargée. Une page lit
+  ses boîtes en série (verrou par page), les pages lisent en parallèle.
+- `lease()` prête une page de réserve aux snapshots : ils n'attendent pas
+  la boucle de scan (repli sur une page de scan si la réserve est occupée
+  par un recyclage).
+- Santé (au plus toutes les `check_every` secondes) : page fermée ou
+  plantée, sonde `evaluate` en échec ou au-delà de `probe_timeout`, tas JS
+  au-delà de `max_heap_mb`, page plus vieille que `max_age`, ou `MAX_FAILURES`
+  lectures en échec d'affilée -> contexte fermé, page recréée. Navigateur
+  déconnecté -> relancé avec toutes ses pages.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Box = Tuple[int, int, int, int]  # (x0, y0, x1, y1)
+
+MAX_FAILURES = 3
+HEAP_PROBE = "(() => (performance.memory ? performance.memory.usedJSHeapSize : 0))()"
+
+@dataclass
+class Slot:
+    index: int
+    spare: bool = False
+    context: Any = None
+    page: Any = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    born: float = 0.0
+    failures: int = 0
+    broken: bool = False
+    heap: int = 0
+    load: int = 0  # pixels assignés pendant la passe en cours
+
+    @property
+    def ready(self) -> bool:
+        return self.page is not None and not self.broken
+
+class PagePool:
+    def __init__(
+        self,
+        launch: Callable[[], Awaitable[Any]],
+        url: str,
+        pages: int = 2,
+        viewport: Tuple[int, int] = (1600, 900),
+        max_heap_mb: int = 1024,
+        max_age: float = 1800.0,
+        probe_timeout: float = 5.0,
+        check_every: float = 30.0,
+        cell: int = 512,
+    ):
+        self.launch = launch
+        self.url = url
+        self.viewport = viewport
+        self.max_heap = max_heap_mb << 20
+        self.max_age = max_age
+        self.probe_timeout = probe_timeout
+        self.check_every = check_every
+        self.cell = cell
+        self.browser: Any = None
+        self.slots = [Slot(i) for i in range(max(1, pages))] + [Slot(max(1, pages), spare=True)]
+        self.sticky: Dict[Tuple[int, int], int] = {}  # cellule -> index de page
+        self.next_check = 0.0
+        self.start_lock = asyncio.Lock()
+        self.recycled: Dict[str, int] = {}
+
+    @property
+    def scan_slots(self) -> List[Slot]:
+        return [s for s in self.slots if not s.spare]
+
+    async def start(self):
+        async with self.start_lock:
+            if self.browser is None or not self.browser.is_connected():
+                self.browser = await self.launch()
+                for s in self.slots:
+                    s.context = s.page = None
+            await asyncio.gather(*(self._open(s) for s in self.slots if s.page is None))
+
+    async def _open(self, slot: Slot):
+        w, h = self.viewport
+        slot.context = await self.browser.new_context(viewport={"width": w, "height": h})
+        page = await slot.context.new_page()
+        page.on("crash", lambda _: setattr(slot, "broken", True))
+        await page.goto(self.url, wait_until="domcontentloaded", timeout=60_000)
+        slot.page, slot.born, slot.failures, slot.broken, slot.heap = page, time.monotonic(), 0, False, 0
+
+    async def _recycle(self, slot: Slot, reason: str):
+        self.recycled[reason] = self.recycled.get(reason, 0) + 1
+        print(f"[Pages] page {slot.index} recyclée ({reason})")
+        old, slot.page = slot.context, None
+        try:
+            if old is not None:
+                await old.close()
+        except Exception:
+            pass
+        try:
+            await self._open(slot)
+        except Exception as e:
+            slot.broken = True
+            print(f"[Pages] page {slot.index} non recréée : {e}")
+
+    async def _probe(self, slot: Slot) -> Optional[str]:
+        """Raison de recycler la page, ou None si elle est saine."""
+        if slot.page is None or slot.broken or slot.page.is_closed():
+            return "crash"
+        if slot.failures >= MAX_FAILURES:
+            return "errors"
+        if time.monotonic() - slot.born > self.max_age:
+            return "age"
+        try:
+            slot.heap = int(await asyncio.wait_for(slot.page.evaluate(HEAP_PROBE), self.probe_timeout))
+        except Exception:
+            return "unresponsive"
+        if slot.heap > self.max_heap:
+            return "heap"
+        return None
+
+    async def check(self, force: bool = False):
+        """Contrôle de santé périodique ; recycle les pages en défaut."""
+        now = time.monotonic()
+        if not force and now < self.next_check:
+            return
+        self.next_check = now + self.check_every
+        if self.browser is None or not self.browser.is_connected():
+            self.recycled["browser"] = self.recycled.get("browser", 0) + 1
+            await self.start()
+            return
+
+        async def one(slot: Slot):
+            async with slot.lock:
+                reason = await self._probe(slot)
+                if reason is not None:
+                    await self._recycle(slot, reason)
+
+        await asyncio.gather(*(one(s) for s in self.slots))
+
+    def assign(self, boxes: List[Box]) -> Dict[int, List[int]]:
+        """Index des boîtes par page de scan (cellule du coin haut-gauche, collante)."""
+        live = [s for s in self.scan_slots if s.ready] or self.scan_slots
+        by_index = {s.index: s for s in live}
+        for s in live:
+            s.load = 0
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        area: Dict[Tuple[int, int], int] = {}
+        for i, (x0, y0, x1, y1) in enumerate(boxes):
+            key = (x0 // self.cell, y0 // self.cell)
+            cells.setdefault(key, []).append(i)
+            area[key] = area.get(key, 0) + (x1 - x0) * (y1 - y0)
+        # cellules connues d'abord (page gardée), puis les nouvelles, plus grosses en premier
+        order = sorted(cells, key=lambda k: (self.sticky.get(k, -1) not in by_index, -area[k]))
+        plan: Dict[int, List[int]] = {}
+        seen = {}
+        for key in order:
+            slot = by_index.get(self.sticky.get(key, -1))
+            if slot is None:
+                slot = min(live, key=lambda s: s.load)
+            seen[key] = slot.index
+            slot.load += area[key]
+            plan.setdefault(slot.index, []).extend(cells[key])
+        self.sticky = seen
+        return plan
+
+    async def map(self, boxes: List[Box], read: Callable[[Any, Box], Awaitable[Any]]) -> List[Any]:
+        """Lit chaque boîte sur sa page ; pages en parallèle, boîtes d'une page en série."""
+        out: List[Any] = [None] * len(boxes)
+
+        async def run(slot: Slot, idx: List[int]):
+            async with slot.lock:
+                for i in idx:
+                    try:
+                        out[i] = await read(slot.page, boxes[i])
+                    except Exception:
+                        slot.failures += 1
+                        raise
+                    slot.failures = 0
+
+        await asyncio.gather(*(run(self.slots[k], idx) for k, idx in self.assign(boxes).items()))
+        return out
+
+    async def first(self, fn: Callable[[Any], Awaitable[Any]]) -> Any:
+        """Exécute `fn(page)` sur la première page de scan disponible."""
+        slot = next((s for s in self.scan_slots if s.ready), self.slots[0])
+        async with slot.lock:
+            return await fn(slot.page)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Any]:
+        """Page réservée aux lectures ponctuelles (snapshots), hors boucle de scan."""
+        spare = self.slots[-1]
+        slot = spare if spare.ready else min(self.scan_slots, key=lambda s: s.lock.locked())
+        async with slot.lock:
+            yield slot.page
+
+    async def close(self):
+        for s in self.slots:
+            try:
+                if s.context is not None:
+                    await s.context.close()
+            except Exception:
+                pass
+            s.context = s.page = None
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "pages": [
+                {"index": s.index, "spare": s.spare, "ready": s.ready, "age_s": round(now - s.born, 1) if s.page else None,
+                 "heap_mb": round(s.heap / 1e6, 1), "failures": s.failures, "busy": s.lock.locked()}
+                for s in self.slots
+            ],
+            "cells": len(self.sticky),
+            "recycled": dict(self.recycled),
+        }
@@ -0,0 +1,195 @@
+# backend/palette.py
+"""Représentation indexée (uint8) des pixels, pour le moteur de diff.
+
+Le canvas wplace n'utilise qu'une petite palette : chaque couleur RGBA
+rencontrée reçoit un index stable (ajout seul) et les références de tuiles
+tiennent en deux octets par pixel (template, sol) au lieu de onze.
+
+- La tolérance est pliée dans une matrice de correspondance 256 x 256
+  (`match(tol)`) ; quand aucune paire de couleurs distinctes n'est dans la
+  tolérance (cas usuel : couleurs de palette éloignées), elle se réduit à
+  l'identité et le diff est une simple égalité d'octets.
+- Index réservés : ANY (pixel libre : toujours conforme), NEVER (référence
+  absente : jamais conforme ; aussi les pixels DEFACE côté template) et
+  UNKNOWN (couleur du canvas hors palette une fois la palette pleine).
+- Les couleurs du template absentes du canvas (hors palette wplace)
+  reçoivent leur propre index : la sémantique reste celle du diff RGBA.
+- Palette pleine : une référence dont une couleur n'a pas d'index
+  (`IndexedRef.exact` faux), ou une tuile du canvas hors palette comparée
+  avec tolérance, est recomptée par le diff RGBA (`IndexedBatch`).
+"""
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from diffengine import DiffBatch, TileRef
+
+UNKNOWN, ANY, NEVER = 253, 254, 255
+MAX_COLORS = UNKNOWN  # index 0..252
+
+class Palette:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.colors = np.zeros(0, dtype=np.uint32)  # RGBA packé, par index
+        # table de hachage sans collision : slot = (couleur * mul) >> shift
+        # (clés, index, mul, shift), remplacée d'un bloc à chaque ajout
+        self.table = (np.zeros(1, dtype=np.uint32), np.zeros(1, dtype=np.uint8), np.uint32(1), np.uint32(31))
+        self.overflow = 0  # pixels hors palette une fois celle-ci pleine
+        self.fallbacks = 0  # tuiles recomptées en RGBA (couleur sans index)
+        self._match: Dict[int, Tuple[int, np.ndarray, bool]] = {}
+
+    def __len__(self) -> int:
+        return len(self.colors)
+
+    def _add(self, new: np.ndarray):
+        with self.lock:
+            new = np.setdiff1d(new, self.colors)
+            new = new[: MAX_COLORS - len(self.colors)]
+            if not len(new):
+                return
+            self.colors = np.concatenate([self.colors, new.astype(np.uint32)])
+            self._rehash()
+
+    def _rehash(self):
+        """Cherche un multiplicateur sans collision (table agrandie au besoin)."""
+        n = len(self.colors)
+        bits = 16
+        while True:
+            for k in range(64):
+                mul = np.uint32((0x9E3779B1 + 0x2545F492 * k) & 0xFFFFFFFF | 1)
+                slots = (self.colors * mul) >> np.uint32(32 - bits)
+                if np.unique(slots).size == n:
+                    # slots vides : clé d'une couleur hachée ailleurs, donc jamais égale au pixel
+                    keys = np.full(1 << bits, self.colors[0], dtype=np.uint32)
+                    vals = np.zeros(1 << bits, dtype=np.uint8)
+                    keys[slots] = self.colors
+                    vals[slots] = np.arange(n, dtype=np.uint8)
+                    self.table = (keys, vals, mul, np.uint32(32 - bits))
+                    return
+            bits += 2
+
+    def quantize(self, rgba: np.ndarray, unknown: int = UNKNOWN) -> np.ndarray:
+        """Index (n,) des pixels RGBA (..., 4) ; les nouvelles couleurs sont ajoutées."""
+        packed = np.ascontiguousarray(rgba).view(np.uint32).reshape(-1)
+        if not packed.size:
+            return np.zeros(0, dtype=np.uint8)
+        if not len(self.colors):
+            self._add(np.unique(packed))
+        while True:
+            keys, vals, mul, shift = self.table
+            slot = packed * mul
+            slot >>= shift
+            hit = keys[slot] == packed
+            if hit.all():
+                return vals[slot]
+            if len(self.colors) >= MAX_COLORS:
+                break
+            self._add(np.unique(packed[~hit]))
+        # palette pleine : les couleurs restantes prennent l'index `unknown`
+        miss = ~hit
+        self.overflow += int(np.count_nonzero(miss))
+        out = vals[slot]
+        out[miss] = unknown
+        return out
+
+    def match(self, tol: int) -> Tuple[np.ndarray, bool]:
+        """(table (256 * 256,) bool indexée par cur << 8 | ref, vrai si identité)."""
+        n = len(self.colors)
+        cached = self._match.get(tol)
+        if cached is not None and cached[0] == n:
+            return cached[1], cached[2]
+        c = self.colors.view(np.uint8).reshape(-1, 4).astype(np.int16)
+        m = np.zeros((256, 256), dtype=bool)
+        if tol >= 0 and n:
+            close = (np.abs(c[:, None, :] - c[None, :, :]) <= tol).all(axis=2)
+            m[:n, :n] = close
+        m[:, ANY] = True
+        identity = bool((m[:n, :n] == np.eye(n, dtype=bool)).all()) if tol >= 0 else False
+        self._match[tol] = (n, m.reshape(-1), identity)
+        return m.reshape(-1), identity
+
+    def stats(self) -> Dict[str, int]:
+        return {"colors": len(self.colors), "overflow": self.overflow, "fallbacks": self.fallbacks}
+
+@dataclass
+class IndexedRef:
+    """Références d'une tuile en index de palette (ANY / NEVER portent les poids)."""
+
+    tpl: np.ndarray  # uint8 (n,)
+    grd: np.ndarray  # uint8 (n,)
+    exact: bool = True  # faux : couleur de référence sans index (palette pleine), diff RGBA requis
+
+    @property
+    def nbytes(self) -> int:
+        return self.tpl.nbytes + self.grd.nbytes
+
+def index_ref(pal: Palette, ref: TileRef) -> IndexedRef:
+    """Replie une TileRef RGBA : DEFACE et pixels sans référence -> NEVER, pixels libres -> ANY."""
+    tpl = np.full(ref.free.size, NEVER, dtype=np.uint8)
+    grd = np.full(ref.free.size, NEVER, dtype=np.uint8)
+    tpl[ref.use_tpl] = pal.quantize(ref.tpl[ref.use_tpl])
+    grd[ref.use_grd] = pal.quantize(ref.grd[ref.use_grd])
+    exact = not ((tpl == UNKNOWN).any() or (grd == UNKNOWN).any())
+    tpl[ref.free] = ANY
+    return IndexedRef(tpl, grd, exact)
+
+def needs_rgba(ref: IndexedRef, cur_idx: np.ndarray, tol: int) -> bool:
+    """Vrai si le diff indexé peut se tromper : référence incomplète, ou couleur du
+    canvas sans index qui pourrait être dans la tolérance d'une référence."""
+    return not ref.exact or (tol > 0 and bool((cur_idx == UNKNOWN).any()))
+
+def indexed_defects(cur: np.ndarray, ref: IndexedRef, table: np.ndarray, identity: bool) -> np.ndarray:
+    """Masque (n,) des pixels en défaut pour des index courants `cur` (n,)."""
+    if identity:
+        # UNKNOWN n'égale jamais une référence ; NEVER n'apparaît jamais côté canvas
+        return (cur != ref.tpl) & (cur != ref.grd) & (ref.tpl != ANY)
+    hi = cur.astype(np.uint16) << 8
+    return ~(table[hi | ref.tpl] | table[hi | ref.grd])
+
+class IndexedBatch:
+    """Pendant de DiffBatch : quantification des tuiles de la passe puis comparaison uint8."""
+
+    def __init__(self, pal: Palette):
+        self.pal = pal
+        self.curs: List[np.ndarray] = []
+        self.refs: List[IndexedRef] = []
+        self.rgba: List[Callable[[], TileRef]] = []
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def add(self, cur: np.ndarray, ref: IndexedRef, rgba: Callable[[], TileRef]) -> int:
+        """`rgba()` : TileRef de la tuile, construite seulement si le diff indexé ne suffit pas."""
+        self.curs.append(cur)
+        self.refs.append(ref)
+        self.rgba.append(rgba)
+        return len(self.refs) - 1
+
+    def run(self, tol: int) -> np.ndarray:
+        if not self.refs:
+            return np.zeros(0, dtype=np.int64)
+        sizes = [r.tpl.size for r in self.refs]
+        cur = np.empty((sum(sizes), 4), dtype=np.uint8)
+        off = 0
+        for c, n in zip(self.curs, sizes):
+            cur[off : off + n].reshape(c.shape)[...] = c
+            off += n
+        idx = self.pal.quantize(cur)
+        table, identity = self.pal.match(tol)
+        stacked = IndexedRef(np.concatenate([r.tpl for r in self.refs]), np.concatenate([r.grd for r in self.refs]))
+        pend = indexed_defects(idx, stacked, table, identity)
+        offsets = np.zeros(len(sizes), dtype=np.int64)
+        np.cumsum(sizes[:-1], out=offsets[1:])
+        counts = np.add.reduceat(pend.view(np.uint8), offsets, dtype=np.int64)
+        redo = [i for i, r in enumerate(self.refs) if needs_rgba(r, idx[offsets[i] : offsets[i] + sizes[i]], tol)]
+        if redo:
+            batch = DiffBatch()
+            for i in redo:
+                batch.add(self.curs[i], self.rgba[i]())
+            counts[redo] = batch.run(tol)
+            self.pal.fallbacks += len(redo)
+        return counts
+
+PALETTE = Palette()
@@ -0,0 +1,334 @@
+# backend/recorder.py
+"""Historique compressé des œuvres, pour rejouer une dégradation après coup.
+
+- Par œuvre, on garde la dernière image connue (tuiles scannées recollées) ;
+  toutes les `interval` secondes, les œuvres dont un pixel a bougé sont
+  envoyées au thread d'écriture. La boucle de scan ne fait qu'une copie :
+  si la file est pleine, l'échantillon est abandonné (jamais d'attente).
+- Encodage : une image clé (pixels bruts + zlib) puis des deltas, XOR avec
+  l'image précédemment écrite, réduits aux plages de pixels modifiés (RLE)
+  puis compressés. Une œuvre inchangée n'écrit rien.
+- Stockage : segments en ajout seul (`seg-<ms>.dat`) avec un index à
+  enregistrements fixes (`seg-<ms>.idx` : œuvre, t, type, offset, taille).
+  Chaque segment recommence par une image clé par œuvre : la rétention
+  (taille totale, âge) supprime des segments entiers sans casser de chaîne.
+"""
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+KEY, DELTA = 0, 1
+KEY_EVERY = 120  # deltas max entre deux images clés d'une œuvre
+SEGMENT_BYTES = 64 << 20
+SEGMENT_SECONDS = 3600.0
+
+HEADER = struct.Struct("<4sIdBIII")  # magic, œuvre, t, type, w, h, taille
+MAGIC = b"BSF2"  # BSF1 : w/h sur 16 bits ; ces segments ne sont plus relus, la rétention les retire
+INDEX_DTYPE = np.dtype([("aid", "<u4"), ("t", "<f8"), ("kind", "u1"), ("w", "<u4"), ("h", "<u4"), ("off", "<u8"), ("len", "<u4")])
+
+# ============================================================================
+# Encodage XOR / RLE
+# ============================================================================
+def encode_key(arr: np.ndarray) -> bytes:
+    return zlib.compress(np.ascontiguousarray(arr).tobytes(), 1)
+
+def encode_delta(prev: np.ndarray, cur: np.ndarray) -> Optional[bytes]:
+    """Plages de pixels modifiés : (n, débuts, longueurs, XOR des pixels). None si identiques."""
+    x = np.ascontiguousarray(cur).view(np.uint32).ravel() ^ np.ascontiguousarray(prev).view(np.uint32).ravel()
+    changed = x != 0
+    if not changed.any():
+        return None
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], changed, [False])).view(np.int8)))
+    starts = edges[0::2].astype(np.uint32)
+    lengths = (edges[1::2] - edges[0::2]).astype(np.uint32)
+    payload = struct.pack("<I", len(starts)) + starts.tobytes() + lengths.tobytes() + x[changed].tobytes()
+    return zlib.compress(payload, 1)
+
+def apply_delta(state: np.ndarray, data: bytes):
+    """Applique un delta sur `state` (modifié en place)."""
+    raw = zlib.decompress(data)
+    n = struct.unpack_from("<I", raw)[0]
+    starts = np.frombuffer(raw, np.uint32, n, 4).astype(np.int64)
+    lengths = np.frombuffer(raw, np.uint32, n, 4 + 4 * n).astype(np.int64)
+    values = np.frombuffer(raw, np.uint32, offset=4 + 8 * n)
+    # positions des pixels : début de plage + rang dans la plage
+    first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    pos = np.repeat(starts - first, lengths) + np.arange(len(values))
+    state.view(np.uint32).reshape(-1)[pos] ^= values
+
+def decode_key(data: bytes, w: int, h: int) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(data), np.uint8).reshape(h, w, 4).copy()
+
+# ============================================================================
+# Segments
+# ============================================================================
+class Segment:
+    def __init__(self, root: str, start_ms: int):
+        self.start_ms = start_ms
+        self.dat = os.path.join(root, f"seg-{start_ms}.dat")
+        self.idx = os.path.join(root, f"seg-{start_ms}.idx")
+
+    @property
+    def start(self) -> float:
+        return self.start_ms / 1000.0
+
+    def size(self) -> int:
+        total = 0
+        for p in (self.dat, self.idx):
+            try:
+                total += os.path.getsize(p)
+            except OSError:
+                pass
+        return total
+
+    def index(self) -> np.ndarray:
+        try:
+            with open(self.dat, "rb") as f:
+                if f.read(len(MAGIC)) not in (MAGIC, b""):
+                    return np.empty(0, INDEX_DTYPE)  # ancien format
+            raw = np.fromfile(self.idx, dtype=np.uint8)
+        except OSError:
+            return np.empty(0, INDEX_DTYPE)
+        n = len(raw) // INDEX_DTYPE.itemsize  # un enregistrement en cours d'écriture est ignoré
+        return raw[: n * INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+
+    def unlink(self):
+        for p in (self.dat, self.idx):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+class FrameRecorder:
+    def __init__(self, root: str, max_bytes: int, max_age: float, queue_size: int = 8):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.segments: List[Segment] = sorted(
+            (Segment(root, int(n[4:-4])) for n in os.listdir(root) if n.startswith("seg-") and n.endswith(".dat")),
+            key=lambda s: s.start_ms,
+        )
+        # côté scan (boucle asyncio)
+        self.states: Dict[int, np.ndarray] = {}
+        self.dirty: set = set()
+        self.last_flush = 0.0
+        # côté écriture (thread dédié)
+        self.q: "queue.Queue[Optional[List[Tuple[int, float, np.ndarray]]]]" = queue.Queue(maxsize=queue_size)
+        self.active: Optional[Segment] = None
+        self.dat_f = None
+        self.idx_f = None
+        self.active_bytes = 0
+        self.prev: Dict[int, np.ndarray] = {}
+        self.since_key: Dict[int, int] = {}
+        self.written = {"keyframes": 0, "deltas": 0, "bytes": 0, "raw_bytes": 0}
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self.thread.start()
+
+    # ------------------------------------------------------------------ scan
+    def update(self, aid: int, w: int, h: int, x: int, y: int, patch: np.ndarray, changed: bool):
+        """Recolle `patch` en (x, y) dans l'image connue de l'œuvre (w x h)."""
+        st = self.states.get(aid)
+        if st is None or st.shape[:2] != (h, w):
+            st = self.states[aid] = np.zeros((h, w, 4), dtype=np.uint8)
+            changed = True
+        ph, pw = min(patch.shape[0], h - y), min(patch.shape[1], w - x)
+        st[y : y + ph, x : x + pw] = patch[:ph, :pw]
+        if changed:
+            self.dirty.add(aid)
+
+    def tick(self, interval: float, now: Optional[float] = None):
+        """Envoie les œuvres modifiées à l'écriture, au plus une fois par `interval`."""
+        now = time.time() if now is None else now
+        if not self.dirty or now - self.last_flush < interval:
+            return
+        self.last_flush = now
+        batch = [(aid, now, self.states[aid].copy()) for aid in self.dirty if aid in self.states]
+        self.dirty.clear()
+        try:
+            self.q.put_nowait(batch)
+        except queue.Full:
+            # l'image suivante sera encodée contre la dernière écrite : rien ne se corrompt
+            self.dropped += len(batch)
+
+    def forget(self, keep):
+        for aid in [a for a in self.states if a not in keep]:
+            del self.states[aid]
+            self.dirty.discard(aid)
+
+    # -------------------------------------------------------------- écriture
+    def _run(self):
+        while True:
+            batch = self.q.get()
+            if batch is None:
+                break
+            try:
+                for aid, t, arr in batch:
+                    self._write(aid, t, arr)
+                self.dat_f.flush()
+                self.idx_f.flush()
+                self._retain(time.time())
+            except Exception as e:
+                print("[Recorder] erreur:", e)
+
+    def _roll(self, t: float):
+        if self.dat_f is not None:
+            self.dat_f.close()
+            self.idx_f.close()
+        seg = Segment(self.root, int(t * 1000))
+        while any(s.start_ms == seg.start_ms for s in self.segments):
+            seg = Segment(self.root, seg.start_ms + 1)
+        self.dat_f = open(seg.dat, "ab")
+        self.idx_f = open(seg.idx, "ab")
+        self.active = seg
+        self.active_bytes = 0
+        self.prev.clear()  # segment autonome : chaque œuvre y recommence par une image clé
+        with self.lock:
+            self.segments.append(seg)
+
+    def _write(self, aid: int, t: float, arr: np.ndarray):
+        if (
+            self.active is None
+            or self.active_bytes >= SEGMENT_BYTES
+            or t - self.active.start >= SEGMENT_SECONDS
+        ):
+            self._roll(t)
+        prev = self.prev.get(aid)
+        data = None
+        kind = KEY
+        if prev is not None and prev.shape == arr.shape and self.since_key.get(aid, 0) < KEY_EVERY:
+            data = encode_delta(prev, arr)
+            if data is None:
+                return
+            kind = DELTA
+        if kind == KEY:
+            data = encode_key(arr)
+            self.since_key[aid] = 0
+            self.written["keyframes"] += 1
+        else:
+            self.since_key[aid] += 1
+            self.written["deltas"] += 1
+        h, w = arr.shape[:2]
+        off = self.dat_f.tell()
+        self.dat_f.write(HEADER.pack(MAGIC, aid, t, kind, w, h, len(data)))
+        self.dat_f.write(data)
+        rec = np.array([(aid, t, kind, w, h, off, len(data))], dtype=INDEX_DTYPE)
+        self.idx_f.write(rec.tobytes())
+        self.active_bytes += HEADER.size + len(data) + INDEX_DTYPE.itemsize
+        self.written["bytes"] += len(data)
+        self.written["raw_bytes"] += arr.nbytes
+        self.prev[aid] = arr
+
+    def _retain(self, now: float):
+        """Supprime les segments les plus anciens (jamais l'actif) au-delà des limites."""
+        with self.lock:
+            segs = list(self.segments)
+        total = sum(s.size() for s in segs)
+        drop = []
+        for i, s in enumerate(segs[:-1]):
+            end = segs[i + 1].start  # fin d'un segment = début du suivant
+            if total <= self.max_bytes and now - end <= self.max_age:
+                break
+            total -= s.size()
+            drop.append(s)
+        if drop:
+            with self.lock:
+                self.segments = [s for s in self.segments if s not in drop]
+            for s in drop:
+                s.unlink()
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join(timeout=5)
+        if self.dat_f is not None:
+            self.dat_f.close()
+            self.idx_f.close()
+
+    # -------------------------------------------------------------- lecture
+    def _records(self, aid: int, t0: float, t1: float) -> Iterator[Tuple[Segment, np.ndarray]]:
+        """Enregistrements de l'œuvre dans [t0, t1], par segment, en partant de la dernière
+        image clé <= t0 (le segment qui la contient est autonome)."""
+        with self.lock:
+            segs = list(self.segments)
+        picked: List[Tuple[Segment, np.ndarray]] = []
+        for s in reversed(segs):
+            if s.start > t1:
+                continue
+            idx = s.index()
+            rows = idx[(idx["aid"] == aid) & (idx["t"] <= t1)]
+            if len(rows):
+                picked.append((s, rows))
+                if rows["t"][0] <= t0:
+                    break
+        for s, rows in reversed(picked):
+            yield s, rows
+
+    def frames(self, aid: int, t0: float, t1: float) -> Iterator[Tuple[float, np.ndarray]]:
+        """États reconstruits de l'œuvre, un par enregistrement de [t0, t1] ; le premier
+        est l'état en vigueur à t0. Chaque état rendu est une vue à copier si conservée."""
+        state: Optional[np.ndarray] = None
+        pending: Optional[float] = None
+        for seg, rows in self._records(aid, t0, t1):
+            starts = np.flatnonzero((rows["kind"] == KEY) & (rows["t"] <= t0))
+            first = int(starts[-1]) if len(starts) else 0
+            try:
+                f = open(seg.dat, "rb")
+            except OSError:
+                continue  # segment supprimé par la rétention entre-temps
+            with f:
+                for r in rows[first:]:
+                    t = float(r["t"])
+                    if t > t0 and pending is not None:
+                        yield pending, state  # état en vigueur à t0
+                        pending = None
+                    f.seek(int(r["off"]) + HEADER.size)
+                    data = f.read(int(r["len"]))
+                    if r["kind"] == KEY:
+                        state = decode_key(data, int(r["w"]), int(r["h"]))
+                    elif state is not None and state.shape[:2] == (r["h"], r["w"]):
+                        apply_delta(state, data)
+                    else:
+                        continue
+                    if t <= t0:
+                        pending = t
+                    else:
+                        yield t, state
+        if pending is not None and state is not None:
+            yield pending, state
+
+    def at(self, aid: int, t: float) -> Optional[Tuple[float, np.ndarray]]:
+        """Dernier état enregistré <= t (horodatage, RGBA), ou None."""
+        last = None
+        for ts, st in self.frames(aid, t, t):
+            last = (ts, st.copy())
+        return last
+
+    def timeline(self, aid: int, t0: float, t1: float) -> List[Tuple[float, int]]:
+        out: List[Tuple[float, int]] = []
+        for _, rows in self._records(aid, t0, t1):
+            rows = rows[rows["t"] >= t0]
+            out.extend(zip(rows["t"].tolist(), rows["kind"].tolist()))
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            segs = list(self.segments)
+        raw = self.written["raw_bytes"]
+        return {
+            "segments": len(segs),
+            "disk_bytes": sum(s.size() for s in segs),
+            "oldest": segs[0].start if segs else None,
+            "tracked_artworks": len(self.states),
+            "queued": self.q.qsize(),
+            "dropped": self.dropped,
+            **self.written,
+            "compression": round(raw / self.written["bytes"], 1) if self.written["bytes"] else None,
+        }
@@ -0,0 +1,205 @@
+# backend/screencast.py
+"""Capture continue par screencast CDP (Page.startScreencast).
+
+Chromium pousse une frame PNG (sans perte : le diff compare des pixels)
+à chaque rendu modifié de la page. Chaque frame est acquittée tout de suite ;
+le décodage se fait dans un thread dédié, vers un anneau de buffers NumPy
+préalloués. Si les frames arrivent plus vite qu'on ne les décode, seule la
+plus récente en attente est gardée (les autres sont comptées `dropped`).
+
+`ScreencastSource` lit la dernière frame décodée sans aller-retour vers la
+page : la cadence de capture ne dépend plus de celle du scan. Le rectangle
+canvas demandé est projeté sur la frame (position et échelle du canvas dans
+la page, comme le repli screenshot) puis ré-échantillonné au plus proche.
+Sans frame (démarrage, page recyclée), la lecture passe par `fallback`.
+"""
+import asyncio
+import base64
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sources import CanvasSource
+
+RING = 4  # frames décodées gardées (une passe lit la dernière pendant que la suivante se décode)
+INFO_EVERY_S = 5.0  # relecture de la géométrie du canvas dans la page
+
+class FrameRing:
+    """Anneau de frames RGBA préallouées ; `latest` désigne la dernière complète."""
+
+    def __init__(self, size: int = RING):
+        self.size = size
+        self.bufs: List[np.ndarray] = []
+        self.i = -1
+        self.latest: Optional[Tuple[int, np.ndarray, Dict[str, Any], float]] = None  # (seq, frame, meta, instant)
+        self.seq = 0
+
+    def slot(self, shape: Tuple[int, int, int]) -> np.ndarray:
+        if not self.bufs or self.bufs[0].shape != shape:
+            self.bufs = [np.empty(shape, dtype=np.uint8) for _ in range(self.size)]
+            self.i = -1
+        self.i = (self.i + 1) % self.size
+        return self.bufs[self.i]
+
+    def publish(self, frame: np.ndarray, meta: Dict[str, Any]):
+        self.seq += 1
+        self.latest = (self.seq, frame, meta, time.monotonic())
+
+def decode_frame(data: str, ring: FrameRing) -> np.ndarray:
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(base64.b64decode(data))).convert("RGBA")
+    out = ring.slot((im.height, im.width, 4))
+    out[...] = np.asarray(im)
+    return out
+
+class Screencast:
+    """Flux de frames d'une page Playwright via une session CDP."""
+
+    def __init__(self, page, max_size: Tuple[int, int] = (4096, 4096)):
+        self.page = page
+        self.max_size = max_size
+        self.cdp: Any = None
+        self.ring = FrameRing()
+        self.pending: Optional[Tuple[str, Dict[str, Any]]] = None
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="screencast")
+        self.counts = {"received": 0, "decoded": 0, "dropped": 0, "errors": 0}
+        self.decode_s = 0.0
+
+    async def start(self):
+        self.cdp = await self.page.context.new_cdp_session(self.page)
+        self.cdp.on("Page.screencastFrame", self._on_frame)
+        self.task = asyncio.ensure_future(self._decode_loop())
+        w, h = self.max_size
+        await self.cdp.send("Page.startScreencast", {"format": "png", "maxWidth": w, "maxHeight": h, "everyNthFrame": 1})
+
+    def _on_frame(self, ev: Dict[str, Any]):
+        self.counts["received"] += 1
+        asyncio.ensure_future(self._ack(ev["sessionId"]))
+        if self.pending is not None:
+            self.counts["dropped"] += 1  # remplacée avant d'être décodée
+        self.pending = (ev["data"], ev.get("metadata", {}))
+        self.wake.set()
+
+    async def _ack(self, session_id: int):
+        try:
+            await self.cdp.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception:
+            pass  # page fermée : le flux s'arrête de lui-même
+
+    async def _decode_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            if self.pending is None:
+                continue
+            (data, meta), self.pending = self.pending, None
+            t0 = time.perf_counter()
+            try:
+                frame = await loop.run_in_executor(self.executor, decode_frame, data, self.ring)
+            except Exception:
+                self.counts["errors"] += 1
+                continue
+            self.decode_s = time.perf_counter() - t0
+            self.counts["decoded"] += 1
+            self.ring.publish(frame, meta)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        try:
+            if self.cdp is not None:
+                await self.cdp.send("Page.stopScreencast")
+                await self.cdp.detach()
+        except Exception:
+            pass
+        self.cdp = None
+        self.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        latest = self.ring.latest
+        return {
+            **self.counts,
+            "frame": list(latest[1].shape[:2]) if latest else None,
+            "frame_age_s": round(time.monotonic() - latest[3], 3) if latest else None,
+            "decode_ms": round(self.decode_s * 1000, 2),
+        }
+
+def project(frame: np.ndarray, meta: Dict[str, Any], info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+    """Rectangle canvas (x, y, w, h) ré-échantillonné au plus proche depuis la frame."""
+    fh, fw = frame.shape[:2]
+    # px CSS -> px de frame (la frame peut être réduite par maxWidth/maxHeight)
+    f = fw / float(meta.get("deviceWidth") or fw)
+    top = float(meta.get("offsetTop") or 0.0)
+    sx, sy = info["bw"] / info["cw"], info["bh"] / info["ch"]
+    cols = ((info["bx"] + (np.arange(w) + x + 0.5) * sx) * f).astype(np.int64)
+    rows = ((info["by"] + top + (np.arange(h) + y + 0.5) * sy) * f).astype(np.int64)
+    out = np.zeros((h, w, 4), dtype=np.uint8)  # hors frame : transparent
+    cin, rin = (cols >= 0) & (cols < fw), (rows >= 0) & (rows < fh)
+    if cin.any() and rin.any():
+        out[np.ix_(rin, cin)] = frame[np.ix_(rows[rin], cols[cin])]
+    return out
+
+class ScreencastSource(CanvasSource):
+    """Dernière frame du screencast d'une page ; `fallback` tant qu'aucune frame n'est là."""
+
+    def __init__(self, page_of: Callable[[], Any], fallback: CanvasSource):
+        self.page_of = page_of  # page à diffuser (peut changer : page recyclée)
+        self.fallback = fallback  # géométrie du canvas, lectures sans frame
+        self.cast: Optional[Screencast] = None
+        self.cached: Optional[Dict[str, Any]] = None
+        self.info_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def _ensure(self) -> Optional[Screencast]:
+        page = self.page_of()
+        if self.cast is not None and self.cast.page is page:
+            return self.cast
+        async with self.lock:
+            if self.cast is not None and self.cast.page is page:
+                return self.cast
+            if self.cast is not None:
+                await self.cast.stop()
+                self.cast = None
+            if page is None:
+                return None
+            cast = Screencast(page)
+            await cast.start()
+            self.cast, self.cached = cast, None
+            return cast
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        cast = await self._ensure()
+        now = time.monotonic()
+        if self.cached is None or now - self.info_at > INFO_EVERY_S or cast is None or cast.ring.latest is None:
+            self.cached = await self.fallback.info()
+            self.info_at = now
+        return self.cached
+
+    async def regions(self, info: Dict[str, Any], boxes) -> List[np.ndarray]:
+        latest = self.cast.ring.latest if self.cast is not None else None
+        if latest is None:
+            return await self.fallback.regions(info, boxes)
+        _, frame, meta, _ = latest
+        return [project(frame, meta, info, x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in boxes]
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        return (await self.regions(info, [(x, y, x + w, y + h)]))[0]
+
+    async def full(self, info: Dict[str, Any]) -> np.ndarray:
+        return await self.region(info, 0, 0, info["cw"], info["ch"])
+
+    async def close(self):
+        if self.cast is not None:
+            await self.cast.stop()
+            self.cast = None
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cast.stats() if self.cast is not None else {}
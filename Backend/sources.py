@@ -0,0 +1,338 @@
+# backend/sources.py
+"""Sources de pixels du canvas.
+
+`CanvasSource` est l'interface lue par le pipeline de scan : `info()` décrit
+le canvas (None s'il est introuvable), `region()` et `full()` rendent du
+RGBA (H, W, 4). L'implémentation Playwright (wplace.live) vit dans app.py ;
+`ReplaySource` rejoue hors-ligne des frames enregistrées ou générées, avec
+des dégradations scriptées, pour mesurer le scanner sans navigateur.
+`ChunkSource` lit directement les tuiles PNG de la carte en HTTP.
+"""
+import asyncio
+import io
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+class CanvasSource:
+    # False : full() est hors de portée (carte entière) et n'est jamais appelé, la capture reste par régions
+    full_frame = True
+    # lectures max par passe : au-delà, plan_capture fusionne les boîtes quel qu'en soit le coût ;
+    # None : fusion seulement quand elle ne lit presque rien en trop
+    max_boxes: Optional[int] = 16
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        """{"cw", "ch"} au minimum ; None si aucun canvas n'est disponible."""
+        raise NotImplementedError
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        raise NotImplementedError
+
+    async def regions(self, info: Dict[str, Any], boxes: Sequence[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """Une lecture par boîte (x0, y0, x1, y1) ; les sources concurrentes lisent en parallèle."""
+        return [await self.region(info, x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in boxes]
+
+    async def full(self, info: Dict[str, Any]) -> np.ndarray:
+        return await self.region(info, 0, 0, info["cw"], info["ch"])
+
+    async def stream(self, on: bool) -> Optional["CanvasSource"]:
+        """Source continue (frames poussées) si `on`, démarrée au besoin ; None si
+        indisponible ou `on` faux (elle est alors arrêtée si elle tournait)."""
+        return None
+
+    async def map_pages(self, boxes: Sequence[Tuple[int, int, int, int]], fn: Callable[[Any, Tuple[int, int, int, int]], Any]) -> Optional[List[Any]]:
+        """`await fn(page, boîte)` dans la page qui lit chaque boîte ; None sans page (rejeu, tuiles HTTP)."""
+        return None
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+# ============================================================================
+# Rejeu hors-ligne
+# ============================================================================
+@dataclass
+class GriefEvent:
+    """Rectangle (x, y, w, h) repeint en `rgba` à `at` secondes du début du rejeu."""
+
+    at: float
+    x: int
+    y: int
+    w: int
+    h: int
+    rgba: Tuple[int, int, int, int] = (255, 0, 255, 255)
+
+def crop(canvas: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
+    """Copie d'un rectangle ; hors canvas, pixels transparents (comme getImageData)."""
+    H, W = canvas.shape[:2]
+    out = np.zeros((h, w, 4), dtype=np.uint8)
+    xs, ys, xe, ye = max(0, x), max(0, y), min(W, x + w), min(H, y + h)
+    if xe > xs and ye > ys:
+        out[ys - y : ye - y, xs - x : xe - x] = canvas[ys:ye, xs:xe]
+    return out
+
+def synthetic_canvas(w: int, h: int, seed: int = 0, colors: int = 16) -> np.ndarray:
+    """Canvas opaque en aplats 8x8 tirés d'une petite palette (proche d'un canvas pixel-art)."""
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 256, (colors, 4), dtype=np.uint8)
+    palette[:, 3] = 255
+    blocks = rng.integers(0, colors, ((h + 7) // 8, (w + 7) // 8))
+    return np.ascontiguousarray(palette[blocks].repeat(8, axis=0).repeat(8, axis=1)[:h, :w])
+
+class ReplaySource(CanvasSource):
+    """Rejoue des images clés datées puis applique les événements échus.
+
+    Le temps court à partir de `start()` (ou du premier accès) selon `clock`,
+    monotone par défaut ; une horloge virtuelle rend le rejeu déterministe.
+    `applied` garde, pour chaque événement appliqué, son instant selon
+    `clock` : c'est la référence des mesures de latence de détection.
+    """
+
+    def __init__(
+        self,
+        frames: Sequence[Tuple[float, np.ndarray]],
+        events: Sequence[GriefEvent] = (),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not frames:
+            raise ValueError("au moins une frame")
+        self.frames = sorted(frames, key=lambda f: f[0])
+        self.events = sorted(events, key=lambda e: e.at)
+        self.clock = clock
+        self.t0: Optional[float] = None
+        self.key = -1
+        self.next_event = 0
+        self.canvas = np.empty(0, dtype=np.uint8)
+        self.applied: List[Tuple[GriefEvent, float]] = []
+        self.reads = 0
+        self.bytes = 0
+
+    @classmethod
+    def load(cls, path: str, **kw) -> "ReplaySource":
+        """Fichier .npz : `frames` (N, H, W, 4) uint8 et `times` (N,) en secondes."""
+        with np.load(path, allow_pickle=False) as z:
+            frames = z["frames"]
+            times = z["times"] if "times" in z.files else np.arange(len(frames), dtype=float)
+        return cls([(float(t), f) for t, f in zip(times, frames)], **kw)
+
+    def start(self):
+        self.t0 = self.clock()
+        self.key = -1
+        self.next_event = 0
+        self.applied = []
+
+    def elapsed(self) -> float:
+        if self.t0 is None:
+            self.start()
+        return self.clock() - self.t0
+
+    def _advance(self) -> np.ndarray:
+        t = self.elapsed()
+        key = max(self.key, 0)
+        while key + 1 < len(self.frames) and self.frames[key + 1][0] <= t:
+            key += 1
+        if key != self.key:
+            # nouvelle image clé : les événements déjà appliqués sont rejoués dessus
+            self.key = key
+            self.canvas = np.array(self.frames[key][1], dtype=np.uint8)
+            for ev, _ in self.applied:
+                self._paint(ev)
+        while self.next_event < len(self.events) and self.events[self.next_event].at <= t:
+            ev = self.events[self.next_event]
+            self._paint(ev)
+            self.applied.append((ev, self.t0 + ev.at))
+            self.next_event += 1
+        return self.canvas
+
+    def _paint(self, ev: GriefEvent):
+        self.canvas[max(0, ev.y) : ev.y + ev.h, max(0, ev.x) : ev.x + ev.w] = ev.rgba
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        c = self._advance()
+        h, w = c.shape[:2]
+        return {"ok": True, "cw": w, "ch": h, "bx": 0, "by": 0, "bw": w, "bh": h}
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        self.reads += 1
+        self.bytes += w * h * 4
+        return crop(self.canvas, x, y, w, h)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"reads": self.reads, "bytes": self.bytes}
+
+# ============================================================================
+# Tuiles de la carte en HTTP
+# ============================================================================
+@dataclass
+class Chunk:
+    """Tuile décodée : index de palette (H, W) + table (256, 4), ou RGBA (H, W, 4) ; None si vide (404)."""
+
+    pix: Optional[np.ndarray]
+    lut: Optional[np.ndarray]
+    etag: str
+    modified: str
+    checked: float  # instant (monotone) de la dernière validation
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.pix is None else self.pix.nbytes + (0 if self.lut is None else self.lut.nbytes)
+
+    def rgba(self, y0: int, y1: int, x0: int, x1: int) -> np.ndarray:
+        part = self.pix[y0:y1, x0:x1]
+        return part if self.lut is None else self.lut[part]
+
+def decode_chunk(data: bytes) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """PNG -> (pixels, table). Les PNG à palette restent en index (4x moins de mémoire)."""
+    from PIL import Image
+
+    im = Image.open(io.BytesIO(data))
+    if im.mode != "P":
+        return np.asarray(im.convert("RGBA")), None
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    rgb = np.frombuffer(bytes(im.getpalette() or ()), dtype=np.uint8).reshape(-1, 3)[:256]
+    lut[: len(rgb), :3] = rgb
+    lut[:, 3] = 255
+    trans = im.info.get("transparency")
+    if isinstance(trans, int):
+        lut[trans, 3] = 0
+    elif isinstance(trans, bytes):
+        lut[: len(trans), 3] = np.frombuffer(trans, dtype=np.uint8)[:256]
+    return np.asarray(im), lut
+
+class ChunkSource(CanvasSource):
+    """Carte lue tuile par tuile (PNG `chunk` x `chunk`) sur un serveur HTTP, sans navigateur.
+
+    Coordonnées : pixels de la carte comptés depuis la tuile `origin`. Seules
+    les tuiles qui croisent les rectangles demandés sont téléchargées ; elles
+    restent en cache (LRU borné à `cache_bytes`) et sont revalidées au plus
+    toutes les `refresh` secondes par requête conditionnelle (If-None-Match /
+    If-Modified-Since : 304 sans corps ni décodage). Client HTTP unique,
+    connexions gardées ouvertes ; décodage PNG hors de la boucle asyncio.
+    Une tuile injoignable garde sa dernière version ; sans version, la lecture échoue.
+    """
+
+    full_frame = False
+    # une boîte fusionnée peut couvrir des milliers de tuiles de la carte : une lecture par rectangle
+    max_boxes = None
+
+    def __init__(
+        self,
+        url: str,
+        chunk: int = 1000,
+        grid: int = 2048,
+        origin: Tuple[int, int] = (0, 0),
+        refresh: float = 1.0,
+        cache_bytes: int = 256 << 20,
+        max_connections: int = 8,
+        timeout: float = 10.0,
+    ):
+        import httpx
+
+        self.url = url if "{x}" in url else url.rstrip("/") + "/{x}/{y}.png"
+        self.chunk = chunk
+        self.grid = grid
+        self.origin = origin
+        self.refresh = refresh
+        self.cache_bytes = cache_bytes
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.cache: "OrderedDict[Tuple[int, int], Chunk]" = OrderedDict()
+        self.total = 0
+        self.inflight: Dict[Tuple[int, int], "asyncio.Future[Chunk]"] = {}
+        self.counts = {"requests": 0, "not_modified": 0, "decoded": 0, "empty": 0, "errors": 0, "bytes": 0}
+
+    async def info(self) -> Optional[Dict[str, Any]]:
+        w = (self.grid - self.origin[0]) * self.chunk
+        h = (self.grid - self.origin[1]) * self.chunk
+        return {"ok": True, "cw": w, "ch": h, "bx": 0, "by": 0, "bw": w, "bh": h}
+
+    def _fetch(self, key: Tuple[int, int]) -> "asyncio.Future[Chunk]":
+        """Une seule requête en vol par tuile, partagée par les lectures concurrentes."""
+        fut = self.inflight.get(key)
+        if fut is None:
+            fut = self.inflight[key] = asyncio.ensure_future(self._load(key))
+            fut.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return fut
+
+    async def _load(self, key: Tuple[int, int]) -> Chunk:
+        import httpx
+
+        old = self.cache.get(key)
+        now = time.monotonic()
+        if old is not None and now - old.checked < self.refresh:
+            return old
+        headers = {}
+        if old is not None and old.etag:
+            headers["If-None-Match"] = old.etag
+        if old is not None and old.modified:
+            headers["If-Modified-Since"] = old.modified
+        self.counts["requests"] += 1
+        try:
+            r = await self.client.get(self.url.format(x=key[0], y=key[1]), headers=headers)
+            if r.status_code == 304 and old is not None:
+                self.counts["not_modified"] += 1
+                old.checked = now
+                return old
+            if r.status_code == 404:
+                self.counts["empty"] += 1
+                pix, lut = None, None
+            else:
+                r.raise_for_status()
+                self.counts["bytes"] += len(r.content)
+                pix, lut = await asyncio.to_thread(decode_chunk, r.content)
+                self.counts["decoded"] += 1
+        except (httpx.HTTPError, OSError, ValueError):
+            self.counts["errors"] += 1
+            if old is None:
+                raise
+            return old  # dernière version connue
+        c = Chunk(pix, lut, r.headers.get("etag", ""), r.headers.get("last-modified", ""), now)
+        self._store(key, c)
+        return c
+
+    def _store(self, key: Tuple[int, int], c: Chunk):
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.total -= old.nbytes
+        self.cache[key] = c
+        self.total += c.nbytes
+        while self.total > self.cache_bytes and len(self.cache) > 1:
+            _, ev = self.cache.popitem(last=False)
+            self.total -= ev.nbytes
+
+    async def region(self, info: Dict[str, Any], x: int, y: int, w: int, h: int) -> np.ndarray:
+        n = self.chunk
+        wx, wy = x + self.origin[0] * n, y + self.origin[1] * n
+        keys = [
+            (tx, ty)
+            for ty in range(max(0, wy // n), min(self.grid, -(-(wy + h) // n)))
+            for tx in range(max(0, wx // n), min(self.grid, -(-(wx + w) // n)))
+        ]
+        chunks = await asyncio.gather(*(self._fetch(k) for k in keys))
+        out = np.zeros((h, w, 4), dtype=np.uint8)  # hors carte / tuile vide : transparent
+        for (tx, ty), c in zip(keys, chunks):
+            if (tx, ty) in self.cache:
+                self.cache.move_to_end((tx, ty))
+            if c.pix is None:
+                continue
+            x0, y0 = max(wx, tx * n), max(wy, ty * n)
+            x1, y1 = min(wx + w, tx * n + c.pix.shape[1]), min(wy + h, ty * n + c.pix.shape[0])
+            if x1 > x0 and y1 > y0:
+                out[y0 - wy : y1 - wy, x0 - wx : x1 - wx] = c.rgba(y0 - ty * n, y1 - ty * n, x0 - tx * n, x1 - tx * n)
+        return out
+
+    async def regions(self, info: Dict[str, Any], boxes: Sequence[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        return list(await asyncio.gather(*(self.region(info, x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in boxes)))
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, "cached": len(self.cache), "cache_bytes": self.total}
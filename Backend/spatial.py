@@ -0,0 +1,79 @@
+# backend/spatial.py
+"""Index spatial par grille uniforme.
+
+Chaque clé est rangée dans toutes les cellules que recouvre sa boîte
+(x0, y0, x1, y1), bornes hautes exclues. Une requête ne visite que les
+cellules occupées qu'elle touche puis filtre par intersection exacte.
+"""
+from collections import defaultdict
+from typing import DefaultDict, Dict, Hashable, Iterator, List, Set, Tuple
+
+Box = Tuple[int, int, int, int]
+
+def intersects(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+class GridIndex:
+    def __init__(self, cell: int):
+        self.cell = cell
+        self.buckets: DefaultDict[Tuple[int, int], Set[Hashable]] = defaultdict(set)
+        self.boxes: Dict[Hashable, Box] = {}
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.boxes
+
+    def _cells(self, box: Box) -> Iterator[Tuple[int, int]]:
+        c = self.cell
+        for cy in range(box[1] // c, (box[3] - 1) // c + 1):
+            for cx in range(box[0] // c, (box[2] - 1) // c + 1):
+                yield cx, cy
+
+    def _occupied(self, box: Box) -> Iterator[Tuple[int, int]]:
+        """Cellules non vides recouvertes par la boîte ; une boîte plus grande que la
+        grille occupée parcourt les cellules occupées plutôt que celles couvertes."""
+        c = self.cell
+        cx0, cy0, cx1, cy1 = box[0] // c, box[1] // c, (box[2] - 1) // c + 1, (box[3] - 1) // c + 1
+        if (cx1 - cx0) * (cy1 - cy0) <= len(self.buckets):
+            return self._cells(box)
+        return ((cx, cy) for cx, cy in list(self.buckets) if cx0 <= cx < cx1 and cy0 <= cy < cy1)
+
+    def insert(self, key: Hashable, box: Box):
+        if key in self.boxes:
+            self.remove(key)
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return
+        self.boxes[key] = box
+        for cell in self._cells(box):
+            self.buckets[cell].add(key)
+
+    def remove(self, key: Hashable):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self._occupied(box):
+            b = self.buckets.get(cell)
+            if b is not None:
+                b.discard(key)
+                if not b:
+                    del self.buckets[cell]
+
+    def bucket(self, cx: int, cy: int) -> Set[Hashable]:
+        """Clés dont la boîte recouvre la cellule (cx, cy) (sans copie : ne pas modifier)."""
+        return self.buckets.get((cx, cy), set())
+
+    def query(self, box: Box) -> List[Hashable]:
+        seen: Set[Hashable] = set()
+        out: List[Hashable] = []
+        for cell in self._occupied(box):
+            for key in self.buckets.get(cell, ()):
+                if key not in seen:
+                    seen.add(key)
+                    if intersects(self.boxes[key], box):
+                        out.append(key)
+        return out
+
+    def at(self, x: int, y: int) -> List[Hashable]:
+        return self.query((x, y, x + 1, y + 1))
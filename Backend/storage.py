@@ -0,0 +1,171 @@
+# backend/storage.py
+"""Accès SQLite : pools de lecteurs + un thread écrivain unique.
+
+- Les connexions sont ouvertes une fois (WAL réglé à l'ouverture) et
+  réutilisées : le cache de requêtes préparées de sqlite3 joue à plein.
+- Toutes les écritures passent par un seul thread qui regroupe les travaux
+  en attente dans une même transaction (un SAVEPOINT par travail, un seul
+  COMMIT par lot). Le résultat n'est rendu qu'une fois le lot committé.
+- `aread` / `awrite` exécutent hors de la boucle asyncio.
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from metrics import DB_BATCH, DB_SECONDS
+
+Job = Callable[[sqlite3.Connection], Any]
+
+def connect(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL;")
+    con.execute("PRAGMA synchronous=NORMAL;")
+    return con
+
+class ReaderPool:
+    """Pool borné de connexions en lecture, chacune utilisée par un seul thread à la fois."""
+
+    def __init__(self, path: str, size: int, name: str):
+        self.path = path
+        self.size = size
+        self.name = name
+        self.idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"sqlite-{name}")
+
+    @contextmanager
+    def conn(self) -> Iterator[sqlite3.Connection]:
+        try:
+            con = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                grow = self.opened < self.size
+                if grow:
+                    self.opened += 1
+            con = connect(self.path) if grow else self.idle.get()
+        try:
+            yield con
+        finally:
+            self.idle.put(con)
+
+    def read(self, fn: Job) -> Any:
+        with self.conn() as con, DB_SECONDS.time(self.name, "read"):
+            return fn(con)
+
+    async def aread(self, fn: Job) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.read, fn)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+class Writer:
+    """Thread écrivain unique ; les travaux en attente sont committés par lots."""
+
+    def __init__(self, path: str, max_batch: int = 64):
+        self.path = path
+        self.max_batch = max_batch
+        self.q: "queue.Queue[Optional[Tuple[Job, Future]]]" = queue.Queue()
+        self.batches = 0
+        self.jobs = 0
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn: Job) -> Future:
+        fut: Future = Future()
+        self.q.put((fn, fut))
+        return fut
+
+    def _run(self):
+        con = connect(self.path)
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            batch: List[Tuple[Job, Future]] = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self.q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self.q.put(None)
+                    break
+                batch.append(nxt)
+            self._commit(con, batch)
+        con.close()
+
+    def _commit(self, con: sqlite3.Connection, batch: List[Tuple[Job, Future]]):
+        with DB_SECONDS.time("writer", "commit"):
+            done = self._run_batch(con, batch)
+        DB_BATCH.observe(len(batch))
+        self.batches += 1
+        self.jobs += len(batch)
+        for fut, res, err in done:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+    def _run_batch(self, con: sqlite3.Connection, batch: List[Tuple[Job, Future]]) -> List[Tuple[Future, Any, Optional[BaseException]]]:
+        done: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            for fn, fut in batch:
+                # un SAVEPOINT par travail : un échec n'annule que ce travail
+                con.execute("SAVEPOINT job")
+                try:
+                    res = fn(con)
+                    con.execute("RELEASE job")
+                    done.append((fut, res, None))
+                except Exception as e:
+                    con.execute("ROLLBACK TO job")
+                    con.execute("RELEASE job")
+                    done.append((fut, None, e))
+            con.execute("COMMIT")
+        except Exception as e:
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            done = [(fut, None, e) for _, fut in batch]
+        return done
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join(timeout=5)
+
+class Database:
+    """Point d'accès unique : `api` (handlers HTTP), `monitor` (boucle de scan), `writer`."""
+
+    def __init__(self, path: str, api_readers: int = 4, monitor_readers: int = 2):
+        self.path = path
+        self.api = ReaderPool(path, api_readers, "api")
+        self.monitor = ReaderPool(path, monitor_readers, "monitor")
+        self.writer = Writer(path)
+
+    def read(self, fn: Job) -> Any:
+        return self.api.read(fn)
+
+    async def aread(self, fn: Job) -> Any:
+        return await self.api.aread(fn)
+
+    def write(self, fn: Job) -> Any:
+        """Écriture bloquante (handlers synchrones, déjà hors boucle asyncio)."""
+        return self.writer.submit(fn).result()
+
+    async def awrite(self, fn: Job) -> Any:
+        return await asyncio.wrap_future(self.writer.submit(fn))
+
+    def close(self):
+        self.writer.close()
+        self.api.close()
+        self.monitor.close()
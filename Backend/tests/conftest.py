@@ -0,0 +1,8 @@
+# backend/tests/conftest.py
+import os
+import sys
+import tempfile
+
+# modules du backend importables tels quels ; base de test jetable (jamais la base de prod)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BLUE_SCAN_DB", os.path.join(tempfile.mkdtemp(prefix="bluescan-test-"), "test.sqlite"))
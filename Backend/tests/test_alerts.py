@@ -0,0 +1,148 @@
+"""AlertDispatcher : file bornée, fusion par œuvre, envoi/modification, backoff et 429."""
+import asyncio
+
+import httpx
+import pytest
+
+import alerts
+from alerts import Alert, AlertDispatcher, RateLimited
+
+class FakeSink:
+    """Sortie factice : `fail` donne, appel par appel, l'exception à lever (ou None)."""
+
+    def __init__(self, fail=None):
+        self.fail = list(fail or [])
+        self.calls = []
+        self.next_id = 0
+
+    def _maybe_fail(self):
+        if self.fail:
+            err = self.fail.pop(0)
+            if err is not None:
+                raise err
+
+    async def send(self, embed):
+        self.calls.append(("send", None, embed))
+        self._maybe_fail()
+        self.next_id += 1
+        return str(self.next_id)
+
+    async def edit(self, message_id, embed):
+        self.calls.append(("edit", message_id, embed))
+        self._maybe_fail()
+
+    async def close(self):
+        pass
+
+def _status(code):
+    r = httpx.Response(code, request=httpx.Request("PATCH", "https://discord.invalid/api/webhooks/1/t"))
+    return httpx.HTTPStatusError(str(code), request=r.request, response=r)
+
+def _alert(aid, key=(), update=False, kind="suspicion", text="d"):
+    return Alert(kind, update, kind.title(), text, "#F1C40F", aid, key)
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    slept = []
+
+    async def fake(delay, *a):
+        slept.append(delay)
+
+    monkeypatch.setattr(alerts.asyncio, "sleep", fake)
+    return slept
+
+def _dispatcher(sink, **kw):
+    d = AlertDispatcher(**kw)
+    d.sink = sink
+    return d
+
+def test_submit_coalesces_per_tile_and_bounds_queue():
+    d = _dispatcher(FakeSink(), max_pending=2)
+    assert d.submit(_alert(1, (0,), update=False, text="a"))
+    assert d.submit(_alert(1, (0,), update=True, text="b"))  # même tuile : remplace
+    assert d.submit(_alert(1, (1,)))
+    assert not d.submit(_alert(2, (0,)))  # file pleine
+    assert d.size == 2 and 2 not in d.pending
+    assert d.counts["coalesced"] == 1 and d.counts["dropped"] == 1
+    # une alerte "nouvelle" remplacée par une mise à jour reste nouvelle
+    assert d.pending[1][(0,)].update is False and d.pending[1][(0,)].description == "b"
+
+def test_flush_sends_one_embed_per_artwork_then_edits():
+    sink = FakeSink()
+    d = _dispatcher(sink)
+    d.submit(_alert(1, (0,), text="t0"))
+    d.submit(_alert(1, (1,), kind="degradation", text="t1"))
+    d.submit(_alert(2))
+    asyncio.run(d.flush())
+    assert [c[0] for c in sink.calls] == ["send", "send"]
+    assert sink.calls[0][2].kind == "degradation" and sink.calls[0][2].description == "t0\nt1"
+    assert d.size == 0 and not d.pending
+    d.submit(_alert(1, update=True, text="t2"))
+    asyncio.run(d.flush())
+    assert sink.calls[-1][:2] == ("edit", "1")
+    d.submit(_alert(1, update=True, text="t2"))  # embed identique : rien n'est envoyé
+    asyncio.run(d.flush())
+    assert len(sink.calls) == 3
+    assert d.counts["sent"] == 2 and d.counts["edited"] == 1 and d.counts["unchanged"] == 1
+
+def test_network_errors_back_off_then_give_up(no_sleep):
+    sink = FakeSink([httpx.ConnectError("down"), _status(502), None])
+    d = _dispatcher(sink)
+    d.submit(_alert(1))
+    asyncio.run(d.flush())
+    assert d.counts["sent"] == 1 and d.counts["retries"] == 2
+    assert no_sleep == [0.5, 1.0]
+    sink.fail = [httpx.ConnectError("down")] * alerts.RETRIES
+    d.submit(_alert(2))
+    asyncio.run(d.flush())
+    assert d.counts["failed"] == 1 and 2 not in d.messages
+
+def test_client_error_is_not_retried(no_sleep):
+    d = _dispatcher(FakeSink([_status(400)]))
+    d.submit(_alert(1))
+    asyncio.run(d.flush())
+    assert d.counts["failed"] == 1 and d.counts["retries"] == 0 and not no_sleep
+
+@pytest.mark.parametrize("retry_after", [0.0, 5.0])
+def test_endless_429_is_capped_and_later_artworks_still_go_out(retry_after):
+    sink = FakeSink([RateLimited(retry_after)] * 10_000)
+    d = _dispatcher(sink)
+    d.submit(_alert(1))
+    d.submit(_alert(2))
+
+    async def run():
+        await d._deliver(1, alerts.merge([_alert(1)]), False)
+        sink.fail = []
+        await d._deliver(2, alerts.merge([_alert(2)]), False)
+
+    asyncio.run(run())
+    budget = alerts.RATE_LIMIT_BUDGET / max(alerts.RATE_LIMIT_MIN, retry_after)
+    assert d.counts["failed"] == 1 and 1 not in d.messages
+    assert d.counts["rate_limited"] <= budget + 1
+    assert d.messages[2][0] == "1"
+
+def test_deleted_message_is_reposted():
+    sink = FakeSink()
+    d = _dispatcher(sink)
+    d.submit(_alert(7, text="a"))
+    asyncio.run(d.flush())
+    sink.fail = [_status(404)]
+    d.submit(_alert(7, update=True, text="b"))
+    asyncio.run(d.flush())
+    assert [c[0] for c in sink.calls] == ["send", "edit", "send"]
+    assert d.messages[7][0] == "2" and d.counts["reposted"] == 1 and d.counts["failed"] == 0
+    d.submit(_alert(7, update=True, text="c"))  # les mises à jour suivantes visent le nouveau message
+    asyncio.run(d.flush())
+    assert sink.calls[-1][:2] == ("edit", "2")
+
+def test_webhook_429_without_retry_after_waits_the_minimum(monkeypatch):
+    sink = alerts.WebhookSink("https://discord.invalid/api/webhooks/1/t")
+
+    async def request(method, url, json=None):
+        return httpx.Response(429, json={"retry_after": None}, request=httpx.Request(method, url))
+
+    monkeypatch.setattr(sink.client, "request", request)
+    with pytest.raises(RateLimited) as e:
+        asyncio.run(sink.send(alerts.merge([_alert(1)])))
+    assert e.value.retry_after == alerts.RATE_LIMIT_MIN
+    assert sink.blocked_until > 0
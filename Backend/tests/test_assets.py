@@ -0,0 +1,59 @@
+"""Cache d'assets : un défaut de cache se charge dans le pool de lecture, pas dans la boucle."""
+import asyncio
+import dataclasses
+import threading
+
+import numpy as np
+import pytest
+
+import app
+
+AID = 9_400
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Remplace le décodage depuis la base ; note le thread de chaque chargement."""
+    seen = []
+
+    def load(con, aid, version):
+        seen.append((aid, threading.current_thread()))
+        tpl = np.full((50, 100, 4), 255, np.uint8)
+        e = app.ArtAssets(version, tpl=tpl, grd=np.zeros_like(tpl))
+        e.alpha = np.ones((50, 100), bool)
+        e.deface = np.zeros((50, 100), bool)
+        return e
+
+    monkeypatch.setattr(app.AssetCache, "_load", staticmethod(load))
+    app.ASSETS.invalidate(AID)
+    yield seen
+    app.ASSETS.invalidate(AID)
+    app.FINGERPRINTS.drop(AID)
+
+def test_miss_loads_off_the_event_loop(loads):
+    async def run():
+        loop_thread = threading.current_thread()
+        e = await app.ASSETS.aget(AID)
+        assert await app.ASSETS.aget(AID) is e  # puis servi par le cache
+        return loop_thread, e
+    loop_thread, e = asyncio.run(run())
+    assert [aid for aid, _ in loads] == [AID] and loads[0][1] is not loop_thread
+    assert e.version == app.ASSETS.version(AID)
+
+def test_pass_holds_its_assets(loads):
+    art = {"id": AID, "name": "held", "x": 0, "y": 0, "w": 100, "h": 50, "mode": "build",
+           "suspicion_threshold": None, "degradation_threshold": None}
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    ctx = dataclasses.replace(app.ScanCtx.from_row(cfg), stride=1, diff_engine="rgba", scan_workers=0,
+                              tol=0, alert_scope="artwork")
+    cur = np.full((50, 100, 4), 255, np.uint8)
+    cur[:5, :10] = (1, 2, 3, 255)
+    frame = app.RegionFrame.whole(cur)
+    scanned = asyncio.run(app.diff_jobs(frame, [app._job(art, app.TileRect(0, 0, 100, 50))], ctx))
+    assert len(loads) == 1 and loads[0][1] is not threading.main_thread()
+    assert scanned[0].diffs == 50 and scanned[0].assets is not None
+    # œuvre modifiée pendant la passe : les étapes suivantes gardent les assets tenus, sans recharger
+    app.ASSETS.invalidate(AID)
+    app.damage_step(frame, scanned, ctx)
+    assert len(loads) == 1 and app.DAMAGE[AID].analyze().pixels == 50
+    app.DAMAGE.pop(AID, None)
+    app.ART_EVENT.pop(AID, None)
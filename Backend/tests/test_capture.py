@@ -0,0 +1,39 @@
+import asyncio
+
+import numpy as np
+
+import app
+from sources import ChunkSource
+
+def _scattered(n, seed=0, span=2_000_000, side=300):
+    rng = np.random.default_rng(seed)
+    return [(x, y, x + side, y + side) for x, y in rng.integers(0, span, (n, 2)).tolist()]
+
+def _area(boxes):
+    return sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+
+def test_chunk_sources_never_force_merges():
+    rects = _scattered(40)
+    boxes = app.plan_capture(rects, max_boxes=ChunkSource.max_boxes)
+    assert len(boxes) == 40
+    assert _area(boxes) == _area(rects)
+
+def test_forced_cap_still_applies_to_page_sources():
+    rects = _scattered(40)
+    assert len(app.plan_capture(rects)) <= 16
+
+def test_uncapped_merge_stays_within_slack():
+    rects = [(x, y, x + 100, y + 100) for y in range(0, 1000, 100) for x in range(0, 1000, 100)]
+    boxes = app.plan_capture(rects, max_boxes=None)
+    assert _area(boxes) <= 1.25 * _area(rects)
+    for r in rects:
+        assert any(b[0] <= r[0] and b[1] <= r[1] and r[2] <= b[2] and r[3] <= b[3] for b in boxes)
+
+def test_chunk_source_is_never_read_whole():
+    src = ChunkSource("http://127.0.0.1:9/{x}/{y}.png")
+    try:
+        assert "full" not in vars(ChunkSource)
+        assert asyncio.run(app.get_full_canvas(src)) is None  # aucune requête : full_frame=False
+        assert src.counts["requests"] == 0
+    finally:
+        asyncio.run(src.close())
@@ -0,0 +1,74 @@
+"""Passe grossière (stride > 1) : rappel des défauts et pas de battement d'alerte."""
+import asyncio
+import dataclasses
+
+import numpy as np
+import pytest
+
+import app
+
+AID = 9_000
+ART_W = ART_H = 200
+
+def _art(aid):
+    return {"id": aid, "name": f"coarse{aid}", "x": 10, "y": 20, "w": ART_W, "h": ART_H, "mode": "build",
+            "suspicion_threshold": None, "degradation_threshold": None}
+
+def _setup(aid, seed=0):
+    """Œuvre terminée (canvas = template) posée en (10, 20), assets injectés dans le cache."""
+    rng = np.random.default_rng(seed)
+    tpl = rng.integers(0, 256, (ART_H, ART_W, 4), dtype=np.uint8)
+    tpl[..., 3] = 255
+    grd = rng.integers(0, 256, (ART_H, ART_W, 4), dtype=np.uint8)
+    grd[..., 3] = 255
+    e = app.ArtAssets(app.ASSETS.version(aid), tpl=tpl, grd=grd)
+    e.alpha = tpl[..., 3] > 0
+    e.deface = np.zeros(tpl.shape[:2], dtype=bool)
+    app.ASSETS._store(aid, e)
+    canvas = np.zeros((ART_H + 40, ART_W + 20, 4), np.uint8)
+    canvas[20 : 20 + ART_H, 10 : 10 + ART_W] = tpl
+    return _art(aid), canvas, tpl, grd
+
+def _ctx(**kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    base = dict(stride=4, staged=True, susp_t=20, degr_t=200, tol=0, scan_workers=0,
+                diff_engine="rgba", alert_scope="artwork")
+    return dataclasses.replace(app.ScanCtx.from_row(cfg), **{**base, **kw})
+
+def _tick(art, canvas, ctx):
+    tiles = [app.TileRect(x, y, 100, 100) for y in range(0, ART_H, 100) for x in range(0, ART_W, 100)]
+    frame = app.RegionFrame.whole(canvas)
+    scanned = asyncio.run(app.diff_jobs(frame, [app._job(art, t) for t in tiles], ctx))
+    return app.damage_step(frame, scanned, ctx)
+
+@pytest.mark.parametrize("column", [150, 151, 152, 153])
+def test_thin_line_found_and_held(column):
+    aid = AID + column
+    art, canvas, tpl, grd = _setup(aid)
+    ctx = _ctx()
+    # trait d'un pixel de large, 30 px (>= suspicion) : vu par une phase sur stride
+    canvas[20 + 110 : 20 + 140, 10 + column, :3] = 255 - canvas[20 + 110 : 20 + 140, 10 + column, :3]
+    states, alerts = [], []
+    for n in range(3 * ctx.stride * ctx.stride):
+        # pixel bâti/sol qui alterne dans la même tuile : les empreintes ne resservent pas
+        canvas[20 + 190, 10 + 190] = tpl[190, 190] if n % 2 else grd[190, 190]
+        alerts += [al for _, al in _tick(art, canvas, ctx)]
+        states.append(app.ART_EVENT.get(aid, ("none",))[0])
+    first = states.index("suspicion")
+    assert first < ctx.stride * ctx.stride
+    assert set(states[first:]) == {"suspicion"}
+    assert [al.update for al in alerts] == [False]
+    assert app.DAMAGE[aid].report.pixels == 30
+
+def test_repair_clears_damage():
+    aid = AID + 500
+    art, canvas, tpl, grd = _setup(aid, seed=1)
+    ctx = _ctx()
+    canvas[20 + 30 : 20 + 34, 10 + 30 : 10 + 38, :3] = 7
+    for _ in range(2):
+        _tick(art, canvas, ctx)
+    assert app.ART_EVENT[aid][0] == "suspicion"
+    canvas[20 : 20 + ART_H, 10 : 10 + ART_W] = tpl
+    _tick(art, canvas, ctx)
+    assert app.ART_EVENT[aid][0] == "none"
+    assert not app.DAMAGE[aid].mask.any()
@@ -0,0 +1,135 @@
+"""Étiquetage 8-connexe (union-find vectorisé) et carte des dégâts, contre un parcours en largeur naïf."""
+from collections import deque
+
+import numpy as np
+import pytest
+
+from damage import MAX_COMPONENTS, DamageMap, components, label
+
+def bfs_label(mask):
+    """Référence : parcours en largeur, 8-connexité."""
+    h, w = mask.shape
+    lab = np.zeros((h, w), dtype=np.int32)
+    n = 0
+    for y0, x0 in zip(*np.nonzero(mask)):
+        if lab[y0, x0]:
+            continue
+        n += 1
+        lab[y0, x0] = n
+        todo = deque([(y0, x0)])
+        while todo:
+            y, x = todo.popleft()
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    yy, xx = y + dy, x + dx
+                    if 0 <= yy < h and 0 <= xx < w and mask[yy, xx] and not lab[yy, xx]:
+                        lab[yy, xx] = n
+                        todo.append((yy, xx))
+    return lab, n
+
+def assert_same_partition(mask):
+    got, n = label(mask)
+    want, m = bfs_label(mask)
+    assert n == m
+    assert ((got > 0) == mask).all()
+    # bijection entre étiquettes : chaque zone de référence porte une seule étiquette, et réciproquement
+    pairs = np.unique(np.stack([got[mask], want[mask]]), axis=1)
+    assert pairs.shape[1] == n
+    assert sorted(np.unique(got[mask]).tolist()) == list(range(1, n + 1))
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("density", [0.05, 0.3, 0.45, 0.6])
+def test_random_masks_match_bfs(seed, density):
+    rng = np.random.default_rng(seed)
+    h, w = rng.integers(1, 60, 2)
+    assert_same_partition(rng.random((h, w)) < density)
+
+@pytest.mark.parametrize("shape", [(1, 1), (1, 37), (41, 1), (0, 5)])
+def test_degenerate_shapes(shape):
+    rng = np.random.default_rng(1)
+    assert_same_partition(rng.random(shape) < 0.5)
+
+def test_diagonal_contacts_join():
+    # damier : uniquement des contacts en diagonale -> une seule zone en 8-connexité
+    yy, xx = np.mgrid[:9, :9]
+    assert label((yy + xx) % 2 == 0)[1] == 1
+    # anti-diagonale (bas-gauche) seule
+    assert label(np.fliplr(np.eye(7, dtype=bool)))[1] == 1
+    # deux pixels décalés de deux colonnes : pas de contact
+    m = np.zeros((3, 4), bool)
+    m[0, 0] = m[1, 2] = True
+    assert label(m)[1] == 2
+
+def test_long_snake_is_one_component():
+    # serpentin : chemin le plus long possible entre racines (pire cas des sauts de pointeurs)
+    m = np.zeros((41, 40), bool)
+    m[::2] = True
+    m[1::4, -1] = True
+    m[3::4, 0] = True
+    assert_same_partition(m)
+    assert label(m)[1] == 1
+
+def test_components_report_bboxes_on_border():
+    m = np.zeros((6, 8), bool)
+    m[0, 0:3] = True  # bord haut/gauche
+    m[5, 7] = m[4, 6] = True  # coin bas/droite, contact diagonal
+    m[2:4, 4] = True
+    colors = np.arange(m.size, dtype=np.uint32).reshape(m.shape) | np.uint32(0xFF000000)
+    rep = components(m, colors, ox=100, oy=50)
+    assert rep.pixels == 7 and rep.count == 3
+    boxes = sorted((c.x, c.y, c.w, c.h, c.pixels) for c in rep.components)
+    assert boxes == [(100, 50, 3, 1, 3), (104, 52, 1, 2, 2), (106, 54, 2, 2, 2)]
+
+def test_components_caps_detail_but_counts_all():
+    m = np.zeros((2, 2 * (MAX_COMPONENTS + 5)), bool)
+    m[0, ::2] = True
+    rep = components(m, np.zeros(m.shape, np.uint32))
+    assert rep.count == MAX_COMPONENTS + 5 and len(rep.components) == MAX_COMPONENTS
+
+def _rgba(h, w, v=7):
+    return np.full((h, w, 4), v, np.uint8)
+
+def test_damage_map_merges_across_tiles():
+    dm = DamageMap(200, 100)
+    left = np.zeros((100, 100), bool)
+    left[40:45, 90:100] = True
+    right = np.zeros((100, 100), bool)
+    right[40:45, 0:12] = True
+    dm.set_tile(0, 0, left, _rgba(100, 100))
+    dm.set_tile(100, 0, right, _rgba(100, 100))  # scannée à une autre passe : même zone
+    rep = dm.analyze()
+    assert rep.count == 1 and rep.pixels == 110
+    assert (rep.components[0].x, rep.components[0].w) == (90, 22)
+
+def test_damage_map_diagonal_contact_across_tile_corner():
+    dm = DamageMap(200, 200)
+    a = np.zeros((100, 100), bool)
+    a[99, 99] = True
+    b = np.zeros((100, 100), bool)
+    b[0, 0] = True
+    dm.set_tile(0, 0, a, _rgba(100, 100))
+    dm.set_tile(100, 100, b, _rgba(100, 100))
+    assert dm.analyze().count == 1
+    dm.clear_tile(100, 100, 100, 100)
+    rep = dm.analyze()
+    assert rep.count == 1 and rep.pixels == 1
+
+def test_damage_map_random_tiles_match_bfs():
+    rng = np.random.default_rng(7)
+    full = rng.random((150, 230)) < 0.35
+    dm = DamageMap(230, 150)
+    for y in range(0, 150, 50):
+        for x in range(0, 230, 100):
+            t = full[y : y + 50, x : x + 100]
+            dm.set_tile(x, y, t, _rgba(*t.shape))
+    rep = dm.analyze()
+    want, n = bfs_label(full)
+    assert rep.count == n and rep.pixels == int(full.sum())
+    sizes = sorted(np.bincount(want[full])[1:].tolist(), reverse=True)[:MAX_COMPONENTS]
+    assert [c.pixels for c in rep.components] == sizes
+
+def test_artwork_scope_is_opt_in():
+    import app
+
+    assert app.ConfigIn().alert_scope == "tile"
+    assert app.get_config().alert_scope == "tile"  # base neuve
@@ -0,0 +1,122 @@
+"""Détection de changements par cellule et report des cellules sales sur les tuiles."""
+import dataclasses
+
+import numpy as np
+import pytest
+
+import app
+from spatial import GridIndex
+
+C = app.DELTA_CELL
+AID = 9_500
+ART = {"id": AID, "name": "delta", "x": 64, "y": 32, "w": 200, "h": 100, "mode": "build",
+       "suspicion_threshold": None, "degradation_threshold": None}
+
+def _canvas(seed=0, h=160, w=320):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 4), dtype=np.uint8)
+
+def _cells(a):
+    return sorted(map(tuple, a.tolist()))
+
+def test_first_sight_is_clean_and_any_pixel_dirties_its_cell():
+    det = app.DeltaDetector()
+    canvas = _canvas()
+    assert len(det.update(app.RegionFrame.whole(canvas))) == 0
+    assert len(det.update(app.RegionFrame.whole(canvas.copy()))) == 0
+    canvas[40, 70, 2] ^= 1  # un bit d'un canal
+    canvas[159, 319, 3] ^= 0x80
+    assert _cells(det.update(app.RegionFrame.whole(canvas))) == [(2, 1), (9, 4)]
+    assert det.dirty_cells == 2
+
+def test_cells_follow_roi_frames():
+    det = app.DeltaDetector()
+    canvas = _canvas(1)
+    left = lambda: app.RegionFrame([(0, 0, canvas[:, :160])])
+    right = lambda: app.RegionFrame([(160, 0, canvas[:, 160:])])
+    det.update(left())
+    canvas[5, 200] ^= 1  # zone jamais vue : pas sale à sa première capture
+    assert len(det.update(right())) == 0
+    canvas[70, 20] ^= 1
+    canvas[70, 220] ^= 1  # hors de la frame suivante : attend sa prochaine capture
+    assert _cells(det.update(left())) == [(0, 2)]
+    assert _cells(det.update(right())) == [(6, 2)]
+    assert len(det.update(left())) == 0
+
+def test_partial_cells_are_skipped():
+    det = app.DeltaDetector()
+    canvas = _canvas(2)
+    # patch décalé : seules les cellules entièrement couvertes sont suivies
+    frame = lambda: app.RegionFrame([(5, 3, canvas[3:100, 5:100])])
+    det.update(frame())
+    canvas[10, 10] ^= 1  # cellule (0, 0) coupée par le patch
+    canvas[40, 40] ^= 1  # cellule (1, 1) entière
+    assert _cells(det.update(frame())) == [(1, 1)]
+    # décalage négatif (patch débordant du canvas en haut à gauche)
+    det.reset()
+    frame = lambda: app.RegionFrame([(-7, -9, canvas[:80, :90])])
+    det.update(frame())
+    canvas[15, 15] ^= 1
+    assert _cells(det.update(frame())) == [(0, 0)]
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(app, "DELTA", app.DeltaDetector())
+    monkeypatch.setattr(app, "TILE_INDEX", GridIndex(C))
+    monkeypatch.setattr(app, "TILE_INDEX_FP", {})
+    monkeypatch.setattr(app, "TILE_KEYS", {})
+    app.TILERS[AID] = app.TilerState(app.build_tiles(ART["w"], ART["h"], 100, 50))
+    table = {AID: ART}
+    app.sync_tile_index(table)
+    yield table
+    app.TILERS.pop(AID, None)
+
+def _ctx(**kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    return dataclasses.replace(app.ScanCtx.from_row(cfg), **{"tiles_global": 16, **kw})
+
+def _keys(jobs):
+    return [(j.art["id"], (j.tile.x, j.tile.y)) for j in jobs]
+
+def test_tile_index_maps_cells_to_tiles(index):
+    # tuiles (100 x 50) de l'œuvre en (64, 32) : x 64 / 164, y 32 / 82
+    assert app.TILE_INDEX.bucket(2, 1) == {(AID, (0, 0, 100, 50))}
+    # cellule (5, 2) = x 160..192, y 64..96 : à cheval sur les quatre tuiles
+    assert {k[1][:2] for k in app.TILE_INDEX.bucket(5, 2)} == {(0, 0), (100, 0), (0, 50), (100, 50)}
+    assert app.TILE_INDEX.bucket(0, 0) == set()
+    # œuvre déplacée : réindexée
+    moved = dict(ART, x=0, y=0)
+    app.sync_tile_index({AID: moved})
+    assert app.TILE_INDEX.bucket(0, 0) == {(AID, (0, 0, 100, 50))}
+    app.sync_tile_index({})
+    assert len(app.TILE_INDEX) == 0
+
+def test_delta_step_adds_covered_dirty_tiles(index):
+    canvas = _canvas(3)
+    sched = app.PriorityScheduler()
+    ctx = _ctx()
+    planned = [app._job(ART, app.TileRect(0, 0, 100, 50))]
+    assert app.delta_step(app.RegionFrame.whole(canvas), planned, index, ctx, sched) == planned
+    canvas[40, 70] ^= 1  # tuile (0, 0), déjà planifiée
+    canvas[102, 214] ^= 1  # cellule (6, 3) : tuile (100, 50) seule
+    jobs = app.delta_step(app.RegionFrame.whole(canvas), planned, index, ctx, sched)
+    assert _keys(jobs) == [(AID, (0, 0)), (AID, (100, 50))]
+    assert jobs[1].rect == (164, 82, 264, 132)
+    assert sched.hot[AID] == 0.5 and not sched.dirty
+
+def test_delta_step_defers_uncovered_or_over_budget_tiles(index):
+    canvas = _canvas(4)
+    sched = app.PriorityScheduler()
+    # frame ROI : la moitié gauche de l'œuvre seulement
+    roi = lambda: app.RegionFrame([(64, 32, canvas[32:132, 64:164])])
+    app.delta_step(roi(), [], index, _ctx(), sched)
+    app.delta_step(app.RegionFrame.whole(canvas), [], index, _ctx(), sched)
+    canvas[40, 70] ^= 1  # tuile (0, 0)
+    canvas[110, 70] ^= 1  # tuile (0, 50)
+    jobs = app.delta_step(roi(), [], index, _ctx(tiles_global=1), sched)
+    assert _keys(jobs) == [(AID, (0, 0))]
+    assert set(sched.dirty) == {(AID, (0, 50, 100, 50))}
+    # cellule changée hors de la ROI : détectée à sa capture suivante, tuile reportée
+    canvas[102, 214] ^= 1
+    assert app.delta_step(roi(), [], index, _ctx(), sched) == []
+    jobs = app.delta_step(app.RegionFrame([(164, 32, canvas[32:132, 164:264])]), [], index, _ctx(), sched)
+    assert _keys(jobs) == [(AID, (100, 50))]
@@ -0,0 +1,129 @@
+"""Flux SSE : reprise par Last-Event-ID, instantané pour un client en retard, files bornées."""
+import asyncio
+import threading
+
+import pytest
+
+import events
+from events import EventBus
+
+def _parse(msg: bytes):
+    """(id, type) d'un message SSE ; None pour un ping."""
+    fields = dict(line.split(": ", 1) for line in msg.decode().splitlines() if ": " in line and not line.startswith(":"))
+    return (int(fields["id"]), fields["event"]) if "id" in fields else None
+
+async def _snap():
+    return {"state": "full"}
+
+async def _next(stream):
+    return _parse(await asyncio.wait_for(stream.__anext__(), 1.0))
+
+def test_snapshot_then_live_events():
+    async def run():
+        bus = EventBus()
+        a = bus.stream(_snap)
+        assert await _next(a) == (0, "snapshot")
+        assert bus.active
+        for i in range(3):
+            bus.publish("tiles", {"i": i})
+        assert [await _next(a) for _ in range(3)] == [(1, "tiles"), (2, "tiles"), (3, "tiles")]
+        await a.aclose()
+        assert not bus.active and bus.stats()["published"] == 3
+    asyncio.run(run())
+
+def test_resume_from_ring_without_snapshot():
+    async def run():
+        bus = EventBus()
+        a = bus.stream(_snap)
+        await _next(a)  # client témoin : les événements sont sérialisés et gardés
+        for i in range(5):
+            bus.publish("alert", {"i": i})
+        b = bus.stream(_snap, last_id=2)
+        assert [await _next(b) for _ in range(3)] == [(3, "alert"), (4, "alert"), (5, "alert")]
+        bus.publish("coverage", {})
+        assert await _next(b) == (6, "coverage")
+        # déjà à jour : rien à rattraper, pas d'instantané
+        c = bus.stream(_snap, last_id=6)
+        bus.publish("art", {})
+        assert await _next(c) == (7, "art")
+        for s in (a, b, c):
+            await s.aclose()
+    asyncio.run(run())
+
+def test_resume_outside_ring_gets_snapshot(monkeypatch):
+    monkeypatch.setattr(events, "RING", 4)
+    async def run():
+        bus = EventBus()
+        a = bus.stream(_snap)
+        await _next(a)
+        for i in range(10):
+            bus.publish("tiles", {"i": i})
+        assert bus.since(5) is None and [s for s, _ in bus.since(6)] == [7, 8, 9, 10]
+        b = bus.stream(_snap, last_id=3)  # sorti de l'anneau
+        assert await _next(b) == (10, "snapshot")
+        bus.publish("tiles", {})
+        assert await _next(b) == (11, "tiles")
+        # identifiant inconnu (serveur redémarré) : instantané aussi
+        c = bus.stream(_snap, last_id=99)
+        assert await _next(c) == (11, "snapshot")
+        for s in (a, b, c):
+            await s.aclose()
+        # publication sans client : non sérialisée, l'anneau est vidé
+        bus.publish("tiles", {})
+        assert bus.seq == 12 and bus.since(11) is None
+        d = bus.stream(_snap, last_id=11)
+        assert await _next(d) == (12, "snapshot")
+        await d.aclose()
+    asyncio.run(run())
+
+def test_slow_client_is_cut_and_resumes(monkeypatch):
+    monkeypatch.setattr(events, "CLIENT_QUEUE", 4)
+    async def run():
+        bus = EventBus()
+        fast, slow = bus.stream(_snap), bus.stream(_snap)
+        await _next(fast)
+        await _next(slow)
+        bus.publish("tiles", {})
+        assert await _next(fast) == await _next(slow) == (1, "tiles")  # le lent passe au direct
+        got = []
+        for i in range(10):
+            bus.publish("tiles", {"i": i})
+            got.append(await _next(fast))  # le client rapide suit
+        assert [s for s, _ in got] == list(range(2, 12))
+        # le lent n'a rien lu : file bornée à 4, puis coupé
+        slow_client = next(c for c in bus.clients if c.lagging)
+        assert slow_client.queue.qsize() == 4 and bus.stats()["lagged"] == 1
+        bus.publish("tiles", {})
+        assert slow_client.queue.qsize() == 4  # plus rien n'est déposé
+        # son flux se termine ; il se reconnecte avec son dernier id et rattrape par l'anneau
+        with pytest.raises(StopAsyncIteration):
+            await slow.__anext__()
+        assert slow_client not in bus.clients
+        again = bus.stream(_snap, last_id=1)
+        assert [await _next(again) for _ in range(11)] == [(i, "tiles") for i in range(2, 13)]
+        await fast.aclose()
+        await again.aclose()
+    asyncio.run(run())
+
+def test_publish_from_thread():
+    async def run():
+        bus = EventBus()
+        a = bus.stream(_snap)
+        await _next(a)
+        t = threading.Thread(target=bus.publish, args=("art", {"op": "del", "id": 1}))
+        t.start()
+        t.join()
+        assert await _next(a) == (1, "art")
+        await a.aclose()
+    asyncio.run(run())
+
+def test_heartbeat_and_deadline(monkeypatch):
+    monkeypatch.setattr(events, "HEARTBEAT_S", 0.01)
+    async def run():
+        bus = EventBus()
+        a = bus.stream(_snap, max_s=0.05)
+        await _next(a)
+        assert await a.__anext__() == b": ping\n\n"
+        msgs = [m async for m in a]
+        assert set(msgs) <= {b": ping\n\n"} and not bus.active
+    asyncio.run(run())
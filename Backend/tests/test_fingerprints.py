@@ -0,0 +1,100 @@
+"""Empreintes de tuiles : une tuile inchangée reprend son diff, tout changement force le re-diff."""
+import asyncio
+import dataclasses
+
+import numpy as np
+import pytest
+
+import app
+
+AID = 9_600
+W, H = 200, 100  # 2 x 2 tuiles de 100 x 50
+
+def _assets(rng, version):
+    tpl = rng.integers(0, 256, (H, W, 4), dtype=np.uint8)
+    tpl[..., 3] = 255
+    e = app.ArtAssets(version, tpl=tpl, grd=np.zeros_like(tpl))
+    e.alpha = np.ones((H, W), bool)
+    e.deface = np.zeros((H, W), bool)
+    e.poly = np.ones((H, W), bool)
+    return app.ASSETS._store(AID, e)
+
+@pytest.fixture
+def scene():
+    rng = np.random.default_rng(5)
+    e = _assets(rng, app.ASSETS.version(AID))
+    cur = e.tpl.copy()
+    cur[10:20, 10:20] = (1, 2, 3, 255)  # 100 px faux dans la tuile (0, 0)
+    art = {"id": AID, "name": "fp", "x": 0, "y": 0, "w": W, "h": H, "mode": "build",
+           "suspicion_threshold": None, "degradation_threshold": None}
+    app.FINGERPRINTS.drop(AID)
+    yield art, cur, rng
+    app.FINGERPRINTS.drop(AID)
+
+def _pass(art, cur, **kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    base = dict(stride=1, diff_engine="rgba", scan_workers=0, tol=0)
+    ctx = dataclasses.replace(app.ScanCtx.from_row(cfg), **{**base, **kw})
+    tiles = [app.TileRect(x, y, 100, 50) for y in (0, 50) for x in (0, 100)]
+    frame = app.RegionFrame([(0, 0, cur)])
+    scanned = asyncio.run(app.diff_jobs(frame, [app._job(art, t) for t in tiles], ctx))
+    return {(j.tile.x, j.tile.y): (j.diffs, j.reused) for j in scanned}
+
+def test_unchanged_tiles_reuse_their_diff(scene):
+    art, cur, _ = scene
+    first = _pass(art, cur)
+    assert first[(0, 0)] == (100, False) and not any(r for _, r in first.values())
+    again = _pass(art, cur)
+    assert all(r for _, r in again.values())
+    assert {k: d for k, (d, _) in again.items()} == {k: d for k, (d, _) in first.items()}
+
+def test_changed_tile_is_rediffed(scene):
+    art, cur, _ = scene
+    _pass(art, cur)
+    cur = cur.copy()
+    cur[60:65, 150:160] = (9, 9, 9, 255)  # tuile (100, 50)
+    got = _pass(art, cur)
+    assert got[(100, 50)] == (50, False)
+    assert all(r for k, (_, r) in got.items() if k != (100, 50))
+    # la nouvelle empreinte est retenue
+    assert _pass(art, cur)[(100, 50)] == (50, True)
+
+def test_asset_version_or_parameters_force_rediff(scene):
+    art, cur, rng = scene
+    _pass(art, cur)
+    app.ASSETS.invalidate(AID)
+    e = _assets(rng, app.ASSETS.version(AID))  # nouveau template
+    got = _pass(art, cur)
+    assert not any(r for _, r in got.values())
+    assert got[(0, 0)][0] == int((e.tpl[:50, :100] != cur[:50, :100]).any(axis=2).sum())
+    assert all(r for _, r in _pass(art, cur).values())
+    # paramètres du diff dans la signature : tolérance, mode de construction
+    assert not any(r for _, r in _pass(art, cur, tol=30).values())
+    art["mode"] = "protect"
+    assert not any(r for _, r in _pass(art, cur, tol=30).values())
+
+def test_forced_rediff_after_max_reuse(scene, monkeypatch):
+    art, cur, _ = scene
+    monkeypatch.setattr(app, "FP_MAX_REUSE", 3)
+    flags = [_pass(art, cur)[(0, 0)][1] for _ in range(9)]
+    assert flags == [False, True, True, True, False, True, True, True, False]
+
+def test_lookup_counts_consecutive_reuses():
+    fps = app.TileFingerprints()
+    key = (1, (0, 0, 10, 10))
+    fps.store(key, 7, ("v",), 12)
+    assert [fps.lookup(key, 7, ("v",)) for _ in range(app.FP_MAX_REUSE)] == [12] * app.FP_MAX_REUSE
+    assert fps.lookup(key, 7, ("v",)) is None  # le diff suivant réécrit l'entrée
+    fps.store(key, 7, ("v",), 12)
+    assert fps.lookup(key, 8, ("v",)) is None and fps.lookup(key, 7, ("w",)) is None
+    assert fps.lookup(key, 7, ("v",)) == 12
+
+def test_plan_budget_follows_skip_rate():
+    fps = app.TileFingerprints()
+    assert fps.plan_budget(10) == 10
+    for _ in range(50):
+        fps.end_pass(10, 5)
+    assert fps.plan_budget(10) == pytest.approx(20, abs=1)
+    for _ in range(50):
+        fps.end_pass(10, 10)
+    assert fps.plan_budget(10) == int(10 * app.FP_MAX_OVERSCAN)
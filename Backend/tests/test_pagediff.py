@@ -0,0 +1,142 @@
+"""Parité du noyau JS de pagediff.py (exécuté sous node) avec le diff Python."""
+import asyncio
+import base64
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+import pagediff
+from diffengine import tile_defects, tile_ref_from_assets
+
+NODE = shutil.which("node")
+pytestmark = pytest.mark.skipif(NODE is None, reason="node introuvable")
+
+MODES = ("alpha_only", "polygon_only", "alpha_or_polygon")
+DEFACE_RGB = (0xDE, 0xFA, 0xCE)
+
+# page factice : window/document minimaux, canvas servi depuis un buffer
+PAGE_JS = r"""
+globalThis.window = globalThis;
+let W = 0, H = 0, PIX = null;
+const canvas = {get width() { return W; }, get height() { return H; },
+  getContext: () => ({getImageData(x, y, w, h) {
+    const out = new Uint8ClampedArray(w * h * 4);
+    for (let j = 0; j < h; j++) for (let i = 0; i < w; i++) {
+      const X = x + i, Y = y + j;
+      if (X < 0 || Y < 0 || X >= W || Y >= H) continue;
+      out.set(PIX.subarray((Y * W + X) * 4, (Y * W + X) * 4 + 4), (j * w + i) * 4);
+    }
+    return {data: out};
+  }})};
+globalThis.document = {querySelectorAll: () => [canvas]};
+require('readline').createInterface({input: process.stdin}).on('line', (l) => {
+  const m = JSON.parse(l);
+  let v = null;
+  if (m.canvas) { W = m.w; H = m.h; PIX = Buffer.from(m.canvas, 'base64'); }
+  else { v = (0, eval)(m.js); if (typeof v === 'function') v = v(m.arg); }
+  process.stdout.write(JSON.stringify(v === undefined ? null : v) + '\n');
+});
+"""
+
+def make_art(w=230, h=170, seed=0):
+    """Template à trous et DEFACE, sol, polygone en losange ; canvas posé à 60 %, bruité et griefé."""
+    rng = np.random.default_rng(seed)
+    grd = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    tpl = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    tpl[rng.random((h, w)) < 0.2, 3] = 0
+    tpl[rng.random((h, w)) < 0.05, :3] = DEFACE_RGB
+    yy, xx = np.mgrid[:h, :w]
+    poly = np.abs(xx - w / 2) / w + np.abs(yy - h / 2) / h < 0.45
+    cur = np.where((rng.random((h, w)) < 0.6)[..., None], tpl, grd)
+    noise = rng.integers(-10, 11, cur.shape) * (rng.random((h, w, 1)) < 0.1)
+    cur = np.clip(cur.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    cur[20:28, 30:38] = (1, 2, 3, 255)
+    alpha = tpl[..., 3] > 0
+    deface = (tpl[..., :3] == DEFACE_RGB).all(axis=2)
+    return cur, tpl, grd, alpha, deface, poly
+
+def python_result(cur, tpl, grd, alpha, deface, poly, rect, mode, build, ignore_outside, tol):
+    x, y, w, h = rect
+    bad = tile_defects(cur[y : y + h, x : x + w], tile_ref_from_assets(tpl, grd, alpha, deface, poly, rect, mode, build, ignore_outside), tol)
+    if not bad.any():
+        return [0]
+    rows, cols = np.flatnonzero(bad.any(axis=1)), np.flatnonzero(bad.any(axis=0))
+    return [int(bad.sum()), int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)]
+
+def test_kernel_parity(tmp_path):
+    cur, tpl, grd, alpha, deface, poly = make_art()
+    h, w = cur.shape[:2]
+    pad = 5  # œuvre décalée dans la boîte lue
+    boxed = np.zeros((h + 2 * pad, w + 2 * pad, 4), np.uint8)
+    boxed[pad : pad + h, pad : pad + w] = cur
+    width, *arrays = pagediff.pack_refs(tpl, grd, alpha, deface, poly)
+    for name, data in zip(("tpl", "grd", "bits"), arrays):
+        (tmp_path / name).write_bytes(data)
+    (tmp_path / "cur").write_bytes(boxed.tobytes())
+    tiles = [(x, y, min(100, w - x), min(100, h - y)) for y in range(0, h, 100) for x in range(0, w, 100)]
+    combos = [(m, b, i, tol) for m in MODES for b in (True, False) for i in (True, False) for tol in (0, 8, -1)]
+    spec = {"w": width, "pad": pad, "tiles": tiles,
+            "combos": [(pagediff.detourage_code(m, True), b, i, tol) for m, b, i, tol in combos]}
+    (tmp_path / "spec.json").write_text(json.dumps(spec))
+    (tmp_path / "run.js").write_text(pagediff.KERNEL_JS + r"""
+const fs = require('fs'), dir = process.argv[2];
+const spec = JSON.parse(fs.readFileSync(dir + '/spec.json'));
+const rd = (n) => new Uint8Array(fs.readFileSync(dir + '/' + n));
+const ref = {w: spec.w, tpl: rd('tpl'), grd: rd('grd'), bits: rd('bits')}, cur = rd('cur');
+const out = [];
+for (const [det, build, ign, tol] of spec.combos)
+  for (const [tx, ty, tw, th] of spec.tiles)
+    out.push(bsCountTile(cur, spec.w + 2 * spec.pad, tx + spec.pad, ty + spec.pad, ref, tx, ty, tw, th, det, build, ign, tol));
+process.stdout.write(JSON.stringify(out));
+""")
+    got = json.loads(subprocess.run([NODE, str(tmp_path / "run.js"), str(tmp_path)], check=True, capture_output=True).stdout)
+    want = [python_result(cur, tpl, grd, alpha, deface, poly, t, *c) for c in combos for t in tiles]
+    assert got == want
+
+class NodePage:
+    """Page Playwright factice : evaluate() exécuté sous node, canvas = `canvas`."""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.proc = subprocess.Popen([NODE, "-e", PAGE_JS], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.evals = []
+
+    def _send(self, msg):
+        self.proc.stdin.write(json.dumps(msg) + "\n")
+        self.proc.stdin.flush()
+        return json.loads(self.proc.stdout.readline())
+
+    async def evaluate(self, js, arg=None):
+        self.evals.append(js)
+        h, w = self.canvas.shape[:2]
+        self._send({"canvas": base64.b64encode(self.canvas.tobytes()).decode(), "w": w, "h": h})
+        return self._send({"js": js, "arg": arg})
+
+    def close(self):
+        self.proc.kill()
+        self.proc.wait()
+
+def test_count_in_page_round_trip():
+    cur, tpl, grd, alpha, deface, poly = make_art(seed=1)
+    h, w = cur.shape[:2]
+    ax, ay = 40, 30  # position de l'œuvre sur le canvas
+    canvas = np.zeros((h + 80, w + 90, 4), np.uint8)
+    canvas[ay : ay + h, ax : ax + w] = cur
+    page = NodePage(canvas)
+    try:
+        refs = lambda aid: pagediff.pack_refs(tpl, grd, alpha, deface, poly)
+        tiles = [(x, y, min(100, w - x), min(100, h - y)) for y in range(0, h, 100) for x in range(0, w, 100)]
+        box = (ax - 3, ay - 2, ax + w + 1, ay + h + 4)
+        for mode in MODES:
+            specs = [(7, 1, ax, ay, x, y, tw, th, False, pagediff.detourage_code(mode, True)) for x, y, tw, th in tiles]
+            got = asyncio.run(pagediff.count_in_page(page, box, specs, 8, False, refs))
+            assert got == [python_result(cur, tpl, grd, alpha, deface, poly, t, mode, False, False, 8) for t in tiles]
+        # noyau installé et références envoyées une seule fois
+        assert page.evals.count(pagediff.INSTALL_JS) == 1
+        assert page.evals.count(pagediff.PUT_JS) == 1
+    finally:
+        page.close()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from diffengine import DiffBatch, make_tile_ref
+from palette import MAX_COLORS, IndexedBatch, Palette, index_ref
+
+def _colors(n, seed):
+    c = np.random.default_rng(seed).integers(0, 256, (n, 4), dtype=np.uint8)
+    c[:, 3] = 255
+    return c
+
+@pytest.mark.parametrize("tol", [0, 8, -1])
+def test_full_palette_falls_back_to_rgba(tol):
+    pal = Palette()
+    pal.quantize(_colors(MAX_COLORS, 1))  # palette déjà pleine d'autres couleurs
+    assert len(pal) == MAX_COLORS
+
+    rng = np.random.default_rng(2)
+    tpl = _colors(100, 3)[rng.integers(0, 100, (50, 50))]
+    grd = _colors(100, 4)[rng.integers(0, 100, (50, 50))]
+    inside = np.ones((50, 50), bool)
+    deface = np.zeros((50, 50), bool)
+    clean, griefed = tpl.copy(), tpl.copy()
+    griefed[10:14, 10:14] = grd[10:14, 10:14] ^ 0x40
+
+    rgba, idx = DiffBatch(), IndexedBatch(pal)
+    for cur in (clean, griefed):
+        for build in (True, False):
+            ref = make_tile_ref(tpl, grd, inside, deface, build, True)
+            rgba.add(cur, ref)
+            idx.add(cur, index_ref(pal, ref), lambda ref=ref: ref)
+    want = rgba.run(tol).tolist()
+    assert idx.run(tol).tolist() == want
+    if tol >= 0:
+        assert want[:2] == [0, 0]
+    assert pal.fallbacks == 4
@@ -0,0 +1,67 @@
+"""Cadence adaptative : budget visé, recul de 30 % sur retard, période allongée."""
+import dataclasses
+
+import pytest
+
+import app
+
+def _ctx(**kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    base = dict(auto_rate=True, tiles_global=16, period=1.0, target_load=0.5, target_lag=0.05)
+    return dataclasses.replace(app.ScanCtx.from_row(cfg), **{**base, **kw})
+
+def _run(rate, tile_cost, passes, lag=0.0, **kw):
+    """Passes synthétiques : chaque tuile de budget coûte `tile_cost` s ; renvoie le dernier ctx."""
+    for _ in range(passes):
+        ctx = _ctx(**kw)  # relu de la config à chaque passe, comme la boucle
+        rate.apply(ctx)
+        rate.record(ctx, ctx.tiles_global * tile_cost)
+        rate.record_lag(lag)
+    return ctx
+
+def test_budget_converges_to_target_load():
+    rate = app.RateController()
+    ctx = _run(rate, 0.002, 60)  # 0.5 x 1 s / 2 ms = 250 tuiles
+    assert rate.budget == pytest.approx(250, rel=0.01)
+    assert ctx.period == 1.0 and rate.period == 1.0
+    st = rate.stats()
+    assert st["auto"] and st["tile_cost_ms"] == 2.0 and st["load"] == pytest.approx(0.5, rel=0.02)
+
+def test_budget_is_capped():
+    rate = app.RateController()
+    _run(rate, 1e-6, 60)
+    assert rate.budget == rate.cap == 16 * app.AUTO_MAX_FACTOR
+
+def test_lag_backs_off_by_30_percent():
+    rate = app.RateController()
+    _run(rate, 0.002, 60)
+    steady = rate.budget
+    for _ in range(2):
+        rate.record_lag(0.2)  # moyenne glissante : 40 puis 72 ms
+    assert rate.lag > 0.05  # au-delà de target_lag
+    ctx = _ctx()
+    rate.apply(ctx)
+    rate.record(ctx, ctx.tiles_global * 0.002)
+    target = 0.5 * 1.0 / 0.002
+    assert rate.budget == pytest.approx((0.7 * steady + 0.3 * target) * 0.7)
+    # retard persistant : point fixe b = 0.7 x (0.7 b + 0.3 cible), soit 0.21 / 0.51 de la cible
+    _run(rate, 0.002, 80, lag=0.2)
+    assert rate.budget == pytest.approx(0.21 / 0.51 * target, rel=0.01)
+    # retour sous la cible : remontée vers le budget visé
+    _run(rate, 0.002, 150, lag=0.0)
+    assert rate.budget == pytest.approx(target, rel=0.01)
+
+def test_period_stretches_when_one_tile_exceeds_target():
+    rate = app.RateController()
+    ctx = _run(rate, 1.5, 30)  # une tuile = 1.5 s > 0.5 x 1 s
+    assert rate.budget == pytest.approx(1.0, abs=0.01) and ctx.tiles_global == 1
+    assert ctx.period == pytest.approx(3.0) and rate.period == ctx.period
+    assert rate.stats()["scan_hz"] == pytest.approx(1 / 3, abs=1e-3)
+
+def test_disabled_leaves_config_alone():
+    rate = app.RateController()
+    _run(rate, 0.002, 10)
+    ctx = _run(rate, 0.5, 5, auto_rate=False, period=2.0)
+    assert rate.budget is None and not rate.enabled
+    assert ctx.tiles_global == 16 and ctx.period == 2.0 and rate.period == 2.0
+    assert rate.stats()["tiles_global_per_tick"] is None
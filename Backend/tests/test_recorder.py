@@ -0,0 +1,117 @@
+"""Historique compressé : deltas XOR/RLE, images clés par segment, rétention."""
+import numpy as np
+import pytest
+
+import recorder
+from recorder import DELTA, KEY, FrameRecorder, apply_delta, encode_delta
+
+def _img(rng, h, w):
+    return rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_delta_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    prev = _img(rng, 37, 53)
+    cur = prev.copy()
+    flip = rng.random(prev.shape[:2]) < (0.02, 0.3, 0.9, 1.0)[seed]
+    cur[flip] = _img(rng, int(flip.sum()), 1)[:, 0]
+    cur[0, 0] ^= 1  # premier et dernier pixel : plages aux bords
+    cur[-1, -1] ^= 1
+    state = prev.copy()
+    apply_delta(state, encode_delta(prev, cur))
+    assert np.array_equal(state, cur)
+
+def test_identical_frames_encode_nothing():
+    a = np.zeros((4, 4, 4), np.uint8)
+    assert encode_delta(a, a.copy()) is None
+
+@pytest.fixture
+def rec(tmp_path):
+    r = FrameRecorder(str(tmp_path), max_bytes=1 << 30, max_age=1e9)
+    yield r
+    r.close()
+
+def _write(r, aid, t, arr):
+    """Écrit comme le thread d'écriture, sans passer par la file."""
+    r._write(aid, t, arr)
+    r.dat_f.flush()
+    r.idx_f.flush()
+
+def _history(rng, n, h=20, w=30):
+    out = [_img(rng, h, w)]
+    for _ in range(n - 1):
+        nxt = out[-1].copy()
+        y, x = rng.integers(0, h), rng.integers(0, w)
+        nxt[y, x : x + 5] = rng.integers(0, 256, 4, dtype=np.uint8)
+        out.append(nxt)
+    return out
+
+def test_playback_matches_written_frames(rec):
+    rng = np.random.default_rng(1)
+    frames = _history(rng, 12)
+    for i, arr in enumerate(frames):
+        _write(rec, 7, 1000.0 + i, arr)
+    kinds = [k for _, k in rec.timeline(7, 0, 2000)]
+    assert kinds[0] == KEY and set(kinds[1:]) == {DELTA}
+    got = [(t, s.copy()) for t, s in rec.frames(7, 1003.5, 1008)]
+    assert [t for t, _ in got] == [1003.0, 1004.0, 1005.0, 1006.0, 1007.0, 1008.0]
+    for (t, s), want in zip(got, frames[3:9]):
+        assert np.array_equal(s, want)
+    assert np.array_equal(rec.at(7, 1010.2)[1], frames[10])
+
+def test_segment_roll_restarts_with_keyframe(rec):
+    rng = np.random.default_rng(2)
+    frames = _history(rng, 8)
+    t0 = 5000.0
+    times = [t0, t0 + 1, t0 + 2, t0 + recorder.SEGMENT_SECONDS + 1, t0 + recorder.SEGMENT_SECONDS + 2,
+             t0 + recorder.SEGMENT_SECONDS + 3, t0 + 2 * recorder.SEGMENT_SECONDS + 5, t0 + 2 * recorder.SEGMENT_SECONDS + 6]
+    for t, arr in zip(times, frames):
+        _write(rec, 3, t, arr)
+    assert len(rec.segments) == 3
+    for seg in rec.segments:
+        idx = seg.index()
+        assert idx["kind"][0] == KEY and set(idx["kind"][1:].tolist()) <= {DELTA}
+    # lecture à cheval sur les trois segments
+    got = [s.copy() for _, s in rec.frames(3, times[1], times[-1])]
+    assert len(got) == len(frames) - 1
+    for s, want in zip(got, frames[1:]):
+        assert np.array_equal(s, want)
+
+def test_retention_drops_whole_segments(rec):
+    rng = np.random.default_rng(3)
+    frames = _history(rng, 6)
+    step = recorder.SEGMENT_SECONDS + 1
+    for i, arr in enumerate(frames):
+        _write(rec, 9, 10_000.0 + i * step, arr)  # un segment par image
+    assert len(rec.segments) == 6
+    active = rec.active
+    rec.max_age = 2.5 * step
+    rec._retain(10_000.0 + 5 * step)
+    assert rec.active is active and rec.segments[-1] is active
+    # fin d'un segment = début du suivant : seuls les deux plus vieux ont plus de 2.5 x step
+    assert [s.start for s in rec.segments] == [10_000.0 + i * step for i in range(2, 6)]
+    # les segments restants se relisent seuls : leur première image est une clé
+    got = [s.copy() for _, s in rec.frames(9, 0, 1e9)]
+    assert all(np.array_equal(s, w) for s, w in zip(got, frames[2:])) and len(got) == 4
+    # plafond de taille : ne reste que l'actif
+    rec.max_bytes = 1
+    rec._retain(10_000.0 + 5 * step)
+    assert rec.segments == [active]
+
+def test_artworks_wider_than_16_bits(rec):
+    wide = np.zeros((2, 70_000, 4), np.uint8)
+    wide[1, 69_999] = (1, 2, 3, 255)
+    _write(rec, 1, 1.0, wide)
+    nxt = wide.copy()
+    nxt[0, 65_600] = (9, 9, 9, 255)
+    _write(rec, 1, 2.0, nxt)
+    assert np.array_equal(rec.at(1, 2.5)[1], nxt)
+
+def test_old_format_segments_are_ignored(tmp_path):
+    (tmp_path / "seg-1000.dat").write_bytes(b"BSF1" + b"\0" * 64)
+    (tmp_path / "seg-1000.idx").write_bytes(b"\0" * 60)
+    r = FrameRecorder(str(tmp_path), max_bytes=1 << 30, max_age=1e9)
+    try:
+        assert len(r.segments[0].index()) == 0 and r.at(0, 5.0) is None
+    finally:
+        r.close()
@@ -0,0 +1,81 @@
+"""Planificateur à priorités : échéance de revisite tenue, rapport /monitor/staleness."""
+import dataclasses
+
+import pytest
+
+import app
+
+BIG = 9_800  # œuvre de 20 x 20 tuiles ; BIG + 1..20 : œuvres d'une tuile
+
+def _row(aid, w, h, mode="build"):
+    return {"id": aid, "name": f"s{aid}", "x": 0, "y": 0, "w": w, "h": h, "mode": mode,
+            "suspicion_threshold": None, "degradation_threshold": None}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [10_000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def scene():
+    table = {BIG: _row(BIG, 2000, 2000)}
+    table.update({BIG + i: _row(BIG + i, 100, 100, "protect" if i % 2 else "build") for i in range(1, 21)})
+    for aid, a in table.items():
+        app.TILERS[aid] = app.TilerState(app.build_tiles(a["w"], a["h"], 100, 100))
+    yield table
+    for aid in table:
+        app.TILERS.pop(aid, None)
+
+def _ctx(**kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    base = dict(tiles_global=16, tiles_plan=0, period=1.0, max_revisit=30.0, susp_t=5)
+    return dataclasses.replace(app.ScanCtx.from_row(cfg), **{**base, **kw})
+
+def _simulate(sched, table, ctx, clock, seconds, diffs):
+    """Une passe par seconde ; renvoie l'âge max vu par tuile juste avant chaque passe."""
+    worst = 0.0
+    for _ in range(seconds):
+        jobs = sched.plan(table, ctx)
+        assert len(jobs) <= ctx.tiles_global
+        for j in jobs:
+            j.diffs = diffs(j.art["id"])
+        sched.observe(jobs)
+        clock[0] += ctx.period
+        st = sched.staleness()
+        if st["artworks"] and not any(v["never_scanned"] for v in st["artworks"].values()):
+            worst = max(worst, st["worst_max_age_s"])
+    return worst
+
+def test_every_tile_meets_the_revisit_deadline(scene, clock):
+    # 400 + 20 tuiles, 16 tuiles/s, échéance 30 s (scénario du planificateur)
+    ctx = _ctx()
+    sched = app.PriorityScheduler()
+    worst = _simulate(sched, scene, ctx, clock, 200, lambda aid: 0)
+    st = sched.staleness()
+    assert st["tiles"] == 420 and st["feasible"] and st["capacity_per_deadline"] == 480
+    assert worst < ctx.max_revisit
+    for aid, v in st["artworks"].items():
+        assert v["never_scanned"] == 0 and v["overdue"] == 0
+        assert v["worst_gap_s"] < ctx.max_revisit, aid
+
+def test_deadline_holds_when_small_artworks_are_at_risk(scene, clock):
+    # les petites œuvres, en défaut permanent, sont à risque maximal (460 visites dues
+    # par échéance pour 480) : la grande n'est pas affamée, une tuile due part à sa passe
+    ctx = _ctx()
+    sched = app.PriorityScheduler()
+    worst = _simulate(sched, scene, ctx, clock, 200, lambda aid: 50 if aid != BIG else 0)
+    st = sched.staleness()
+    assert worst <= ctx.max_revisit
+    assert all(v["worst_gap_s"] <= ctx.max_revisit for v in st["artworks"].values())
+    scans = {aid: int(sched.stats[aid].scans.sum()) / len(sched.stats[aid].tiles) for aid in scene}
+    assert min(scans[BIG + i] for i in range(1, 21)) > 2 * scans[BIG]
+
+def test_staleness_flags_an_infeasible_budget(scene, clock):
+    ctx = _ctx(tiles_global=4)  # 4 x 30 = 120 tuiles par échéance pour 420
+    sched = app.PriorityScheduler()
+    _simulate(sched, scene, ctx, clock, 120, lambda aid: 0)
+    st = sched.staleness()
+    assert not st["feasible"] and st["capacity_per_deadline"] == 120
+    assert st["worst_max_age_s"] >= ctx.max_revisit
+    assert sum(v["overdue"] for v in st["artworks"].values()) > 0
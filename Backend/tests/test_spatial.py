@@ -0,0 +1,23 @@
+import time
+
+from spatial import GridIndex
+
+def test_query_matches_brute_force():
+    grid = GridIndex(256)
+    boxes = {i: (i * 97 % 5000, i * 53 % 3000, i * 97 % 5000 + 40 + i % 300, i * 53 % 3000 + 30 + i % 200) for i in range(200)}
+    for k, b in boxes.items():
+        grid.insert(k, b)
+    for q in [(0, 0, 1, 1), (100, 100, 900, 700), (-10**6, -10**6, 10**6, 10**6), (4000, 2000, 4100, 2100)]:
+        want = {k for k, b in boxes.items() if b[0] < q[2] and q[0] < b[2] and b[1] < q[3] and q[1] < b[3]}
+        assert set(grid.query(q)) == want
+
+def test_huge_query_visits_occupied_cells_only():
+    grid = GridIndex(256)
+    grid.insert("a", (10, 10, 20, 20))
+    grid.insert("b", (10**6, 10**6, 10**6 + 5, 10**6 + 5))
+    t0 = time.perf_counter()
+    assert sorted(grid.query((-10**9, -10**9, 10**9, 10**9))) == ["a", "b"]
+    assert time.perf_counter() - t0 < 0.1
+    grid.remove("b")
+    assert grid.query((-10**9, -10**9, 10**9, 10**9)) == ["a"]
+    assert len(grid.buckets) == 1
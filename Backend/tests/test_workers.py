@@ -0,0 +1,58 @@
+"""Pool de processus (scan_workers > 0) : mêmes diffs que le moteur dans la boucle."""
+import asyncio
+import dataclasses
+
+import numpy as np
+import pytest
+
+import app
+
+AID = 9_700
+W, H = 230, 170
+
+@pytest.fixture(scope="module")
+def scene():
+    rng = np.random.default_rng(3)
+    tpl = rng.integers(0, 256, (H, W, 4), dtype=np.uint8)
+    tpl[rng.random((H, W)) < 0.2, 3] = 0
+    tpl[rng.random((H, W)) < 0.05, :3] = app.DEFACE_RGB
+    grd = rng.integers(0, 256, (H, W, 4), dtype=np.uint8)
+    yy, xx = np.mgrid[:H, :W]
+    e = app.ArtAssets(app.ASSETS.version(AID), tpl=tpl, grd=grd)
+    e.alpha = tpl[..., 3] > 0
+    e.deface = (tpl[..., :3] == app.DEFACE_RGB).all(axis=2)
+    e.poly = np.abs(xx - W / 2) / W + np.abs(yy - H / 2) / H < 0.45
+    app.ASSETS._store(AID, e)
+    cur = np.where((rng.random((H, W)) < 0.6)[..., None], tpl, grd)
+    noise = rng.integers(-12, 13, cur.shape) * (rng.random((H, W, 1)) < 0.1)
+    cur = np.clip(cur.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    cur[40:52, 60:75] = (1, 2, 3, 255)
+    # œuvre en (30, 10), lue en deux boîtes (haut / bas) avec du jeu autour
+    canvas = np.zeros((H + 40, W + 60, 4), np.uint8)
+    canvas[10 : 10 + H, 30 : 30 + W] = cur
+    frame = app.RegionFrame([(20, 0, canvas[0:110, 20:]), (0, 110, canvas[110:])])
+    art = {"id": AID, "name": "pool", "x": 30, "y": 10, "w": W, "h": H, "mode": "build",
+           "suspicion_threshold": None, "degradation_threshold": None}
+    yield art, frame
+    app.get_diff_pool(0)
+
+def _diffs(art, frame, **kw):
+    cfg = app.DB.read(lambda con: con.execute("SELECT * FROM config WHERE id=1").fetchone())
+    ctx = dataclasses.replace(app.ScanCtx.from_row(cfg), stride=1, diff_engine="rgba", **kw)
+    tiles = [app.TileRect(x, y, min(100, W - x), min(50, H - y)) for y in range(0, H, 50) for x in range(0, W, 100)]
+    app.FINGERPRINTS.drop(art["id"])  # pas de reprise du passage précédent
+    scanned = asyncio.run(app.diff_jobs(frame, [app._job(art, t) for t in tiles], ctx))
+    assert len(scanned) == len(tiles) and not any(j.reused for j in scanned)
+    return [j.diffs for j in scanned]
+
+@pytest.mark.parametrize("mode", ["alpha_only", "polygon_only", "alpha_or_polygon"])
+@pytest.mark.parametrize("tol", [0, 8])
+def test_pool_counts_match_inline(scene, mode, tol):
+    art, frame = scene
+    for build in ("build", "protect"):
+        art["mode"] = build
+        for ignore in (True, False):
+            kw = dict(tol=tol, detourage_mode=mode, ignore_outside=ignore)
+            inline = _diffs(art, frame, scan_workers=0, **kw)
+            assert any(inline)
+            assert _diffs(art, frame, scan_workers=2, **kw) == inline
@@ -0,0 +1,178 @@
+# backend/workers.py
+"""Diff multi-cœurs : pool de processus + mémoire partagée.
+
+- La frame de la passe (patches ROI) est recopiée dans un segment
+  `multiprocessing.shared_memory` réutilisé d'une passe à l'autre.
+- Les assets d'une œuvre (template, sol, alpha, DEFACE, polygone) sont
+  publiés une fois par version dans leur propre segment ; les workers s'y
+  attachent à la première tuile et gardent leurs TileRef en cache.
+- Chaque passe découpe les tuiles en lots, un par worker, et ne renvoie que
+  les compteurs.
+
+Ce module n'importe que NumPy et le moteur de diff : c'est lui que les
+workers (démarrés en "spawn") rechargent.
+"""
+import asyncio
+import atexit
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from diffengine import DiffBatch, tile_ref_from_assets
+
+# Layout d'un segment : {clé: (offset, shape, dtype)}
+Layout = Dict[str, Tuple[int, Tuple[int, ...], str]]
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Côté worker on ne fait que lire : le segment appartient au processus principal.
+    # Avant 3.13 (pas de track=False), les workers "spawn" partagent le
+    # resource_tracker du parent : l'enregistrement en double est sans effet.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+def _views(buf, layout: Layout) -> Dict[str, np.ndarray]:
+    return {
+        k: np.ndarray(shape, dtype=np.dtype(dt), buffer=buf, offset=off)
+        for k, (off, shape, dt) in layout.items()
+    }
+
+def _pack(arrays: Dict[str, np.ndarray]) -> Tuple[int, Layout]:
+    layout: Layout = {}
+    off = 0
+    for k, a in arrays.items():
+        layout[k] = (off, a.shape, a.dtype.str)
+        off += (a.nbytes + 63) & ~63  # alignement 64 octets
+    return max(off, 1), layout
+
+# ============================================================================
+# Côté worker
+# ============================================================================
+_FRAME: Dict[str, shared_memory.SharedMemory] = {}
+# aid -> (nom du segment, shm, vues, cache TileRef)
+_ARTS: Dict[int, Tuple[str, shared_memory.SharedMemory, Dict[str, np.ndarray], dict]] = {}
+
+def _frame_buf(name: str):
+    shm = _FRAME.get(name)
+    if shm is None:
+        for old in _FRAME.values():
+            old.close()
+        _FRAME.clear()
+        shm = _FRAME[name] = _attach(name)
+    return shm.buf
+
+def _art(aid: int, name: str, layout: Layout):
+    ent = _ARTS.get(aid)
+    if ent is None or ent[0] != name:
+        if ent is not None:
+            ent[3].clear()
+            ent[2].clear()
+            try:
+                ent[1].close()
+            except BufferError:  # une vue traîne encore : le GC fermera le mapping
+                pass
+        shm = _attach(name)
+        ent = _ARTS[aid] = (name, shm, _views(shm.buf, layout), {})
+    return ent
+
+def diff_chunk(frame_name: str, frame_layout: Layout, items: Sequence[tuple], tol: int) -> List[int]:
+    """Compte les pixels en défaut d'un lot de tuiles.
+
+    items : (aid, segment, layout, patch, (px, py), (x, y, w, h), detourage_mode, build, ignore_outside)
+    avec (px, py) la position de la tuile dans le patch et (x, y, w, h) le rectangle dans l'œuvre.
+    """
+    patches = _views(_frame_buf(frame_name), frame_layout)
+    batch = DiffBatch()
+    for aid, seg, layout, patch, (px, py), rect, mode, build, ignore_outside in items:
+        _, _, arrs, refs = _art(aid, seg, layout)
+        key = (rect, mode, build, ignore_outside)
+        ref = refs.get(key)
+        if ref is None:
+            ref = refs[key] = tile_ref_from_assets(
+                arrs["tpl"], arrs["grd"], arrs["alpha"], arrs["deface"], arrs.get("poly"),
+                rect, mode, build, ignore_outside,
+            )
+        w, h = rect[2], rect[3]
+        batch.add(patches[str(patch)][py : py + h, px : px + w], ref)
+    return batch.run(tol).tolist()
+
+# ============================================================================
+# Côté processus principal
+# ============================================================================
+class DiffPool:
+    """Pool de workers de diff ; frame et assets partagés par mémoire partagée."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+        self.frame_shm: Optional[shared_memory.SharedMemory] = None
+        self.arts: Dict[int, Tuple[int, shared_memory.SharedMemory, Layout]] = {}  # aid -> (version, shm, layout)
+        atexit.register(self.close)  # segments libérés même si l'appelant n'arrive pas à close()
+
+    def publish_assets(self, aid: int, version: int, arrays: Dict[str, np.ndarray]) -> Tuple[str, Layout]:
+        """Publie (une fois par version) les assets d'une œuvre ; retourne (segment, layout)."""
+        cur = self.arts.get(aid)
+        if cur is not None and cur[0] == version:
+            return cur[1].name, cur[2]
+        size, layout = _pack(arrays)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        for k, v in _views(shm.buf, layout).items():
+            v[...] = arrays[k]
+        if cur is not None:
+            self._drop(cur[1])
+        self.arts[aid] = (version, shm, layout)
+        return shm.name, layout
+
+    def forget(self, keep: Sequence[int]):
+        """Libère les segments des œuvres disparues."""
+        for aid in [a for a in self.arts if a not in keep]:
+            self._drop(self.arts.pop(aid)[1])
+
+    def publish_frame(self, patches: List[np.ndarray]) -> Tuple[str, Layout]:
+        size, layout = _pack({str(i): p for i, p in enumerate(patches)})
+        if self.frame_shm is None or self.frame_shm.size < size:
+            if self.frame_shm is not None:
+                self._drop(self.frame_shm)
+            # marge pour éviter de réallouer à chaque variation de la ROI
+            self.frame_shm = shared_memory.SharedMemory(create=True, size=int(size * 1.5))
+        for k, v in _views(self.frame_shm.buf, layout).items():
+            v[...] = patches[int(k)]
+        return self.frame_shm.name, layout
+
+    async def count(self, frame_name: str, frame_layout: Layout, items: List[tuple], tol: int) -> List[int]:
+        """Répartit les tuiles en un lot par worker et agrège les compteurs (ordre conservé)."""
+        if not items:
+            return []
+        n = min(self.workers, len(items))
+        step = -(-len(items) // n)
+        loop = asyncio.get_running_loop()
+        futs = [
+            loop.run_in_executor(self.pool, diff_chunk, frame_name, frame_layout, items[i : i + step], tol)
+            for i in range(0, len(items), step)
+        ]
+        out: List[int] = []
+        for part in await asyncio.gather(*futs):
+            out.extend(part)
+        return out
+
+    def close(self):
+        atexit.unregister(self.close)
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        for _, shm, _ in self.arts.values():
+            self._drop(shm)
+        self.arts.clear()
+        if self.frame_shm is not None:
+            self._drop(self.frame_shm)
+            self.frame_shm = None
+
+    @staticmethod
+    def _drop(shm: shared_memory.SharedMemory):
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -1,7 +1,7 @@
 // ==UserScript==
-// @name         Blue Scan UI — Upload + Grab 4 nums + Contours fix TL (v1.3.1)
+// @name         Blue Scan UI — Upload + Grab 4 nums + Contours fix TL (v1.4.0)
 // @namespace    pinouland.blue-scan.ui
-// @version      1.3.1
+// @version      1.4.0
 // @description  Menu minimal, Upload (TL + taille native), 📍 pour lire (TlX,TlY,PxX,PxY). Contours collés au canvas ET projetés via (world - TL)*scale. Backend auto.
 // @match        https://wplace.live/*
 // @match        https://*.wplace.live/*
@@ -57,6 +57,86 @@
   }
   const api = (path, opts={}) => gmXHR((CURRENT_BACKEND || localStorage.getItem(LS_BACKEND) || "http://82.112.240.14:8000") + path, opts);
 
+  // -------------------- Flux /events (SSE) -----------------
+  // EventSource est bloqué (contenu mixte, origine) : GM_xmlhttpRequest + onprogress.
+  // Le backend ferme le flux après max_s ; on se reconnecte avec Last-Event-ID.
+  // Tant que le flux ne livre rien (gestionnaire qui bufferise), LIVE.ok reste
+  // faux et les contours repassent par /artworks/region.
+  const LIVE = { ok:false, version:0, running:false, arts:new Map(), tiles:new Map(), states:new Map(), coverage:{ rate:0, arts:{} } };
+  const liveListeners = new Set();
+  let lastEventId = null, eventsStarted = false;
+  const tileKey = (t)=> t.slice(0, 5).join(",");
+  function applyEvent(type, d) {
+    switch (type) {
+      case "snapshot":
+        LIVE.running = d.running;
+        LIVE.arts = new Map(d.arts.map(a => [a.id, a]));
+        LIVE.tiles = new Map(d.tiles.map(t => [tileKey(t), t]));
+        LIVE.states = new Map(Object.entries(d.states).map(([k, v]) => [+k, v]));
+        LIVE.coverage = d.coverage;
+        break;
+      case "art":
+        if (d.op === "del") {
+          LIVE.arts.delete(d.id); LIVE.states.delete(d.id);
+          for (const [k, t] of LIVE.tiles) if (t[0] === d.id) LIVE.tiles.delete(k);
+        } else LIVE.arts.set(d.art.id, d.art);
+        break;
+      case "tiles":
+        for (const t of d) { if (t[5]) LIVE.tiles.set(tileKey(t), t); else LIVE.tiles.delete(tileKey(t)); }
+        break;
+      case "alert":
+        if (d.state === "none") LIVE.states.delete(d.id); else LIVE.states.set(d.id, d.state);
+        break;
+      case "coverage":
+        LIVE.coverage.rate = d.rate;
+        Object.assign(LIVE.coverage.arts, d.arts);
+        (d.gone || []).forEach(k => delete LIVE.coverage.arts[k]);
+        break;
+      case "monitor": LIVE.running = d.running; break;
+      default: return;
+    }
+    LIVE.version++;
+    liveListeners.forEach(fn => { try { fn(type, d); } catch {} });
+  }
+  // Découpe les blocs complets ("\n\n") ; retourne [[type, data]...] et la longueur consommée.
+  function parseSSE(text) {
+    const out = []; let start = 0, end;
+    while ((end = text.indexOf("\n\n", start)) >= 0) {
+      let type = "message"; const data = [];
+      for (const line of text.slice(start, end).split("\n")) {
+        if (!line || line[0] === ":") continue;
+        const p = line.indexOf(":"), k = p < 0 ? line : line.slice(0, p);
+        const v = p < 0 ? "" : line.slice(p + 1).replace(/^ /, "");
+        if (k === "id") lastEventId = v; else if (k === "event") type = v; else if (k === "data") data.push(v);
+      }
+      if (data.length) out.push([type, data.join("\n")]);
+      start = end + 2;
+    }
+    return [out, start];
+  }
+  function connectEvents(delay = 0) {
+    eventsStarted = true;
+    setTimeout(() => {
+      const base = CURRENT_BACKEND || norm(localStorage.getItem(LS_BACKEND));
+      if (!base) { connectEvents(2000); return; }
+      let seen = 0, got = false;
+      const onChunk = (r) => {
+        const text = r.responseText || "";
+        if (text.length <= seen) return;
+        const [evs, used] = parseSSE(text.slice(seen));
+        seen += used;
+        if (evs.length && !got) { got = true; LIVE.ok = true; }
+        for (const [type, data] of evs) { try { applyEvent(type, JSON.parse(data)); } catch {} }
+      };
+      const retry = () => { LIVE.ok = false; LIVE.version++; connectEvents(got ? 500 : 5000); };
+      GM_xmlhttpRequest({
+        method: "GET", url: base + "/events?max_s=300",
+        headers: lastEventId ? { "Last-Event-ID": lastEventId } : {},
+        onprogress: onChunk, onload: (r) => { onChunk(r); retry(); }, onerror: retry, ontimeout: retry,
+      });
+    }, delay);
+  }
+
   // -------------------- Helpers ----------------------------
   const escapeHtml = (s)=> String(s).replace(/&/g,"&amp;").replace(/</g,"&lt;").replace(/>/g,"&gt;");
   function mainCanvas() {
@@ -122,6 +202,7 @@
       box-shadow: 0 10px 30px rgba(0,0,0,.35); overflow: hidden; }
     #bsui-root .h { display:flex; align-items:center; gap:8px; padding:12px 14px; background: rgba(255,255,255,.08); }
     #bsui-root .title { font-weight: 800; letter-spacing:.6px; }
+    #bsui-root .live { margin-left:auto; font-size:12px; opacity:.9; }
     #bsui-root .body { padding:16px; max-height: 60vh; overflow:auto; display:flex; align-items:center; justify-content:center; }
     #bsui-root .big { font-size: 26px; font-weight: 900; opacity: .95; text-shadow: 0 2px 8px rgba(0,0,0,.35); }
     #bsui-root .foot { display:flex; align-items:center; justify-content:space-between; background: rgba(255,255,255,.08); padding:10px 14px; }
@@ -185,11 +266,15 @@
     const c = document.createElement('canvas');
     wrap.appendChild(c);
 
+    // redimensionner un canvas l'efface : seulement si la taille change (epoch++ : à redessiner)
+    let epoch = 0;
     function resizeBitmap() {
+      const w = Math.max(1, Math.round(mapC.clientWidth  * dpr));
+      const h = Math.max(1, Math.round(mapC.clientHeight * dpr));
+      if (w === c.width && h === c.height) return;
       c.style.width  = mapC.clientWidth  + "px";
       c.style.height = mapC.clientHeight + "px";
-      c.width  = Math.max(1, Math.round(mapC.clientWidth  * dpr));
-      c.height = Math.max(1, Math.round(mapC.clientHeight * dpr));
+      c.width = w; c.height = h; epoch++;
     }
     resizeBitmap();
     const ctx = c.getContext('2d');
@@ -215,15 +300,25 @@
     }
 
     function clear(){ ctx.clearRect(0,0,c.width,c.height); }
-    function drawRects(rects) {
+    const STATE_COLORS = { degradation: "#E74C3C", suspicion: "#F1C40F" };
+    // live (optionnel) : { states: Map id -> état d'alerte, tiles: [[id, x, y, w, h, diffs]...] }
+    function drawRects(rects, live) {
       clear();
       const TL = currentTL();
       if (!TL) return;
+      const byId = new Map(rects.map(r => [r.id, r]));
+      if (live) {
+        ctx.fillStyle = "rgba(231,76,60,.25)";
+        for (const [id, x, y, w, h] of live.tiles) {
+          const a = byId.get(id); if (!a) continue;
+          const R = worldToLocalRect(a.x + x, a.y + y, w, h);
+          if (R) ctx.fillRect(R.x, R.y, R.w, R.h);
+        }
+      }
       ctx.lineWidth = 2; ctx.setLineDash([6,4]);
-      const scaleX = mapC.clientWidth  / mapC.width;
-      const scaleY = mapC.clientHeight / mapC.height;
       rects.forEach((r,i)=>{
-        const hue = (i*57)%360; ctx.strokeStyle = `hsl(${hue} 90% 60% / 0.95)`;
+        const hue = ((r.id ?? i)*57)%360;
+        ctx.strokeStyle = (live && STATE_COLORS[live.states.get(r.id)]) || `hsl(${hue} 90% 60% / 0.95)`;
         const R = worldToLocalRect(r.x, r.y, r.w, r.h);
         if (R) ctx.strokeRect(R.x, R.y, R.w, R.h);
       });
@@ -238,6 +333,12 @@
       previewImg.src = tpl.data_url;
       Object.assign(previewImg.style, { display:'block', left:`${R.x}px`, top:`${R.y}px`, width:`${R.w}px`, height:`${R.h}px` });
     }
+    // Zone monde visible : le canvas couvre mapC.width x mapC.height pixels à partir du TL
+    function viewport() {
+      const TL = currentTL();
+      if (!TL) return null;
+      return { x: TL.x, y: TL.y, w: mapC.width, h: mapC.height };
+    }
     function destroy(){ wrap.remove(); }
 
     const sync = () => { syncWrapToCanvas(); resizeBitmap(); ctx.setTransform(dpr,0,0,dpr,0,0); };
@@ -246,7 +347,7 @@
     window.addEventListener('scroll', sync, {passive:true});
     window.addEventListener('resize', sync, {passive:true});
 
-    return { drawRects, showTemplate, destroy };
+    return { drawRects, showTemplate, viewport, destroy, epoch: () => epoch };
   }
 
   // -------------------- UI -------------------------------
@@ -256,7 +357,7 @@
     const root = document.createElement('div');
     root.id = 'bsui-root';
     root.innerHTML = `
-      <div class="h"><div class="title">Menu</div></div>
+      <div class="h"><div class="title">Menu</div><div class="live" id="bs-live"></div></div>
       <div class="body" id="bs-body"><div class="big">Blue Scan</div></div>
       <div class="foot">
         <div class="status" id="bs-status">Backend: résolution…</div>
@@ -295,6 +396,7 @@
     const el = {
       body: root.querySelector("#bs-body"),
       status: root.querySelector("#bs-status"),
+      live: root.querySelector("#bs-live"),
       btnPing: root.querySelector("#bs-btn-ping"),
       btnUpload: root.querySelector("#bs-btn-upload"),
       btnList: root.querySelector("#bs-btn-list"),
@@ -315,7 +417,25 @@
     };
     const setStatus = (m)=> (el.status.textContent = m);
 
-    (async () => { const base = await discoverBackend(); setStatus("Backend: " + base); renderList(); })();
+    (async () => {
+      const base = await discoverBackend(); setStatus("Backend: " + base); renderList();
+      if (!eventsStarted) connectEvents();
+    })();
+
+    // Flux /events : indicateur (débit, alertes) et liste rafraîchie sur changement d'œuvre
+    let listTimer = null;
+    const renderLive = () => {
+      if (!LIVE.ok) { el.live.textContent = ""; return; }
+      const n = LIVE.states.size;
+      el.live.textContent = `${LIVE.running ? `${LIVE.coverage.rate} tuiles/s` : "arrêté"} • ${n} alerte${n > 1 ? "s" : ""}`;
+    };
+    liveListeners.add((type) => {
+      renderLive();
+      if (type === "monitor") { running = LIVE.running; el.btnMonitor.textContent = running ? "Stop" : "Start"; }
+      if (type === "art" && !listTimer) {
+        listTimer = setTimeout(() => { listTimer = null; renderList(); }, 300);
+      }
+    });
 
     async function renderList() {
       try {
@@ -401,14 +521,40 @@
     el.btnPing.onclick = async () => { try { const r = await api("/healthz"); setStatus(`Ping: ${r.status}`); } catch { setStatus("Ping KO"); } };
 
     // Contours
+    // Flux /events actif : œuvres, états d'alerte et tuiles en défaut viennent de LIVE,
+    // filtrés localement sur le viewport ; on ne redessine que si LIVE, le viewport ou
+    // la taille de l'overlay ont changé. Sinon, repli : seules les œuvres du viewport
+    // sont demandées (/artworks/region), quand il change ou toutes les CONTOURS_REFRESH_MS.
+    const CONTOURS_REFRESH_MS = 2000;
     let overlay = null, contoursOn = false, timer = null;
+    let visibleArts = [], lastVpKey = "", lastFetch = 0, fetching = false, lastDraw = "";
     function ensureOverlay(){ if (!overlay) overlay = makeMapOverlay(); return overlay; }
+    async function refreshVisible(vp){
+      const key = `${vp.x},${vp.y},${vp.w},${vp.h}`;
+      if (fetching || (key === lastVpKey && Date.now() - lastFetch < CONTOURS_REFRESH_MS)) return;
+      fetching = true;
+      try {
+        const resp = await api(`/artworks/region?x=${vp.x}&y=${vp.y}&w=${vp.w}&h=${vp.h}`);
+        if (resp.ok) { visibleArts = (await resp.json()) || []; lastVpKey = key; lastFetch = Date.now(); }
+      } finally { fetching = false; }
+    }
     async function redrawContours(){
       if (!contoursOn) return;
       const o = ensureOverlay(); if (!o) return;
       try {
-        const resp = await api("/artworks"); const arts = resp.ok ? await resp.json() : [];
-        o.drawRects(arts || []);
+        const vp = o.viewport();
+        if (LIVE.ok) {
+          const key = vp ? `${vp.x},${vp.y},${vp.w},${vp.h}|${LIVE.version}|${o.epoch()}` : "";
+          if (key === lastDraw) return;
+          lastDraw = key;
+          const arts = vp ? Array.from(LIVE.arts.values()).filter(a =>
+            a.x < vp.x + vp.w && a.x + a.w > vp.x && a.y < vp.y + vp.h && a.y + a.h > vp.y) : [];
+          o.drawRects(arts, { states: LIVE.states, tiles: LIVE.tiles.values() });
+        } else {
+          lastDraw = "";
+          if (vp) await refreshVisible(vp);
+          o.drawRects(visibleArts);
+        }
         o.showTemplate(lastTemplate || null);
       } catch {}
     }
@@ -416,7 +562,7 @@
       contoursOn = !contoursOn;
       el.btnContours.textContent = contoursOn ? "Contours ✔" : "Contours";
       if (contoursOn) { ensureOverlay(); await redrawContours(); timer = setInterval(redrawContours, 250); }
-      else { if (timer) clearInterval(timer), timer=null; if (overlay) overlay.destroy(), overlay=null; }
+      else { if (timer) clearInterval(timer), timer=null; if (overlay) overlay.destroy(), overlay=null; visibleArts = []; lastVpKey = ""; lastDraw = ""; }
     };
   }
 